@@ -1,6 +1,11 @@
 import argparse
 import os
 import sys
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent
+sys.path.insert(0, str(REPO_ROOT))
+
 
 def parse_args():
     p = argparse.ArgumentParser(
@@ -25,25 +30,21 @@ def main():
     h = args.height
     mode = args.mode
 
-    if mode == "grey":
-        expected = w * h
-        magic = b"P5"
-        ext = ".pgm"
-    else:
-        expected = w * h * 3
-        magic = b"P6"
-        ext = ".ppm"
+    try:
+        from parconv.rawio import PNM_SUFFIX, open_raw, write_pnm
+    except ImportError:
+        print("NumPy is required. Install it with: pip install numpy", file=sys.stderr)
+        return 1
 
     if not os.path.isfile(in_path):
         print(f"Input not found: {in_path}", file=sys.stderr)
         return 1
 
-    with open(in_path, "rb") as f:
-        data = f.read()
-
-    if len(data) != expected:
+    expected = w * h * (3 if mode == "rgb" else 1)
+    size = os.path.getsize(in_path)
+    if size != expected:
         print(
-            f"Size mismatch: got {len(data)} bytes, expected {expected} (w={w}, h={h}, mode={mode})",
+            f"Size mismatch: got {size} bytes, expected {expected} (w={w}, h={h}, mode={mode})",
             file=sys.stderr,
         )
         return 2
@@ -51,13 +52,10 @@ def main():
     out_path = args.output
     if not out_path:
         base, _ = os.path.splitext(in_path)
-        out_path = base + ext
-
-    header = magic + b"\n" + f"{w} {h}\n255\n".encode("ascii")
+        out_path = base + PNM_SUFFIX[mode]
 
-    with open(out_path, "wb") as f:
-        f.write(header)
-        f.write(data)
+    # The frame is mapped, not read: the pixels go from the input mapping straight to the output file
+    write_pnm(out_path, open_raw(in_path, w, h, mode))
 
     print(f"Wrote {out_path}")
     return 0
@@ -176,7 +176,12 @@ __global__ void kernel_conv_rgb(const uint8_t *__restrict__ src, uint8_t *__rest
     }
 }
 
-extern "C" void gpuConvolute(uint8_t *src, int width, int height, int loops, color_t imageType) {
+/*
+ * Advance src from iteration start to iteration loops. With checkpoint > 0 the
+ * image after every checkpoint-th iteration before the last is copied back
+ * into src and handed to on_checkpoint.
+ */
+extern "C" void gpuConvolute(uint8_t *src, int width, int height, int start, int loops, int checkpoint, checkpoint_fn on_checkpoint, color_t imageType) {
     uint8_t *d_src, *d_dst, *tmp;
     size_t bytes = (imageType == GREY) ? (size_t)height * width : (size_t)height * width * 3;
 
@@ -187,14 +192,15 @@ extern "C" void gpuConvolute(uint8_t *src, int width, int height, int loops, col
     CUDA_SAFE_CALL(cudaMalloc(&d_dst, bytes * sizeof(uint8_t)));
 
     CUDA_SAFE_CALL(cudaMemcpy(d_src, src, bytes, cudaMemcpyHostToDevice));
-    CUDA_SAFE_CALL(cudaMemset(d_dst, 0, bytes));
+    /* The kernels never write the outermost pixels: both buffers keep the input's, so the state is the image alone */
+    CUDA_SAFE_CALL(cudaMemcpy(d_dst, d_src, bytes, cudaMemcpyDeviceToDevice));
 
     const int blockSize = BLOCK_SIZE;
     dim3 block(blockSize, blockSize);
     dim3 grid_grey(FRACTION_CEILING(height, blockSize), FRACTION_CEILING(width, blockSize));
     dim3 grid_rgb(FRACTION_CEILING(height, blockSize), FRACTION_CEILING(width, blockSize));
 
-    for (int t = 0; t < loops; t++) {
+    for (int t = start; t < loops; t++) {
         if (imageType == GREY) {
             kernel_conv_grey<<<grid_grey, block>>>(d_src, d_dst, width, height);
         } else if (imageType == RGB) {
@@ -204,16 +210,19 @@ extern "C" void gpuConvolute(uint8_t *src, int width, int height, int loops, col
         tmp = d_src;
         d_src = d_dst;
         d_dst = tmp;
+
+        if (checkpoint > 0 && (t + 1) % checkpoint == 0 && t + 1 < loops) {
+            CUDA_SAFE_CALL(cudaGetLastError());
+            CUDA_SAFE_CALL(cudaMemcpy(src, d_src, bytes, cudaMemcpyDeviceToHost));
+            on_checkpoint(src, t + 1);
+        }
     }
 
     CUDA_SAFE_CALL(cudaGetLastError());
     CUDA_SAFE_CALL(cudaDeviceSynchronize());
 
-    if (loops % 2 == 0) {
-        CUDA_SAFE_CALL(cudaMemcpy(src, d_src, bytes, cudaMemcpyDeviceToHost));
-    } else {
-        CUDA_SAFE_CALL(cudaMemcpy(src, d_dst, bytes, cudaMemcpyDeviceToHost));
-    }
+    /* After the last swap the newest image is in d_src */
+    CUDA_SAFE_CALL(cudaMemcpy(src, d_src, bytes, cudaMemcpyDeviceToHost));
 
     CUDA_SAFE_CALL(cudaFree(d_src));
     CUDA_SAFE_CALL(cudaFree(d_dst));
@@ -7,7 +7,10 @@
 extern "C" {
 #endif
 
-void gpuConvolute(uint8_t *src, int width, int height, int loops, color_t imageType);
+/* Called with the host image after iteration t */
+typedef void (*checkpoint_fn)(uint8_t *image, int t);
+
+void gpuConvolute(uint8_t *src, int width, int height, int start, int loops, int checkpoint, checkpoint_fn on_checkpoint, color_t imageType);
 
 #ifdef __cplusplus
 }
@@ -1,22 +1,51 @@
 #include <stdio.h>
 #include <stdlib.h>
 #include <string.h>
+#include <ctype.h>
+#include <limits.h>
 #include <fcntl.h>
 #include <unistd.h>
 #include <stdint.h>
 #include <assert.h>
 #include "funcs.h"
 
-void Usage(int argc, char **argv, char **image, int *width, int *height, int *loops, color_t *imageType) {
-	int has_noout = (argc == 7 && !strcmp(argv[6], "noout"));
-	if ((argc == 6 || has_noout) && !strcmp(argv[5], "grey")) {
+/*
+ * image_name width height loops rgb|grey [options] for headerless images, or
+ * image.pgm|image.ppm loops [options] with the geometry and colour taken from
+ * the PGM/PPM header.
+ */
+void Usage(int argc, char **argv, char **image, int *width, int *height, int *loops, color_t *imageType, options_t *opts) {
+	int i, pnm = argc >= 3 && is_pnm(argv[1]);
+	memset(opts, 0, sizeof(*opts));
+	for (i = pnm ? 3 : 6 ; i < argc ; i++) {
+		if (!strcmp(argv[i], "noout"))
+			opts->no_output = 1;
+		else if (!strcmp(argv[i], "--checkpoint") && i + 1 < argc && (opts->checkpoint = atoi(argv[i+1])) > 0)
+			i++;
+		else if (!strcmp(argv[i], "--resume") && i + 2 < argc && (opts->start = atoi(argv[i+2])) >= 0) {
+			opts->resume = i + 1;
+			i += 2;
+		} else if (!strcmp(argv[i], "--output") && i + 1 < argc)
+			opts->output = ++i;
+		else
+			argc = -1;
+	}
+	if (pnm && argc >= 3) {
+		if (read_pnm_header(argv[1], width, height, imageType) < 0) {
+			fprintf(stderr, "%s: %s is not a binary PGM/PPM with maxval 255\n", argv[0], argv[1]);
+			exit(EXIT_FAILURE);
+		}
+		*image = (char *)malloc((strlen(argv[1])+1) * sizeof(char));
+		strcpy(*image, argv[1]);
+		*loops = atoi(argv[2]);
+	} else if (!pnm && argc >= 6 && !strcmp(argv[5], "grey")) {
 		*image = (char *)malloc((strlen(argv[1])+1) * sizeof(char));
 		strcpy(*image, argv[1]);	
 		*width = atoi(argv[2]);
 		*height = atoi(argv[3]);
 		*loops = atoi(argv[4]);
 		*imageType = GREY;
-	} else if ((argc == 6 || has_noout) && !strcmp(argv[5], "rgb")) {
+	} else if (!pnm && argc >= 6 && !strcmp(argv[5], "rgb")) {
 		*image = (char *)malloc((strlen(argv[1])+1) * sizeof(char));
 		strcpy(*image, argv[1]);	
 		*width = atoi(argv[2]);
@@ -24,11 +53,76 @@ void Usage(int argc, char **argv, char **image, int *width, int *height, int *lo
 		*loops = atoi(argv[4]);
 		*imageType = RGB;
 	} else {
-		fprintf(stderr, "Error Input!\n%s image_name width height loops [rgb/grey] [noout].\n", argv[0]);
+		fprintf(stderr, "Error Input!\n%s image_name width height loops [rgb/grey] [options]\n%s image.pgm|image.ppm loops [options]\n"
+				"options: [noout] [--checkpoint N] [--resume FILE T] [--output PATH].\n", argv[0], argv[0]);
+		exit(EXIT_FAILURE);
+	}
+	if (opts->start > *loops) {
+		fprintf(stderr, "%s: --resume iteration %d is past loops\n", argv[0], opts->start);
 		exit(EXIT_FAILURE);
 	}
 }
 
+/* PGM/PPM files are recognised by their .pgm/.ppm extension */
+int is_pnm(const char *path) {
+	size_t len = (path != NULL) ? strlen(path) : 0;
+	const char *ext = (len > 4) ? path + len - 4 : NULL;
+	return ext != NULL && ext[0] == '.' && tolower((unsigned char)ext[1]) == 'p'
+			&& (tolower((unsigned char)ext[2]) == 'g' || tolower((unsigned char)ext[2]) == 'p')
+			&& tolower((unsigned char)ext[3]) == 'm';
+}
+
+/* File name part of a path; outputs and checkpoints are named after it in the working directory */
+const char *base_name(const char *path) {
+	const char *p, *base = path;
+	for (p = path ; *p ; p++)
+		if (*p == '/' || *p == '\\')
+			base = p + 1;
+	return base;
+}
+
+/* Whitespace and # comments, then a decimal number and the whitespace byte ending it; -1 on error */
+static int pnm_field(FILE *fh) {
+	int c, value = 0, digits = 0;
+	while ((c = fgetc(fh)) != EOF) {
+		if (c == '#') {
+			while ((c = fgetc(fh)) != EOF && c != '\n')
+				;
+		} else if (!isspace(c))
+			break;
+	}
+	for ( ; isdigit(c) && value <= (INT_MAX - 9) / 10 ; c = fgetc(fh), digits++)
+		value = value * 10 + (c - '0');
+	return (digits && c != EOF && isspace(c)) ? value : -1;
+}
+
+/*
+ * Geometry and colour of a binary PGM (P5, grey) or PPM (P6, rgb) with maxval
+ * 255. Returns the offset of the first pixel, or -1 if the file is not one.
+ */
+long read_pnm_header(const char *path, int *width, int *height, color_t *imageType) {
+	int w, h, magic, c;
+	long pixels = -1;
+	FILE *fh = fopen(path, "rb");
+	if (fh == NULL)
+		return -1;
+	if (fgetc(fh) == 'P' && ((magic = fgetc(fh)) == '5' || magic == '6')
+			&& ((c = fgetc(fh)) == '#' || isspace(c)) && ungetc(c, fh) != EOF
+			&& (w = pnm_field(fh)) > 0 && (h = pnm_field(fh)) > 0 && pnm_field(fh) == 255) {
+		*width = w;
+		*height = h;
+		*imageType = (magic == '5') ? GREY : RGB;
+		pixels = ftell(fh);
+	}
+	fclose(fh);
+	return pixels;
+}
+
+/* PGM/PPM header of an image into buf; returns its length */
+int pnm_header(char *buf, size_t len, int width, int height, color_t imageType) {
+	return snprintf(buf, len, "P%c\n%d %d\n255\n", (imageType == GREY) ? '5' : '6', width, height);
+}
+
 int write_all(int fd , uint8_t* buff , int size) {
 	int n, sent;
 	for (sent = 0 ; sent < size ; sent += n)
@@ -19,9 +19,22 @@
 
 typedef enum {RGB, GREY} color_t;
 
+/* Command line options following the positional arguments */
+typedef struct {
+	int no_output;	/* noout: skip writing blur_<image> */
+	int checkpoint;	/* --checkpoint N: also write ckpt_<t>_<image> after every N-th iteration t */
+	int resume;		/* --resume FILE T: argv index of FILE, an intermediate image after T iterations */
+	int start;		/* T of --resume: the iteration count the run starts from */
+	int output;		/* --output PATH: argv index of PATH, written instead of blur_<image> */
+} options_t;
+
 int write_all(int, uint8_t *, int);
 int read_all(int, uint8_t *, int);
-void Usage(int, char **, char **, int *, int *, int *, color_t *);
+void Usage(int, char **, char **, int *, int *, int *, color_t *, options_t *);
+int is_pnm(const char *);
+const char *base_name(const char *);
+long read_pnm_header(const char *, int *, int *, color_t *);
+int pnm_header(char *, size_t, int, int, color_t);
 uint64_t micro_time(void);
 
 #endif
\ No newline at end of file
@@ -7,22 +7,43 @@
 #include "cuda_convolute.h"
 #include "funcs.h"
 
+/* State of the checkpoint writer */
+static char *ckpt_image;
+static int ckpt_width, ckpt_height;
+static color_t ckpt_type;
+static size_t ckpt_bytes;
+static uint64_t ckpt_time;
+static int ckpt_count;
+
+void write_checkpoint(uint8_t *, int);
+
 int main(int argc, char** argv) {
 	int fd, width, height, loops;
 	char *image;
 	color_t imageType;
-	int no_output = (argc == 7 && !strcmp(argv[6], "noout"));
+	options_t opts;
 	
-	Usage(argc, argv, &image, &width, &height, &loops, &imageType);	
+	Usage(argc, argv, &image, &width, &height, &loops, &imageType, &opts);
+	int no_output = opts.no_output;
 
 	/* Host vectors */
 	uint8_t *src = NULL;
 	/* Count time */ 
 	uint64_t c = 0; 
 
-	/* Read bytes from picture */
-	if ((fd = open(image, O_RDONLY)) < 0) {
-		fprintf(stderr, "cannot open %s\n", argv[1]);
+	/* Read bytes from picture, or from the intermediate image of --resume; a PGM/PPM must match the geometry */
+	const char *input = opts.resume ? argv[opts.resume] : image;
+	long pixels = 0;
+	if (is_pnm(input)) {
+		int w, h;
+		color_t type;
+		if ((pixels = read_pnm_header(input, &w, &h, &type)) < 0 || w != width || h != height || type != imageType) {
+			fprintf(stderr, "%s is not a %dx%d %s PGM/PPM\n", input, width, height, (imageType == GREY) ? "grey" : "rgb");
+			return EXIT_FAILURE;
+		}
+	}
+	if ((fd = open(input, O_RDONLY)) < 0 || lseek(fd, pixels, SEEK_SET) == -1) {
+		fprintf(stderr, "cannot open %s\n", input);
 		return EXIT_FAILURE;
 	}
 	size_t bytes = (imageType == GREY) ? height * width : height * width*3;	
@@ -30,30 +51,68 @@ int main(int argc, char** argv) {
 	read_all(fd, src, bytes);
 	close(fd);
 
+	ckpt_image = image;
+	ckpt_width = width;
+	ckpt_height = height;
+	ckpt_type = imageType;
+	ckpt_bytes = bytes;
 	c = micro_time();
-	gpuConvolute(src, width, height, loops, imageType);
-	c = micro_time() - c;
+	gpuConvolute(src, width, height, opts.start, loops, opts.checkpoint, write_checkpoint, imageType);
+	/* Checkpoint writes are not part of the execution time */
+	c = micro_time() - c - ckpt_time;
 
 	if (!no_output) {
-		/* Create new picture - Write bytes */
+		/* Create new picture - Write bytes to --output PATH, or blur_<image> in the working directory */
 		int fd_out;
-		char *outImage = (char*) malloc((strlen(image) + 9) * sizeof(char));
-		strcpy(outImage, "blur_");
-		strcat(outImage, image);
-		if ((fd_out = open(outImage, O_CREAT | O_WRONLY, 0644)) == -1) {
+		char header[64];
+		char *blurImage = (char*) malloc((strlen(image) + 9) * sizeof(char));
+		strcpy(blurImage, "blur_");
+		strcat(blurImage, base_name(image));
+		const char *outImage = opts.output ? argv[opts.output] : blurImage;
+		int header_len = is_pnm(outImage) ? pnm_header(header, sizeof(header), width, height, imageType) : 0;
+		if ((fd_out = open(outImage, O_CREAT | O_WRONLY | O_TRUNC, 0644)) == -1) {
 			fprintf(stderr, "cannot open-create %s\n", outImage);
 			return EXIT_FAILURE;
 		}
+		write_all(fd_out, (uint8_t *)header, header_len);
 		write_all(fd_out, src, bytes);
 		close(fd_out);
-		free(outImage);
+		free(blurImage);
 	}
 
 	/* compute time */
 	double million = 1000 * 1000;
+	if (opts.checkpoint)
+		fprintf(stderr, "checkpoint: %d written, %f s\n", ckpt_count, ckpt_time / million);
 	fprintf(stdout, "Execution time: %.3f sec\n", c / million);
 
     /* De-allocate space */
     free(src);
 	return EXIT_SUCCESS;
 }
+
+/*
+ * Write ckpt_<t>_<image> through a temporary file and a rename, so that a run
+ * killed mid-write leaves the previous checkpoints intact. A PGM/PPM image
+ * gets PGM/PPM checkpoints.
+ */
+void write_checkpoint(uint8_t *buf, int t) {
+	uint64_t c = micro_time();
+	size_t len = strlen(ckpt_image) + 32;
+	char *path = (char *) malloc(len), *part = (char *) malloc(len + 4);
+	char header[64];
+	int fd, header_len;
+	snprintf(path, len, "ckpt_%d_%s", t, base_name(ckpt_image));
+	snprintf(part, len + 4, "%s.tmp", path);
+	header_len = is_pnm(path) ? pnm_header(header, sizeof(header), ckpt_width, ckpt_height, ckpt_type) : 0;
+	if ((fd = open(part, O_CREAT | O_WRONLY | O_TRUNC, 0644)) == -1 || write_all(fd, (uint8_t *)header, header_len) == -1
+			|| write_all(fd, buf, ckpt_bytes) == -1
+			|| close(fd) == -1 || rename(part, path) == -1) {
+		fprintf(stderr, "cannot write checkpoint %s\n", path);
+		exit(EXIT_FAILURE);
+	}
+	free(path);
+	free(part);
+	ckpt_count++;
+	ckpt_time += micro_time() - c;
+}
@@ -3,9 +3,7 @@ import argparse
 import csv
 import os
 import sys
-import subprocess
 import statistics
-import random
 from pathlib import Path
 import shutil
 
@@ -18,33 +16,13 @@ PS = [1, 2, 4, 9, 16, 25]
 IMAGE_TYPES = ["grey", "rgb"]
 LOOPS = 20
 REPEATS = 3
+HALOS = [1]
+EXCHANGES = ["isend"]
 SEED = 123
 
-
-def generate_data_file(path: Path, size: int) -> None:
-    if path.exists() and path.stat().st_size == size:
-        return
-    path.parent.mkdir(parents=True, exist_ok=True)
-    rng = random.Random(SEED)
-    data = bytearray(rng.getrandbits(8) for _ in range(size))
-    path.write_bytes(data)
-
-
-def parse_runtime(output: str):
-    text = output.strip().split()
-    if not text:
-        return None
-    try:
-        return float(text[-1])
-    except ValueError:
-        return None
-
-
-def format_number(val):
-    if val is None:
-        return "--"
-    s = f"{val:.2f}"
-    return s.replace(".", ",")
+sys.path.insert(0, str(REPO_ROOT))
+from parconv.bench import Job, available_cpus, batch_runtimes, format_number, result_runtime, run_jobs, write_manifest  # noqa: E402
+from parconv.data import PATTERNS, data_file_name, ensure_data_file  # noqa: E402
 
 
 def main():
@@ -53,11 +31,48 @@ def main():
     parser.add_argument("--exe", default=str(default_exe), help="Path to mpi_conv binary")
     parser.add_argument("--mpiexec", default="mpiexec", help="mpiexec path")
     parser.add_argument("--repeats", type=int, default=REPEATS, help="Repeats per case")
+    parser.add_argument(
+        "--halo",
+        type=int,
+        nargs="+",
+        default=HALOS,
+        metavar="K",
+        help="Halo depths to sweep (mpi_conv --halo K: one exchange every K iterations)",
+    )
+    parser.add_argument(
+        "--exchange",
+        nargs="+",
+        choices=["isend", "persistent", "neighbor"],
+        default=EXCHANGES,
+        help="Halo exchange variants to sweep (mpi_conv --exchange)",
+    )
+    parser.add_argument(
+        "--parallel",
+        action="store_true",
+        help="Run independent cases side by side, each pinned to its own p CPUs",
+    )
+    parser.add_argument("--cpus", type=int, default=None, help="Limit --parallel to the first N available CPUs")
+    parser.add_argument(
+        "--batch",
+        action="store_true",
+        help="One mpi_conv --batch launch per (p, halo, exchange) covering every image and repeat",
+    )
+    parser.add_argument(
+        "--pattern",
+        choices=PATTERNS,
+        default="noise",
+        help="Input image content (default: noise, the historical SEED inputs)",
+    )
     args = parser.parse_args()
+    if args.cpus is not None and args.cpus < 1:
+        parser.error("--cpus must be >= 1")
 
     exe_path = str(args.exe)
     mpiexec = args.mpiexec
     repeats = args.repeats
+    halos = args.halo
+    exchanges = args.exchange
+    variants = [(k, ex) for k in halos for ex in exchanges]
 
     results = []
     data_dir = REPO_ROOT / "data"
@@ -88,69 +103,74 @@ def main():
     elif not Path(mpiexec).exists():
         print(f"WARNING: mpiexec not found: {mpiexec}", file=sys.stderr)
 
+    cases = []
     for image_type in IMAGE_TYPES:
         for height in HEIGHTS:
-            if image_type == "grey":
-                size = WIDTH * height
-            else:
-                size = WIDTH * height * 3
-            filename = f"{image_type}_{WIDTH}x{height}.bin"
+            filename = data_file_name(WIDTH, height, image_type, args.pattern)
             data_path = data_dir / filename
-            generate_data_file(data_path, size)
-
+            ensure_data_file(data_path, WIDTH, height, image_type, args.pattern, SEED)
+            cases.append((image_type, height, data_path))
+
+    def variant_options(k, ex):
+        options = []
+        if k > 1:
+            options += ["--halo", str(k)]
+        if ex != "isend":
+            options += ["--exchange", ex]
+        return options
+
+    jobs = []
+    if args.batch:
+        # Repeats of an image are adjacent, so the engine keeps its buffers and datatypes between them.
+        # Inputs are absolute and outputs relative, so each launch writes into its own scratch directory.
+        manifest = data_dir / "table1_mpi_batch.txt"
+        write_manifest(
+            manifest,
+            [(path.resolve(), f"blur_{path.name}", WIDTH, height, LOOPS, image_type)
+             for image_type, height, path in cases for _ in range(repeats)],
+        )
+        for p in PS:
+            for k, ex in variants:
+                cmd = [mpiexec, "-n", str(p), exe_path, "--batch", str(manifest.resolve())] + variant_options(k, ex)
+                keys = tuple((image_type, WIDTH, height, p, k, ex) for image_type, height, _ in cases for _ in range(repeats))
+                jobs.append(Job(cmd=cmd, cpus=p, key=keys))
+    else:
+        for image_type, height, data_path in cases:
             for p in PS:
-                runtimes = []
-                for _ in range(repeats):
+                for k, ex in variants:
                     cmd = [mpiexec, "-n", str(p), exe_path, str(data_path), str(WIDTH), str(height), str(LOOPS), image_type]
-                    try:
-                        proc = subprocess.run(cmd, capture_output=True, text=True, check=False)
-                    except Exception as e:
-                        error_log.write_text(
-                            error_log.read_text(encoding="ascii")
-                            + f"EXCEPTION: {' '.join(cmd)}\n"
-                            + f"error: {e}\n\n",
-                            encoding="ascii",
-                        )
-                        runtimes.append(None)
-                        continue
-
-                    if proc.returncode != 0:
-                        error_log.write_text(
-                            error_log.read_text(encoding="ascii")
-                            + f"FAIL: {' '.join(cmd)}\n"
-                            + f"stdout: {proc.stdout}\n"
-                            + f"stderr: {proc.stderr}\n\n",
-                            encoding="ascii",
-                        )
-                        runtimes.append(None)
-                        continue
-
-                    rt = parse_runtime(proc.stdout)
-                    if rt is None and proc.stderr:
-                        rt = parse_runtime(proc.stderr)
-                    if rt is None:
-                        error_log.write_text(
-                            error_log.read_text(encoding="ascii")
-                            + f"PARSE_FAIL: {' '.join(cmd)}\n"
-                            + f"stdout: {proc.stdout}\n"
-                            + f"stderr: {proc.stderr}\n\n",
-                            encoding="ascii",
-                        )
-                        runtimes.append(None)
-                    else:
-                        runtimes.append(rt)
-
-                vals = [v for v in runtimes if v is not None]
-                if vals:
-                    median_rt = statistics.median(vals)
-                else:
-                    median_rt = None
-                results.append((image_type, WIDTH, height, p, median_rt))
+                    cmd += variant_options(k, ex)
+                    for _ in range(repeats):
+                        jobs.append(Job(cmd=cmd, cpus=p, key=(image_type, WIDTH, height, p, k, ex)))
+
+    cpus = available_cpus()[: args.cpus] if args.cpus else None
+    runtimes = {(image_type, WIDTH, height, p, k, ex): [] for image_type, height, _ in cases for p in PS for k, ex in variants}
+    errors = []
+    for res in run_jobs(jobs, parallel=args.parallel, cpus=cpus):
+        if args.batch:
+            rts, err = batch_runtimes(res, len(res.job.key))
+            keys = res.job.key
+        else:
+            rt, err = result_runtime(res)
+            rts, keys = [rt], [res.job.key]
+        if err is not None:
+            errors.append(err)
+        for key, rt in zip(keys, rts):
+            runtimes[key].append(rt)
+    error_log.write_text("".join(errors), encoding="ascii")
+
+    for key, vals in runtimes.items():
+        vals = [v for v in vals if v is not None]
+        if vals:
+            median_rt = statistics.median(vals)
+        else:
+            median_rt = None
+        results.append(key + (median_rt,))
 
     csv_path = BASE_DIR / "table1_mpi_times.csv"
     with csv_path.open("w", newline="") as f:
         writer = csv.writer(f)
-        writer.writerow(["image_type", "width", "height", "p", "runtime_seconds"])
+        writer.writerow(["image_type", "width", "height", "p", "halo", "exchange", "runtime_seconds"])
         for row in results:
             writer.writerow(row)
 
@@ -167,24 +187,27 @@ def main():
         return ""
 
     lines = []
-    lines.append("\\begin{tabular}{|l|r|r|r|r|r|r|}\\hline")
-    lines.append("Image size & 1 & 2 & 4 & 9 & 16 & 25 \\\\ \\\\hline")
-
-    for image_type in IMAGE_TYPES:
-        for height in HEIGHTS:
-            label = f"{image_type} {WIDTH}$\\times${height} {size_label(height)}"
-            row = [label]
-            for p in PS:
-                rt = None
-                for r in results:
-                    if r[0] == image_type and r[2] == height and r[3] == p:
-                        rt = r[4]
-                        break
-                row.append(format_number(rt))
-            lines.append("{} & {} \\\\".format(row[0], " & ".join(row[1:])))
-        lines.append("\\hline")
-
-    lines.append("\\end{tabular}")
+    for k, ex in variants:
+        if len(variants) > 1:
+            lines.append(f"% halo depth k = {k}, exchange = {ex}")
+        lines.append("\\begin{tabular}{|l|r|r|r|r|r|r|}\\hline")
+        lines.append("Image size & 1 & 2 & 4 & 9 & 16 & 25 \\\\ \\\\hline")
+
+        for image_type in IMAGE_TYPES:
+            for height in HEIGHTS:
+                label = f"{image_type} {WIDTH}$\\times${height} {size_label(height)}"
+                row = [label]
+                for p in PS:
+                    rt = None
+                    for r in results:
+                        if r[0] == image_type and r[2] == height and r[3] == p and r[4] == k and r[5] == ex:
+                            rt = r[6]
+                            break
+                    row.append(format_number(rt))
+                lines.append("{} & {} \\\\".format(row[0], " & ".join(row[1:])))
+            lines.append("\\hline")
+
+        lines.append("\\end{tabular}")
 
     print("\n".join(lines))
 
@@ -18,7 +18,7 @@ def format_comma(value, decimals=2):
     return fmt.replace(".", ",")
 
 
-def load_times(csv_path):
+def load_times(csv_path, halo=1, exchange="isend"):
     data = {}
     with open(csv_path, newline="") as f:
         reader = csv.DictReader(f)
@@ -28,8 +28,13 @@ def load_times(csv_path):
                 width = int(row["width"])
                 height = int(row["height"])
                 p = int(row["p"])
+                # CSVs written before the halo/exchange sweeps lack those columns: k = 1, isend
+                k = int(row.get("halo") or 1)
+                ex = (row.get("exchange") or "isend").strip()
             except (KeyError, ValueError):
                 continue
+            if k != halo or ex != exchange:
+                continue
             val = row.get("runtime_seconds", "").strip()
             if not val or val.lower() in ("none", "nan", "--"):
                 rt = None
@@ -46,9 +51,11 @@ def main():
     parser = argparse.ArgumentParser(description="Plot MPI runtime comparison")
     parser.add_argument("--csv", default=str(BASE_DIR / "table1_mpi_times.csv"), help="CSV file from benchmark_table1_mpi.py")
     parser.add_argument("--outdir", default=str(BASE_DIR), help="Output directory")
+    parser.add_argument("--halo", type=int, default=1, help="Halo depth k to plot from a swept CSV")
+    parser.add_argument("--exchange", default="isend", help="Halo exchange variant to plot from a swept CSV")
     args = parser.parse_args()
 
-    data = load_times(args.csv)
+    data = load_times(args.csv, args.halo, args.exchange)
 
     cases = [
         ("grey", 630, "grey\n1920*\n630 (x/4)"),
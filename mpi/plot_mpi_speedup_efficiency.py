@@ -11,7 +11,7 @@ BASE_DIR = Path(__file__).resolve().parent
 INCLUDE_P1 = False
 
 
-def load_times(csv_path, image_type, width, height):
+def load_times(csv_path, image_type, width, height, halo=1, exchange="isend"):
     times = {}
     with open(csv_path, newline="") as f:
         reader = csv.DictReader(f)
@@ -21,9 +21,12 @@ def load_times(csv_path, image_type, width, height):
                 r_width = int(row["width"])
                 r_height = int(row["height"])
                 p = int(row["p"])
+                # CSVs written before the halo/exchange sweeps lack those columns: k = 1, isend
+                k = int(row.get("halo") or 1)
+                ex = (row.get("exchange") or "isend").strip()
             except (KeyError, ValueError):
                 continue
-            if r_image != image_type or r_width != width or r_height != height:
+            if r_image != image_type or r_width != width or r_height != height or k != halo or ex != exchange:
                 continue
             val = row.get("runtime_seconds", "").strip()
             if not val or val.lower() in ("none", "nan", "--"):
@@ -98,11 +101,13 @@ def main():
     parser.add_argument("--csv", default=str(BASE_DIR / "table1_mpi_times.csv"), help="CSV file from benchmark_table1_mpi.py")
     parser.add_argument("--outdir", default=str(BASE_DIR), help="Output directory")
     parser.add_argument("--include-p1", action="store_true", help="Include p=1 on the x-axis")
+    parser.add_argument("--halo", type=int, default=1, help="Halo depth k to plot from a swept CSV")
+    parser.add_argument("--exchange", default="isend", help="Halo exchange variant to plot from a swept CSV")
     args = parser.parse_args()
 
     include_p1 = INCLUDE_P1 or args.include_p1
 
-    times = load_times(args.csv, image_type="grey", width=1920, height=2520)
+    times = load_times(args.csv, image_type="grey", width=1920, height=2520, halo=args.halo, exchange=args.exchange)
     if not times:
         print("ERROR: no matching entries for grey 1920x2520 in CSV", file=sys.stderr)
         raise SystemExit(1)
@@ -3,9 +3,7 @@ import argparse
 import csv
 import os
 import sys
-import subprocess
 import statistics
-import random
 from pathlib import Path
 import shutil
 
@@ -19,32 +17,12 @@ IMAGE_TYPES = ["grey", "rgb"]
 LOOPS = 20
 REPEATS = 3
 SEED = 123
+# mpi_omp_conv runs 4 threads in every rank unless --threads N says otherwise (OMP_NUM_THREADS does not)
+THREADS_PER_RANK = 4
 
-
-def generate_data_file(path: Path, size: int) -> None:
-    if path.exists() and path.stat().st_size == size:
-        return
-    path.parent.mkdir(parents=True, exist_ok=True)
-    rng = random.Random(SEED)
-    data = bytearray(rng.getrandbits(8) for _ in range(size))
-    path.write_bytes(data)
-
-
-def parse_runtime(output: str):
-    text = output.strip().split()
-    if not text:
-        return None
-    try:
-        return float(text[-1])
-    except ValueError:
-        return None
-
-
-def format_number(val):
-    if val is None:
-        return "--"
-    s = f"{val:.2f}"
-    return s.replace(".", ",")
+sys.path.insert(0, str(REPO_ROOT))
+from parconv.bench import Job, available_cpus, batch_runtimes, format_number, result_runtime, run_jobs, write_manifest  # noqa: E402
+from parconv.data import PATTERNS, data_file_name, ensure_data_file  # noqa: E402
 
 
 def resolve_exe(exe_path: str) -> str:
@@ -84,8 +62,27 @@ def main():
     parser.add_argument("--mpiexec", default="mpiexec", help="mpiexec path")
     parser.add_argument("--repeats", type=int, default=REPEATS, help="Repeats per case")
     parser.add_argument("--loops", type=int, default=LOOPS, help="Iterations per run")
-    parser.add_argument("--omp-threads", type=int, default=None, help="Set OMP_NUM_THREADS for each run")
+    parser.add_argument("--omp-threads", type=int, default=None, help="Threads per rank (mpi_omp_conv --threads N)")
+    parser.add_argument(
+        "--parallel",
+        action="store_true",
+        help="Run independent cases side by side, each pinned to its own p x threads CPUs",
+    )
+    parser.add_argument("--cpus", type=int, default=None, help="Limit --parallel to the first N available CPUs")
+    parser.add_argument(
+        "--batch",
+        action="store_true",
+        help="One mpi_omp_conv --batch launch per p covering every image and repeat",
+    )
+    parser.add_argument(
+        "--pattern",
+        choices=PATTERNS,
+        default="noise",
+        help="Input image content (default: noise, the historical SEED inputs)",
+    )
     args = parser.parse_args()
+    if args.cpus is not None and args.cpus < 1:
+        parser.error("--cpus must be >= 1")
 
     exe_path = resolve_exe(args.exe)
     mpiexec = resolve_mpiexec(args.mpiexec)
@@ -101,58 +98,57 @@ def main():
     error_log = BASE_DIR / "table2_mpi_omp_errors.log"
     error_log.write_text("", encoding="ascii")
 
+    threads = args.omp_threads or THREADS_PER_RANK
+    thread_args = ["--threads", str(args.omp_threads)] if args.omp_threads else []
+    cases = []
     for image_type in IMAGE_TYPES:
         for height in HEIGHTS:
-            size = WIDTH * height if image_type == "grey" else WIDTH * height * 3
-            filename = f"{image_type}_{WIDTH}x{height}.bin"
+            filename = data_file_name(WIDTH, height, image_type, args.pattern)
             data_path = data_dir / filename
-            generate_data_file(data_path, size)
-
+            ensure_data_file(data_path, WIDTH, height, image_type, args.pattern, SEED)
+            cases.append((image_type, height, data_path))
+
+    jobs = []
+    if args.batch:
+        # Repeats of an image are adjacent, so the engine keeps its buffers and datatypes between them.
+        # Inputs are absolute and outputs relative, so each launch writes into its own scratch directory.
+        manifest = data_dir / "table2_mpi_omp_batch.txt"
+        write_manifest(
+            manifest,
+            [(path.resolve(), f"blur_{path.name}", WIDTH, height, loops, image_type)
+             for image_type, height, path in cases for _ in range(repeats)],
+        )
+        for p in PS:
+            cmd = [mpiexec, "-n", str(p), exe_path, "--batch", str(manifest.resolve())] + thread_args
+            keys = tuple((image_type, WIDTH, height, p) for image_type, height, _ in cases for _ in range(repeats))
+            jobs.append(Job(cmd=cmd, cpus=p * threads, env=env_base, key=keys))
+    else:
+        for image_type, height, data_path in cases:
             for p in PS:
-                runtimes = []
+                cmd = [mpiexec, "-n", str(p), exe_path, str(data_path), str(WIDTH), str(height), str(loops), image_type] + thread_args
                 for _ in range(repeats):
-                    cmd = [mpiexec, "-n", str(p), exe_path, str(data_path), str(WIDTH), str(height), str(loops), image_type]
-                    try:
-                        proc = subprocess.run(cmd, capture_output=True, text=True, check=False, env=env_base)
-                    except Exception as e:
-                        error_log.write_text(
-                            error_log.read_text(encoding="ascii")
-                            + f"EXCEPTION: {' '.join(cmd)}\n"
-                            + f"error: {e}\n\n",
-                            encoding="ascii",
-                        )
-                        runtimes.append(None)
-                        continue
-
-                    if proc.returncode != 0:
-                        error_log.write_text(
-                            error_log.read_text(encoding="ascii")
-                            + f"FAIL: {' '.join(cmd)}\n"
-                            + f"stdout: {proc.stdout}\n"
-                            + f"stderr: {proc.stderr}\n\n",
-                            encoding="ascii",
-                        )
-                        runtimes.append(None)
-                        continue
-
-                    rt = parse_runtime(proc.stdout)
-                    if rt is None and proc.stderr:
-                        rt = parse_runtime(proc.stderr)
-                    if rt is None:
-                        error_log.write_text(
-                            error_log.read_text(encoding="ascii")
-                            + f"PARSE_FAIL: {' '.join(cmd)}\n"
-                            + f"stdout: {proc.stdout}\n"
-                            + f"stderr: {proc.stderr}\n\n",
-                            encoding="ascii",
-                        )
-                        runtimes.append(None)
-                    else:
-                        runtimes.append(rt)
-
-                vals = [v for v in runtimes if v is not None]
-                median_rt = statistics.median(vals) if vals else None
-                results.append((image_type, WIDTH, height, p, median_rt))
+                    jobs.append(Job(cmd=cmd, cpus=p * threads, env=env_base, key=(image_type, WIDTH, height, p)))
+
+    cpus = available_cpus()[: args.cpus] if args.cpus else None
+    runtimes = {(image_type, WIDTH, height, p): [] for image_type, height, _ in cases for p in PS}
+    errors = []
+    for res in run_jobs(jobs, parallel=args.parallel, cpus=cpus):
+        if args.batch:
+            rts, err = batch_runtimes(res, len(res.job.key))
+            keys = res.job.key
+        else:
+            rt, err = result_runtime(res)
+            rts, keys = [rt], [res.job.key]
+        if err is not None:
+            errors.append(err)
+        for key, rt in zip(keys, rts):
+            runtimes[key].append(rt)
+    error_log.write_text("".join(errors), encoding="ascii")
+
+    for key, vals in runtimes.items():
+        vals = [v for v in vals if v is not None]
+        median_rt = statistics.median(vals) if vals else None
+        results.append(key + (median_rt,))
 
     csv_path = BASE_DIR / "table2_mpi_omp_times.csv"
     with csv_path.open("w", newline="") as f:
@@ -1,42 +1,174 @@
+#ifdef __linux__
+/* sched_setaffinity() and cpu_set_t for --bind */
+#define _GNU_SOURCE
+#include <sched.h>
+#endif
 #include <stdio.h>
 #include <stdlib.h>
 #include <string.h>
+#include <ctype.h>
+#include <limits.h>
 #include <fcntl.h>
 #include <stdint.h>
 #include "mpi.h"
 #include "omp.h"
+#if defined(__GNUC__) && (defined(__x86_64__) || defined(__i386__))
+#include <immintrin.h>
+/* SSE4.1/AVX2/AVX-512 float kernels, each compiled for its own ISA and picked at run time */
+#define HAVE_X86_SIMD 1
+#if defined(__clang__)
+#define SIMD_KERNEL(isa) __attribute__((target(isa)))
+#else
+#define SIMD_KERNEL(isa) __attribute__((target(isa), optimize("fp-contract=off")))
+#endif
+#endif
+
+#define MIN(a, b) ((a) < (b) ? (a) : (b))
+#define MAX(a, b) ((a) > (b) ? (a) : (b))
+/* Working set budget for one temporal-blocking band (both scratch buffers) */
+#define TBLOCK_CACHE_BYTES (512 * 1024)
+/* L1 budget for one --tile strip: three input rows and the output row */
+#define TILE_CACHE_BYTES (32 * 1024)
+/* Sweeps per candidate of --tile auto; the fastest one counts */
+#define TILE_TRIALS 3
+/* Bytes of one rank's --bind report */
+#define BIND_REPORT 256
+/* Interior bands per thread under --overlap */
+#define OVERLAP_BANDS 4
+/* Halo a border piece reads, one bit per neighbour */
+#define HALO_N  0x01
+#define HALO_S  0x02
+#define HALO_W  0x04
+#define HALO_E  0x08
+#define HALO_NW 0x10
+#define HALO_NE 0x20
+#define HALO_SW 0x40
+#define HALO_SE 0x80
 
 typedef enum {RGB, GREY} color_t;
+typedef enum {GAUSSIAN, BOX, EDGE} kernel_t;
+/* Float path kernels, narrowest first; ISA_AUTO only appears in options_t */
+typedef enum {ISA_SCALAR, ISA_SSE4, ISA_AVX2, ISA_AVX512, ISA_AUTO} isa_t;
+
+/* Command line options following the positional arguments */
+typedef struct {
+	kernel_t kernel;	/* --kernel gaussian|box|edge */
+	int fixed;		/* --fixed: integer (sum >> 4) Gaussian path */
+	int separable;	/* --separable: two 1-D passes when the kernel is rank-1 */
+	isa_t isa;		/* --isa scalar|sse4|avx2|avx512|auto: float path kernels, auto picks the widest the CPU runs */
+	int planar;		/* --planar: rgb as three grey planes from load to output */
+	int compare;	/* --compare: run the float 2-D path and the selected path, report the difference */
+	int tblock;		/* --tblock T: iterations per halo exchange and per band, T-deep halos */
+	int tblock_rows;	/* --tblock-rows B: band height, 0 sizes it to TBLOCK_CACHE_BYTES */
+	int tile_rows, tile_cols;	/* --tile RxC: convolute() sweeps R x C pixel tiles, 0 spans the whole range */
+	int tile_auto;	/* --tile auto: time candidate tiles on the first image of each geometry */
+	int checkpoint;	/* --checkpoint N: also write ckpt_<t>_<image> after every N-th iteration t */
+	int resume;		/* --resume FILE T: argv index of FILE, an intermediate image after T iterations */
+	int start;		/* T of --resume: the iteration count the run starts from */
+	int output;		/* --output PATH: argv index of PATH, written instead of blur_<image> */
+	int batch;		/* --batch MANIFEST: argv index of MANIFEST, one job per line */
+	int overlap;	/* --overlap: one thread drives the exchange, the others convolute as OpenMP tasks */
+	int bind;		/* --bind: spread the ranks of a node over its sockets, one thread per core */
+	int grid_rows, grid_cols;	/* --grid RxC: R row blocks x C column blocks instead of the split divide_rows() picks */
+	int threads;	/* --threads N: OpenMP threads per rank, 0 keeps thread_count */
+} options_t;
+
+/* One image to blur; names are offsets into a shared string table so that the jobs broadcast as bytes */
+typedef struct {
+	int input;		/* file read: the image, or the --resume intermediate */
+	int image;		/* image the checkpoints are named after */
+	int output;		/* file written */
+	int width, height, loops;
+	color_t imageType;
+	int header;		/* bytes before the pixels of input (its PGM/PPM header), 0 for raw */
+} job_t;
 
-void convolute(uint8_t *, uint8_t *, int, int, int, int, int, int, float**, color_t);
+/* Filter handed to convolute() */
+typedef struct {
+	float **h;		/* float taps used by the reference path */
+	int fixed;		/* use the integer 1-2-1 path instead of h */
+	int separable;	/* use the row_taps/col_taps passes instead of h */
+	isa_t isa;		/* kernels of the float path; ISA_SCALAR is the per-pixel reference */
+	int tile_rows, tile_cols;	/* 2-D cache blocking of the sweep, 0 = none in that direction */
+	unsigned row_taps[3];	/* horizontal pass weights */
+	unsigned col_taps[3];	/* vertical pass weights */
+	int shift;		/* log2 of the separable divisor, -1 if not a power of two */
+	uint64_t recip;	/* ceil(2^32 / divisor): floor(sum / divisor) == (sum * recip) >> 32 */
+} filter_t;
+
+/* A CPU a rank may run on, for --bind */
+typedef struct {
+	int socket;		/* physical package id */
+	int core;		/* core id within the socket */
+	int cpu;		/* logical CPU number */
+} cpu_info_t;
+
+void convolute(uint8_t *, uint8_t *, int, int, int, int, int, int, const filter_t *, color_t);
 static inline void convolute_grey(uint8_t *, uint8_t *, int, int, int, int, float **);
 static inline void convolute_rgb(uint8_t *, uint8_t *, int, int, int, int, float **);
-void Usage(int, char **, char **, int *, int *, int *, color_t *);
+void convolute_float_row(const uint8_t *, const uint8_t *, const uint8_t *, uint8_t *, int, int, int, float **, isa_t);
+static inline void convolute_float_tail(const uint8_t *, const uint8_t *, const uint8_t *, uint8_t *, int, int, int, float **);
+isa_t detect_isa(void);
+const char *isa_name(isa_t);
+double tune_tile(uint8_t *, uint8_t *, int, int, int, int, int, int, filter_t *, color_t);
+static inline void convolute_fixed_row(const uint8_t *restrict, const uint8_t *restrict, const uint8_t *restrict, uint8_t *restrict, int, int, int);
+void convolute_separable(uint8_t *, uint8_t *, int, int, int, int, int, const filter_t *, color_t);
+static inline void separable_row(const uint8_t *restrict, unsigned *restrict, int, int, const unsigned *);
+int split_separable(int [3][3], int, filter_t *);
+void convolute_tblock(uint8_t *, uint8_t *, uint8_t **, int, int, int, int, const int [4], int, int, int, const filter_t *, color_t);
+void convolute_overlap(uint8_t *, uint8_t *, int, int, int, int, MPI_Request *, const int *, int, const filter_t *, color_t, int, size_t);
+void Usage(int, char **, job_t **, int *, char **, int *, options_t *);
+int add_job(job_t **, int *, char **, int *, const char *, const char *, const char *, int, int, int, color_t);
+void read_manifest(const char *, const char *, job_t **, int *, char **, int *);
+int same_geometry(const job_t *, const job_t *);
 uint8_t *offset(uint8_t *, int, int, int);
+uint8_t *alloc_first_touch(int, int, size_t);
+int bind_threads(MPI_Comm, char *, size_t);
+int compare_cpus(const void *, const void *);
+void split_planes(const uint8_t *, size_t, uint8_t *, size_t, size_t, int, int);
+void merge_planes(const uint8_t *, size_t, size_t, uint8_t *, size_t, int, int);
+void halo_type(int, int, int, int, MPI_Aint, MPI_Datatype *);
+void convolute_planes(uint8_t *, uint8_t *, int, int, int, int, int, int, const filter_t *, color_t, int, size_t);
 int divide_rows(int, int, int);
+int block_extent(int, int, int, int *);
+int is_pnm(const char *);
+const char *base_name(const char *);
+long read_pnm_header(const char *, int *, int *, color_t *);
+int write_block(const char *, int, uint8_t *, MPI_Datatype, MPI_Datatype, int, int, color_t);
+int write_checkpoint(const char *, int, uint8_t *, MPI_Datatype, MPI_Datatype, int, int, color_t);
 
 
 int main(int argc, char** argv) {
 	int thread_count = 4;
-	int fd, i, j, k, width, height, loops, t, row_div, col_div, rows, cols;
-	double timer, remote_time;
+	int fd, i, j, k, width = 0, height = 0, loops, t, row_div, col_div, rows, cols, checkpoints;
+	double timer, remote_time, float_timer;
+	double io_time[3], max_io_time[3];	/* read, write, checkpoints */
 	char *image;
-	color_t imageType;
+	color_t imageType = GREY;
+	options_t opts;
+	int pass, steps;
+	/* One job per image: a single one from the command line, or one per line of the --batch manifest */
+	job_t *jobs = NULL;
+	char *names = NULL;
+	int njobs = 0, names_len = 0, job;
 	/* MPI world topology */
-    int process_id, num_processes;
-	/* Find current task id */
-    MPI_Init(&argc, &argv);
+    int process_id, num_processes, provided;
+	/* Find current task id; --overlap calls MPI from the master thread only, while the others compute */
+    MPI_Init_thread(&argc, &argv, MPI_THREAD_FUNNELED, &provided);
     MPI_Comm_size(MPI_COMM_WORLD, &num_processes);
     MPI_Comm_rank(MPI_COMM_WORLD, &process_id);
 	omp_set_dynamic(0);
 	omp_set_num_threads(thread_count);
+	/* convolute() is also called from inside the temporal-blocking loop; keep those calls serial */
+	omp_set_max_active_levels(1);
 	/* MPI status */
     MPI_Status status;
 	/* MPI data types */
-    MPI_Datatype grey_col_type;
-    MPI_Datatype rgb_col_type;
-    MPI_Datatype grey_row_type;
-    MPI_Datatype rgb_row_type;
+    MPI_Datatype row_type;
+    MPI_Datatype col_type;
+    MPI_Datatype corner_type;
+    MPI_Datatype file_type;
+    MPI_Datatype block_type;
 	/* MPI requests */
     MPI_Request send_north_req;
     MPI_Request send_south_req;
@@ -58,53 +190,47 @@ int main(int argc, char** argv) {
 		   TAG_NW = 20, TAG_NE = 21, TAG_SW = 22, TAG_SE = 23 };
 	
 	/* Neighbours */
-	int north = -1;
-	int south = -1;
-    int west = -1;
-    int east = -1;
+	int north, south, west, east, nw, ne, sw, se;
 
     /* Check arguments */
-    if (process_id == 0) {
-		Usage(argc, argv, &image, &width, &height, &loops, &imageType);
-		/* Division of data in each process */
-		row_div = divide_rows(height, width, num_processes);
-		if (row_div <= 0 || height % row_div || num_processes % row_div || width % (col_div = num_processes / row_div)) {
-				fprintf(stderr, "%s: Cannot divide to processes\n", argv[0]);
-				MPI_Abort(MPI_COMM_WORLD, EXIT_FAILURE);
-				return EXIT_FAILURE;
+    if (process_id == 0)
+		Usage(argc, argv, &jobs, &njobs, &names, &names_len, &opts);
+	/* Broadcast options and jobs: options_t and job_t only hold ints, job names are offsets into one string table */
+	MPI_Bcast(&opts, sizeof(options_t), MPI_BYTE, 0, MPI_COMM_WORLD);
+	MPI_Bcast(&njobs, 1, MPI_INT, 0, MPI_COMM_WORLD);
+	MPI_Bcast(&names_len, 1, MPI_INT, 0, MPI_COMM_WORLD);
+	if (process_id != 0) {
+		jobs = malloc(njobs * sizeof(job_t));
+		names = malloc(names_len);
+	}
+	MPI_Bcast(jobs, njobs * sizeof(job_t), MPI_BYTE, 0, MPI_COMM_WORLD);
+	MPI_Bcast(names, names_len, MPI_CHAR, 0, MPI_COMM_WORLD);
+	if (opts.threads > 0) {
+		thread_count = opts.threads;
+		omp_set_num_threads(thread_count);
+	}
+
+	/* Pin the threads before the first buffer is touched; one stderr line per rank says where they run */
+	if (opts.bind) {
+		MPI_Comm node;
+		char report[BIND_REPORT], *reports = NULL, host[MPI_MAX_PROCESSOR_NAME];
+		int host_len;
+		MPI_Get_processor_name(host, &host_len);
+		MPI_Comm_split_type(MPI_COMM_WORLD, MPI_COMM_TYPE_SHARED, 0, MPI_INFO_NULL, &node);
+		i = snprintf(report, sizeof(report), "rank %d on %s: ", process_id, host);
+		if (bind_threads(node, report + i, sizeof(report) - i) != 0)
+			snprintf(report + i, sizeof(report) - i, "no thread affinity on this platform, threads not bound");
+		MPI_Comm_free(&node);
+		if (process_id == 0)
+			reports = malloc((size_t)num_processes * BIND_REPORT);
+		MPI_Gather(report, BIND_REPORT, MPI_CHAR, reports, BIND_REPORT, MPI_CHAR, 0, MPI_COMM_WORLD);
+		if (process_id == 0) {
+			for (i = 0 ; reports != NULL && i < num_processes ; i++)
+				fprintf(stderr, "bind: %s\n", reports + (size_t)i * BIND_REPORT);
+			free(reports);
 		}
 	}
-	if (process_id != 0) {
-		image = malloc((strlen(argv[1])+1) * sizeof(char));
-		strcpy(image, argv[1]);
-	}
-	/* Broadcast parameters */
-    MPI_Bcast(&width, 1, MPI_INT, 0, MPI_COMM_WORLD);
-    MPI_Bcast(&height, 1, MPI_INT, 0, MPI_COMM_WORLD);
-    MPI_Bcast(&loops, 1, MPI_INT, 0, MPI_COMM_WORLD);
-    MPI_Bcast(&imageType, 1, MPI_INT, 0, MPI_COMM_WORLD);
-	MPI_Bcast(&row_div, 1, MPI_INT, 0, MPI_COMM_WORLD);
-    MPI_Bcast(&col_div, 1, MPI_INT, 0, MPI_COMM_WORLD);
-	
-	/* Compute number of rows per process */
-	rows = height / row_div;
-	cols = width / col_div;
-
-	/* Create column data type for grey & rgb */
-	MPI_Type_vector(rows, 1, cols+2, MPI_BYTE, &grey_col_type);
-	MPI_Type_commit(&grey_col_type);
-	MPI_Type_vector(rows, 3, 3*cols+6, MPI_BYTE, &rgb_col_type);
-	MPI_Type_commit(&rgb_col_type);
-	/* Create row data type */
-	MPI_Type_contiguous(cols, MPI_BYTE, &grey_row_type);
-	MPI_Type_commit(&grey_row_type);
-	MPI_Type_contiguous(3*cols, MPI_BYTE, &rgb_row_type);
-	MPI_Type_commit(&rgb_row_type);
-
-	 /* Compute starting row and column */
-    int start_row = (process_id / col_div) * rows;
-    int start_col = (process_id % col_div) * cols;
-	
+
 	/* Init filters */
 	int box_blur[3][3] = {{1, 1, 1}, {1, 1, 1}, {1, 1, 1}};
 	int gaussian_blur[3][3] = {{1, 2, 1}, {2, 4, 2}, {1, 2, 1}};
@@ -112,244 +238,510 @@ int main(int argc, char** argv) {
 	float **h = malloc(3 * sizeof(float *));
 	for (i = 0 ; i < 3 ; i++)
 		h[i] = malloc(3 * sizeof(float));
+	int (*taps)[3] = gaussian_blur;
+	int divisor = 16;
+	if (opts.kernel == BOX) {
+		taps = box_blur;
+		divisor = 9;
+	} else if (opts.kernel == EDGE) {
+		taps = edge_detection;
+		divisor = 28;
+	}
 	for (i = 0 ; i < 3 ; i++) {
 		for (j = 0 ; j < 3 ; j++){
-			// h[i][j] = box_blur[i][j] / 9.0;
-			h[i][j] = gaussian_blur[i][j] / 16.0;
-			// h[i][j] = edge_detection[i][j] / 28.0;
+			h[i][j] = taps[i][j] / (float)divisor;
+		}
+	}
+	filter_t reference = {0}, filter = {0};
+	reference.h = filter.h = h;
+	filter.fixed = opts.fixed;
+	if (opts.separable) {
+		filter.separable = split_separable(taps, divisor, &filter);
+		if (!filter.separable && process_id == 0)
+			fprintf(stderr, "%s: kernel is not rank-1, using the 2-D path\n", argv[0]);
+	}
+	/* Float path kernels: the widest this CPU runs, or the ones --isa names */
+	filter.isa = detect_isa();
+	if (opts.isa != ISA_AUTO) {
+		if (opts.isa > filter.isa) {
+			fprintf(stderr, "%s: this CPU does not run --isa %s\n", argv[0], isa_name(opts.isa));
+			MPI_Abort(MPI_COMM_WORLD, EXIT_FAILURE);
+			return EXIT_FAILURE;
 		}
+		filter.isa = opts.isa;
+	}
+	filter.tile_rows = opts.tile_rows;
+	filter.tile_cols = opts.tile_cols;
+	/* --compare on its own measures the fixed path (Gaussian only); with --isa it checks those kernels against the scalar ones */
+	if (opts.compare && !filter.fixed && !filter.separable && opts.kernel == GAUSSIAN && opts.isa == ISA_AUTO)
+		filter.fixed = 1;
+	if (!filter.fixed && !filter.separable && process_id == 0)
+		fprintf(stderr, "isa: %s\n", isa_name(filter.isa));
+	/* Every process needs the thread level, or none of them overlaps */
+	MPI_Allreduce(MPI_IN_PLACE, &provided, 1, MPI_INT, MPI_MIN, MPI_COMM_WORLD);
+	if (opts.overlap && provided < MPI_THREAD_FUNNELED) {
+		if (process_id == 0)
+			fprintf(stderr, "%s: MPI does not provide MPI_THREAD_FUNNELED, running without --overlap\n", argv[0]);
+		opts.overlap = 0;
 	}
 
-	/* Init arrays */
-	uint8_t *src = NULL, *dst = NULL, *tmpbuf = NULL, *tmp = NULL;
-	MPI_File fh;
-	int filesize, bufsize, nbytes;
-	if (imageType == GREY) {
-		filesize = width * height;
-		bufsize = filesize / num_processes;
-		nbytes = bufsize / sizeof(uint8_t);
-		src = calloc((rows+2) * (cols+2), sizeof(uint8_t));
-		dst = calloc((rows+2) * (cols+2), sizeof(uint8_t));
-	} else if (imageType == RGB) {
-		filesize = width*3 * height;
-		bufsize = filesize / num_processes;
-		nbytes = bufsize / sizeof(uint8_t);
-		src = calloc((rows+2) * (cols*3+6), sizeof(uint8_t));
-		dst = calloc((rows+2) * (cols*3+6), sizeof(uint8_t));
-	}
-	if (src == NULL || dst == NULL) {
-        fprintf(stderr, "%s: Not enough memory\n", argv[0]);
-        MPI_Abort(MPI_COMM_WORLD, EXIT_FAILURE);
-        return EXIT_FAILURE;
-	}
-
-	/* Parallel read */
-	MPI_File_open(MPI_COMM_WORLD, image, MPI_MODE_RDONLY, MPI_INFO_NULL, &fh);
-	if (imageType == GREY) {
-		for (i = 1 ; i <= rows ; i++) {
-			MPI_File_seek(fh, (start_row + i-1) * width + start_col, MPI_SEEK_SET);
-			tmpbuf = offset(src, i, 1, cols+2);
-			MPI_File_read(fh, tmpbuf, cols, MPI_BYTE, &status);
+	/* Halo depth: --tblock T applies T iterations per exchange, so it needs T ghost rows/cols */
+	int halo = (opts.tblock > 1) ? opts.tblock : 1;
+	/* Every job is checked before the first one runs */
+	for (job = 0 ; job < njobs ; job++) {
+		/* --grid RxC replaces the split divide_rows() picks */
+		row_div = opts.grid_rows ? opts.grid_rows : divide_rows(jobs[job].height, jobs[job].width, num_processes);
+		if (opts.grid_rows && (opts.grid_rows * opts.grid_cols != num_processes || opts.grid_rows > jobs[job].height || opts.grid_cols > jobs[job].width)) {
+			if (process_id == 0)
+				fprintf(stderr, "%s: --grid %dx%d does not split %s over %d processes\n", argv[0], opts.grid_rows, opts.grid_cols, names + jobs[job].image, num_processes);
+			MPI_Abort(MPI_COMM_WORLD, EXIT_FAILURE);
+			return EXIT_FAILURE;
 		}
-	} else if (imageType == RGB) {
-		for (i = 1 ; i <= rows ; i++) {
-			MPI_File_seek(fh, 3*(start_row + i-1) * width + 3*start_col, MPI_SEEK_SET);
-			tmpbuf = offset(src, i, 3, cols*3+6);
-			MPI_File_read(fh, tmpbuf, cols*3, MPI_BYTE, &status);
-		}
-	}
-	MPI_File_close(&fh);
-
-	/* Compute neighbours */
-    if (start_row != 0)
-        north = process_id - col_div;
-    if (start_row + rows != height)
-        south = process_id + col_div;
-    if (start_col != 0)
-        west = process_id - 1;
-    if (start_col + cols != width)
-        east = process_id + 1;
-	int nw = (north != -1 && west != -1) ? process_id - col_div - 1 : -1;
-	int ne = (north != -1 && east != -1) ? process_id - col_div + 1 : -1;
-	int sw = (south != -1 && west != -1) ? process_id + col_div - 1 : -1;
-	int se = (south != -1 && east != -1) ? process_id + col_div + 1 : -1;
-	
-	/* Get time before */
-	MPI_Barrier(MPI_COMM_WORLD);
-    timer = MPI_Wtime();
-	/* Convolute "loops" times */
-	for (t = 0 ; t < loops ; t++) {
-        /* Send and request borders */
-		if (imageType == GREY) {
-			if (north != -1) {
-				MPI_Isend(offset(src, 1, 1, cols+2), 1, grey_row_type, north, TAG_S, MPI_COMM_WORLD, &send_north_req);
-				MPI_Irecv(offset(src, 0, 1, cols+2), 1, grey_row_type, north, TAG_N, MPI_COMM_WORLD, &recv_north_req);
-			}
-			if (west != -1) {
-				MPI_Isend(offset(src, 1, 1, cols+2), 1, grey_col_type,  west, TAG_E, MPI_COMM_WORLD, &send_west_req);
-				MPI_Irecv(offset(src, 1, 0, cols+2), 1, grey_col_type,  west, TAG_W, MPI_COMM_WORLD, &recv_west_req);
-			}
-			if (south != -1) {
-				MPI_Isend(offset(src, rows, 1, cols+2), 1, grey_row_type, south, TAG_N, MPI_COMM_WORLD, &send_south_req);
-				MPI_Irecv(offset(src, rows+1, 1, cols+2), 1, grey_row_type, south, TAG_S, MPI_COMM_WORLD, &recv_south_req);
-			}
-			if (east != -1) {
-				MPI_Isend(offset(src, 1, cols, cols+2), 1, grey_col_type,  east, TAG_W, MPI_COMM_WORLD, &send_east_req);
-				MPI_Irecv(offset(src, 1, cols+1, cols+2), 1, grey_col_type,  east, TAG_E, MPI_COMM_WORLD, &recv_east_req);
-			}
-			if (nw != -1) {
-				MPI_Isend(offset(src, 1, 1, cols+2), 1, MPI_BYTE, nw, TAG_SE, MPI_COMM_WORLD, &send_nw_req);
-				MPI_Irecv(offset(src, 0, 0, cols+2), 1, MPI_BYTE, nw, TAG_NW, MPI_COMM_WORLD, &recv_nw_req);
-			}
-			if (ne != -1) {
-				MPI_Isend(offset(src, 1, cols, cols+2), 1, MPI_BYTE, ne, TAG_SW, MPI_COMM_WORLD, &send_ne_req);
-				MPI_Irecv(offset(src, 0, cols+1, cols+2), 1, MPI_BYTE, ne, TAG_NE, MPI_COMM_WORLD, &recv_ne_req);
-			}
-			if (sw != -1) {
-				MPI_Isend(offset(src, rows, 1, cols+2), 1, MPI_BYTE, sw, TAG_NE, MPI_COMM_WORLD, &send_sw_req);
-				MPI_Irecv(offset(src, rows+1, 0, cols+2), 1, MPI_BYTE, sw, TAG_SW, MPI_COMM_WORLD, &recv_sw_req);
-			}
-			if (se != -1) {
-				MPI_Isend(offset(src, rows, cols, cols+2), 1, MPI_BYTE, se, TAG_NW, MPI_COMM_WORLD, &send_se_req);
-				MPI_Irecv(offset(src, rows+1, cols+1, cols+2), 1, MPI_BYTE, se, TAG_SE, MPI_COMM_WORLD, &recv_se_req);
-			}
-		} else if (imageType == RGB) {
-			if (north != -1) {
-				MPI_Isend(offset(src, 1, 3, 3*cols+6), 1, rgb_row_type, north, TAG_S, MPI_COMM_WORLD, &send_north_req);
-				MPI_Irecv(offset(src, 0, 3, 3*cols+6), 1, rgb_row_type, north, TAG_N, MPI_COMM_WORLD, &recv_north_req);
-			}
-			if (west != -1) {
-				MPI_Isend(offset(src, 1, 3, 3*cols+6), 1, rgb_col_type,  west, TAG_E, MPI_COMM_WORLD, &send_west_req);
-				MPI_Irecv(offset(src, 1, 0, 3*cols+6), 1, rgb_col_type,  west, TAG_W, MPI_COMM_WORLD, &recv_west_req);
+		if (row_div <= 0) {
+			if (process_id == 0)
+				fprintf(stderr, "%s: Cannot divide %s to processes\n", argv[0], names + jobs[job].image);
+			MPI_Abort(MPI_COMM_WORLD, EXIT_FAILURE);
+			return EXIT_FAILURE;
+		}
+		col_div = num_processes / row_div;
+		/* Checked against the smallest block so that every process agrees */
+		if (halo > jobs[job].height / row_div || halo > jobs[job].width / col_div) {
+			if (process_id == 0)
+				fprintf(stderr, "%s: --tblock %d exceeds the smallest %dx%d block of a process\n", argv[0], halo, jobs[job].height / row_div, jobs[job].width / col_div);
+			MPI_Abort(MPI_COMM_WORLD, EXIT_FAILURE);
+			return EXIT_FAILURE;
+		}
+	}
+
+	/* State that only depends on the geometry; kept from one job to the next while the geometry does not change */
+	int start_row, start_col, ch, pitch, stride;
+	/* --planar rgb: three grey planes plane_len bytes apart, read and written through an interleaved stage */
+	int planes = 1, p, file_ch;
+	size_t plane_len = 0;
+	color_t layout = GREY;
+	uint8_t *stage = NULL;
+	uint8_t *src = NULL, *dst = NULL, *tmp = NULL;
+	MPI_File fh;
+	int grow[4];
+	int nthreads = omp_get_max_threads();
+	int band;
+	uint8_t **scratch = NULL;
+
+	for (job = 0 ; job < njobs ; job++) {
+		image = names + jobs[job].image;
+		loops = jobs[job].loops;
+		if (job == 0 || !same_geometry(&jobs[job], &jobs[job - 1])) {
+			width = jobs[job].width;
+			height = jobs[job].height;
+			imageType = jobs[job].imageType;
+
+			/* Division of data in each process */
+			row_div = opts.grid_rows ? opts.grid_rows : divide_rows(height, width, num_processes);
+			col_div = num_processes / row_div;
+
+			/* Compute rows/cols and starting row/column of this process; remainders go to the first blocks */
+			rows = block_extent(height, row_div, process_id / col_div, &start_row);
+			cols = block_extent(width, col_div, process_id % col_div, &start_col);
+
+			/*
+			 * A local block is (rows + 2*halo) x (cols + 2*halo) pixels. For convolute()
+			 * that is a pitch-wide image with the usual 1 pixel of padding, and the
+			 * block itself starts at row/column `halo`.
+			 * Under --planar each rgb plane is laid out like a grey block.
+			 */
+			planes = (opts.planar && imageType == RGB) ? 3 : 1;
+			layout = (planes > 1) ? GREY : imageType;
+			ch = (layout == GREY) ? 1 : 3;
+			file_ch = (imageType == GREY) ? 1 : 3;
+			pitch = cols + 2 * halo - 2;
+			stride = (cols + 2 * halo) * ch;
+			plane_len = (size_t)(rows + 2 * halo) * stride;
+
+			/* Create halo data types: halo rows, halo columns and halo x halo corners, of every plane */
+			halo_type(halo, cols * ch, stride, planes, (MPI_Aint)plane_len, &row_type);
+			halo_type(rows, halo * ch, stride, planes, (MPI_Aint)plane_len, &col_type);
+			halo_type(halo, halo * ch, stride, planes, (MPI_Aint)plane_len, &corner_type);
+
+			/* Create I/O data types: the block inside the whole image file and inside the halo-padded buffer (the stage under --planar) */
+			int file_sizes[2] = {height, width * file_ch}, block_sizes[2] = {rows, cols * file_ch};
+			int file_starts[2] = {start_row, start_col * file_ch}, block_starts[2] = {halo, halo * ch};
+			int buf_sizes[2] = {rows + 2 * halo, stride};
+			MPI_Type_create_subarray(2, file_sizes, block_sizes, file_starts, MPI_ORDER_C, MPI_BYTE, &file_type);
+			MPI_Type_commit(&file_type);
+			if (planes > 1)
+				MPI_Type_contiguous(rows * cols * file_ch, MPI_BYTE, &block_type);
+			else
+				MPI_Type_create_subarray(2, buf_sizes, block_sizes, block_starts, MPI_ORDER_C, MPI_BYTE, &block_type);
+			MPI_Type_commit(&block_type);
+
+			/* Init arrays */
+			src = alloc_first_touch(planes, rows + 2 * halo, stride);
+			dst = alloc_first_touch(planes, rows + 2 * halo, stride);
+			if (planes > 1)
+				stage = malloc((size_t)rows * cols * file_ch);
+			if (src == NULL || dst == NULL || (planes > 1 && stage == NULL)) {
+		        fprintf(stderr, "%s: Not enough memory\n", argv[0]);
+		        MPI_Abort(MPI_COMM_WORLD, EXIT_FAILURE);
+		        return EXIT_FAILURE;
 			}
-			if (south != -1) {
-				MPI_Isend(offset(src, rows, 3, 3*cols+6), 1, rgb_row_type, south, TAG_N, MPI_COMM_WORLD, &send_south_req);
-				MPI_Irecv(offset(src, rows+1, 3, 3*cols+6), 1, rgb_row_type, south, TAG_S, MPI_COMM_WORLD, &recv_south_req);
+
+			/* Compute neighbours */
+			north = south = west = east = -1;
+		    if (start_row != 0)
+		        north = process_id - col_div;
+		    if (start_row + rows != height)
+		        south = process_id + col_div;
+		    if (start_col != 0)
+		        west = process_id - 1;
+		    if (start_col + cols != width)
+		        east = process_id + 1;
+			nw = (north != -1 && west != -1) ? process_id - col_div - 1 : -1;
+			ne = (north != -1 && east != -1) ? process_id - col_div + 1 : -1;
+			sw = (south != -1 && west != -1) ? process_id + col_div - 1 : -1;
+			se = (south != -1 && east != -1) ? process_id + col_div + 1 : -1;
+			grow[0] = north != -1;
+			grow[1] = south != -1;
+			grow[2] = west != -1;
+			grow[3] = east != -1;
+
+			/* Temporal blocking: one scratch pair per thread, sized for one band and its trapezoid */
+			band = opts.tblock_rows;
+			if (halo > 1) {
+				if (band <= 0)
+					band = TBLOCK_CACHE_BYTES / (2 * stride) - 2 * halo;
+				/* At least one band per thread */
+				band = MAX(MIN(band, (rows + nthreads - 1) / nthreads), 1);
+				scratch = calloc(2 * (size_t)nthreads, sizeof(uint8_t *));
+				for (i = 0 ; scratch != NULL && i < 2 * nthreads ; i++) {
+					if ((scratch[i] = calloc((size_t)(band + 2 * halo) * stride, sizeof(uint8_t))) == NULL) {
+						free(scratch);
+						scratch = NULL;
+					}
+				}
+				if (scratch == NULL) {
+					fprintf(stderr, "%s: Not enough memory\n", argv[0]);
+					MPI_Abort(MPI_COMM_WORLD, EXIT_FAILURE);
+					return EXIT_FAILURE;
+				}
 			}
-			if (east != -1) {
-				MPI_Isend(offset(src, 1, 3*cols, 3*cols+6), 1, rgb_col_type,  east, TAG_W, MPI_COMM_WORLD, &send_east_req);
-				MPI_Irecv(offset(src, 1, 3*cols+3, 3*cols+6), 1, rgb_col_type,  east, TAG_E, MPI_COMM_WORLD, &recv_east_req);
+
+			/* --tile auto: one tile shape per geometry, picked on the block before the first timed sweep */
+			if (opts.tile_auto) {
+				double spent = tune_tile(src, dst, halo, rows+halo-1, halo, cols+halo-1, pitch, rows, &filter, layout);
+				if (process_id == 0)
+					fprintf(stderr, "tile: %dx%d (auto, %f s)\n", filter.tile_rows, filter.tile_cols, spent);
 			}
-			if (nw != -1) {
-				MPI_Isend(offset(src, 1, 3, 3*cols+6), 3, MPI_BYTE, nw, TAG_SE, MPI_COMM_WORLD, &send_nw_req);
-				MPI_Irecv(offset(src, 0, 0, 3*cols+6), 3, MPI_BYTE, nw, TAG_NW, MPI_COMM_WORLD, &recv_nw_req);
+		}
+		checkpoints = 0;
+		float_timer = 0.0;
+		io_time[0] = io_time[1] = io_time[2] = 0.0;
+
+		/* Parallel read: one collective call through the file view (past any PGM/PPM header), straight into the halo-padded buffer */
+		io_time[0] = MPI_Wtime();
+		if (MPI_File_open(MPI_COMM_WORLD, names + jobs[job].input, MPI_MODE_RDONLY, MPI_INFO_NULL, &fh) != MPI_SUCCESS) {
+			if (process_id == 0)
+				fprintf(stderr, "%s: Cannot read input file %s\n", argv[0], names + jobs[job].input);
+			MPI_Abort(MPI_COMM_WORLD, EXIT_FAILURE);
+			return EXIT_FAILURE;
+		}
+		MPI_File_set_view(fh, jobs[job].header, MPI_BYTE, file_type, "native", MPI_INFO_NULL);
+		MPI_File_read_all(fh, (planes > 1) ? stage : src, 1, block_type, &status);
+		MPI_File_close(&fh);
+		if (planes > 1)
+			split_planes(stage, (size_t)cols * file_ch, src + (size_t)halo * stride + halo, stride, plane_len, rows, cols);
+		io_time[0] = MPI_Wtime() - io_time[0];
+
+		/* Compare mode: pass 0 runs the float 2-D path, pass 1 the selected path on the same input */
+		size_t buf_len = planes * plane_len;
+		uint8_t *orig = NULL, *ref = NULL;
+		if (opts.compare) {
+			orig = malloc(buf_len);
+			ref = malloc(buf_len);
+			if (orig == NULL || ref == NULL) {
+				fprintf(stderr, "%s: Not enough memory\n", argv[0]);
+				MPI_Abort(MPI_COMM_WORLD, EXIT_FAILURE);
+				return EXIT_FAILURE;
 			}
-			if (ne != -1) {
-				MPI_Isend(offset(src, 1, 3*cols, 3*cols+6), 3, MPI_BYTE, ne, TAG_SW, MPI_COMM_WORLD, &send_ne_req);
-				MPI_Irecv(offset(src, 0, 3*cols+3, 3*cols+6), 3, MPI_BYTE, ne, TAG_NE, MPI_COMM_WORLD, &recv_ne_req);
+			memcpy(orig, src, buf_len);
+		}
+
+		for (pass = 0 ; pass < (opts.compare ? 2 : 1) ; pass++) {
+			const filter_t *active = (opts.compare && pass == 0) ? &reference : &filter;
+			if (opts.compare && pass)
+				memcpy(src, orig, buf_len);
+
+			/* Get time before */
+			MPI_Barrier(MPI_COMM_WORLD);
+		    timer = MPI_Wtime();
+			/* Convolute up to iteration "loops" */
+			for (t = opts.start ; t < loops ; t += steps) {
+				/* Iterations until the next exchange; the --compare reference pass steps one at a time */
+				steps = (halo > 1 && active == &filter) ? MIN(halo, loops - t) : 1;
+				/* Exchanges line up with checkpoints */
+				if (opts.checkpoint)
+					steps = MIN(steps, opts.checkpoint - t % opts.checkpoint);
+
+		        /* Send and request borders */
+				if (north != -1) {
+					MPI_Isend(offset(src, halo, halo*ch, stride), 1, row_type, north, TAG_S, MPI_COMM_WORLD, &send_north_req);
+					MPI_Irecv(offset(src, 0, halo*ch, stride), 1, row_type, north, TAG_N, MPI_COMM_WORLD, &recv_north_req);
+				}
+				if (west != -1) {
+					MPI_Isend(offset(src, halo, halo*ch, stride), 1, col_type,  west, TAG_E, MPI_COMM_WORLD, &send_west_req);
+					MPI_Irecv(offset(src, halo, 0, stride), 1, col_type,  west, TAG_W, MPI_COMM_WORLD, &recv_west_req);
+				}
+				if (south != -1) {
+					MPI_Isend(offset(src, rows, halo*ch, stride), 1, row_type, south, TAG_N, MPI_COMM_WORLD, &send_south_req);
+					MPI_Irecv(offset(src, rows+halo, halo*ch, stride), 1, row_type, south, TAG_S, MPI_COMM_WORLD, &recv_south_req);
+				}
+				if (east != -1) {
+					MPI_Isend(offset(src, halo, cols*ch, stride), 1, col_type,  east, TAG_W, MPI_COMM_WORLD, &send_east_req);
+					MPI_Irecv(offset(src, halo, (cols+halo)*ch, stride), 1, col_type,  east, TAG_E, MPI_COMM_WORLD, &recv_east_req);
+				}
+				if (nw != -1) {
+					MPI_Isend(offset(src, halo, halo*ch, stride), 1, corner_type, nw, TAG_SE, MPI_COMM_WORLD, &send_nw_req);
+					MPI_Irecv(offset(src, 0, 0, stride), 1, corner_type, nw, TAG_NW, MPI_COMM_WORLD, &recv_nw_req);
+				}
+				if (ne != -1) {
+					MPI_Isend(offset(src, halo, cols*ch, stride), 1, corner_type, ne, TAG_SW, MPI_COMM_WORLD, &send_ne_req);
+					MPI_Irecv(offset(src, 0, (cols+halo)*ch, stride), 1, corner_type, ne, TAG_NE, MPI_COMM_WORLD, &recv_ne_req);
+				}
+				if (sw != -1) {
+					MPI_Isend(offset(src, rows, halo*ch, stride), 1, corner_type, sw, TAG_NE, MPI_COMM_WORLD, &send_sw_req);
+					MPI_Irecv(offset(src, rows+halo, 0, stride), 1, corner_type, sw, TAG_SW, MPI_COMM_WORLD, &recv_sw_req);
+				}
+				if (se != -1) {
+					MPI_Isend(offset(src, rows, cols*ch, stride), 1, corner_type, se, TAG_NW, MPI_COMM_WORLD, &send_se_req);
+					MPI_Irecv(offset(src, rows+halo, (cols+halo)*ch, stride), 1, corner_type, se, TAG_SE, MPI_COMM_WORLD, &recv_se_req);
+				}
+
+				if (steps == 1 && opts.overlap) {
+					/* Interior and borders as tasks; each border starts once the halos it reads have arrived */
+					MPI_Request recv_reqs[8];
+					int recv_bits[8], recv_count = 0;
+					if (north != -1) { recv_reqs[recv_count] = recv_north_req; recv_bits[recv_count++] = HALO_N; }
+					if (south != -1) { recv_reqs[recv_count] = recv_south_req; recv_bits[recv_count++] = HALO_S; }
+					if (west != -1)  { recv_reqs[recv_count] = recv_west_req;  recv_bits[recv_count++] = HALO_W; }
+					if (east != -1)  { recv_reqs[recv_count] = recv_east_req;  recv_bits[recv_count++] = HALO_E; }
+					if (nw != -1)    { recv_reqs[recv_count] = recv_nw_req;    recv_bits[recv_count++] = HALO_NW; }
+					if (ne != -1)    { recv_reqs[recv_count] = recv_ne_req;    recv_bits[recv_count++] = HALO_NE; }
+					if (sw != -1)    { recv_reqs[recv_count] = recv_sw_req;    recv_bits[recv_count++] = HALO_SW; }
+					if (se != -1)    { recv_reqs[recv_count] = recv_se_req;    recv_bits[recv_count++] = HALO_SE; }
+					convolute_overlap(src, dst, rows, cols, halo, pitch, recv_reqs, recv_bits, recv_count, active, layout, planes, plane_len);
+				} else {
+					/* Inner Data Convolute */
+					if (steps == 1 && rows >= 3 && cols >= 3)
+						convolute_planes(src, dst, halo+1, rows+halo-2, halo+1, cols+halo-2, pitch, rows, active, layout, planes, plane_len);
+
+					/* Wait for all receives, then compute boundary */
+					{
+						MPI_Request recv_reqs[8];
+						MPI_Status recv_stats[8];
+						int recv_count = 0;
+						if (north != -1) recv_reqs[recv_count++] = recv_north_req;
+						if (south != -1) recv_reqs[recv_count++] = recv_south_req;
+						if (west != -1)  recv_reqs[recv_count++] = recv_west_req;
+						if (east != -1)  recv_reqs[recv_count++] = recv_east_req;
+						if (nw != -1)    recv_reqs[recv_count++] = recv_nw_req;
+						if (ne != -1)    recv_reqs[recv_count++] = recv_ne_req;
+						if (sw != -1)    recv_reqs[recv_count++] = recv_sw_req;
+						if (se != -1)    recv_reqs[recv_count++] = recv_se_req;
+						MPI_Waitall(recv_count, recv_reqs, recv_stats);
+					}
+
+					if (steps > 1) {
+						/* All steps up to the next exchange, band by band, into the halo-wide trapezoid */
+						for (p = 0 ; p < planes ; p++)
+							convolute_tblock(src + p * plane_len, dst + p * plane_len, scratch, halo, rows+halo-1, halo, cols+halo-1, grow, steps, band, pitch, active, layout);
+					} else {
+						if (cols > 0 && rows > 0)
+							convolute_planes(src, dst, halo, halo, halo, cols+halo-1, pitch, rows, active, layout, planes, plane_len);
+						if (cols > 0 && rows > 1)
+							convolute_planes(src, dst, rows+halo-1, rows+halo-1, halo, cols+halo-1, pitch, rows, active, layout, planes, plane_len);
+						if (cols > 0 && rows > 2)
+							convolute_planes(src, dst, halo+1, rows+halo-2, halo, halo, pitch, rows, active, layout, planes, plane_len);
+						if (cols > 1 && rows > 2)
+							convolute_planes(src, dst, halo+1, rows+halo-2, cols+halo-1, cols+halo-1, pitch, rows, active, layout, planes, plane_len);
+					}
+				}
+
+				/* Wait to have sent all borders */
+				{
+					MPI_Request send_reqs[8];
+					MPI_Status send_stats[8];
+					int send_count = 0;
+					if (north != -1) send_reqs[send_count++] = send_north_req;
+					if (south != -1) send_reqs[send_count++] = send_south_req;
+					if (west != -1)  send_reqs[send_count++] = send_west_req;
+					if (east != -1)  send_reqs[send_count++] = send_east_req;
+					if (nw != -1)    send_reqs[send_count++] = send_nw_req;
+					if (ne != -1)    send_reqs[send_count++] = send_ne_req;
+					if (sw != -1)    send_reqs[send_count++] = send_sw_req;
+					if (se != -1)    send_reqs[send_count++] = send_se_req;
+					MPI_Waitall(send_count, send_reqs, send_stats);
+				}
+
+				/* swap arrays */
+				tmp = src;
+			    src = dst;
+			    dst = tmp;
+
+				/* Checkpoints come from the selected path only and are not timed; the last one is blur_<image> */
+				if (opts.checkpoint && active == &filter && (t + steps) % opts.checkpoint == 0 && t + steps < loops) {
+					double spent = MPI_Wtime();
+					if (planes > 1)
+						merge_planes(src + (size_t)halo * stride + halo, stride, plane_len, stage, (size_t)cols * file_ch, rows, cols);
+					if (write_checkpoint(image, t + steps, (planes > 1) ? stage : src, file_type, block_type, width, height, imageType) != 0) {
+						fprintf(stderr, "%s: Cannot write checkpoint %d\n", argv[0], t + steps);
+						MPI_Abort(MPI_COMM_WORLD, EXIT_FAILURE);
+					}
+					spent = MPI_Wtime() - spent;
+					io_time[2] += spent;
+					timer += spent;
+					checkpoints++;
+				}
 			}
-			if (sw != -1) {
-				MPI_Isend(offset(src, rows, 3, 3*cols+6), 3, MPI_BYTE, sw, TAG_NE, MPI_COMM_WORLD, &send_sw_req);
-				MPI_Irecv(offset(src, rows+1, 0, 3*cols+6), 3, MPI_BYTE, sw, TAG_SW, MPI_COMM_WORLD, &recv_sw_req);
+			/* Get time elapsed */
+		    timer = MPI_Wtime() - timer;
+
+			if (opts.compare && pass == 0) {
+				memcpy(ref, src, buf_len);
+				float_timer = timer;
 			}
-			if (se != -1) {
-				MPI_Isend(offset(src, rows, 3*cols, 3*cols+6), 3, MPI_BYTE, se, TAG_NW, MPI_COMM_WORLD, &send_se_req);
-				MPI_Irecv(offset(src, rows+1, 3*cols+3, 3*cols+6), 3, MPI_BYTE, se, TAG_SE, MPI_COMM_WORLD, &recv_se_req);
+		}
+
+		if (opts.compare) {
+			long long differ = 0, total_differ = 0, samples = (long long)height * width * file_ch;
+			int max_diff = 0, total_max_diff = 0, d;
+			double max_float_timer = 0.0;
+			size_t at;
+			for (p = 0 ; p < planes ; p++) {
+				for (i = halo ; i < rows + halo ; i++) {
+					for (j = halo * ch ; j < (cols + halo) * ch ; j++) {
+						at = p * plane_len + (size_t)i * stride + j;
+						d = abs((int)src[at] - (int)ref[at]);
+						if (d) {
+							differ++;
+							if (d > max_diff)
+								max_diff = d;
+						}
+					}
+				}
 			}
+			MPI_Reduce(&differ, &total_differ, 1, MPI_LONG_LONG, MPI_SUM, 0, MPI_COMM_WORLD);
+			MPI_Reduce(&max_diff, &total_max_diff, 1, MPI_INT, MPI_MAX, 0, MPI_COMM_WORLD);
+			MPI_Reduce(&float_timer, &max_float_timer, 1, MPI_DOUBLE, MPI_MAX, 0, MPI_COMM_WORLD);
+			if (process_id == 0)
+				fprintf(stderr, "compare: float 2-D %f s, %lld of %lld samples differ, max |diff| = %d\n",
+						max_float_timer, total_differ, samples, total_max_diff);
+			free(orig);
+			free(ref);
 		}
 
-		/* Inner Data Convolute */
-		if (rows >= 3 && cols >= 3)
-			convolute(src, dst, 2, rows-1, 2, cols-1, cols, rows, h, imageType);
+		/* Parallel write: --output PATH, or blur_<image> in the working directory */
+		const char *outImage = names + jobs[job].output;
+		io_time[1] = MPI_Wtime();
+		if (planes > 1)
+			merge_planes(src + (size_t)halo * stride + halo, stride, plane_len, stage, (size_t)cols * file_ch, rows, cols);
+		if (write_block(outImage, is_pnm(outImage), (planes > 1) ? stage : src, file_type, block_type, width, height, imageType) != 0) {
+			if (process_id == 0)
+				fprintf(stderr, "%s: Cannot write output file %s\n", argv[0], outImage);
+			MPI_Abort(MPI_COMM_WORLD, EXIT_FAILURE);
+			return EXIT_FAILURE;
+		}
+		io_time[1] = MPI_Wtime() - io_time[1];
 
-		/* Wait for all receives, then compute boundary */
-		{
-			MPI_Request recv_reqs[8];
-			MPI_Status recv_stats[8];
-			int recv_count = 0;
-			if (north != -1) recv_reqs[recv_count++] = recv_north_req;
-			if (south != -1) recv_reqs[recv_count++] = recv_south_req;
-			if (west != -1)  recv_reqs[recv_count++] = recv_west_req;
-			if (east != -1)  recv_reqs[recv_count++] = recv_east_req;
-			if (nw != -1)    recv_reqs[recv_count++] = recv_nw_req;
-			if (ne != -1)    recv_reqs[recv_count++] = recv_ne_req;
-			if (sw != -1)    recv_reqs[recv_count++] = recv_sw_req;
-			if (se != -1)    recv_reqs[recv_count++] = recv_se_req;
-			MPI_Waitall(recv_count, recv_reqs, recv_stats);
-		}
-
-		if (cols > 0 && rows > 0)
-			convolute(src, dst, 1, 1, 1, cols, cols, rows, h, imageType);
-		if (cols > 0 && rows > 1)
-			convolute(src, dst, rows, rows, 1, cols, cols, rows, h, imageType);
-		if (cols > 0 && rows > 2)
-			convolute(src, dst, 2, rows-1, 1, 1, cols, rows, h, imageType);
-		if (cols > 1 && rows > 2)
-			convolute(src, dst, 2, rows-1, cols, cols, cols, rows, h, imageType);
-
-		/* Wait to have sent all borders */
-		{
-			MPI_Request send_reqs[8];
-			MPI_Status send_stats[8];
-			int send_count = 0;
-			if (north != -1) send_reqs[send_count++] = send_north_req;
-			if (south != -1) send_reqs[send_count++] = send_south_req;
-			if (west != -1)  send_reqs[send_count++] = send_west_req;
-			if (east != -1)  send_reqs[send_count++] = send_east_req;
-			if (nw != -1)    send_reqs[send_count++] = send_nw_req;
-			if (ne != -1)    send_reqs[send_count++] = send_ne_req;
-			if (sw != -1)    send_reqs[send_count++] = send_sw_req;
-			if (se != -1)    send_reqs[send_count++] = send_se_req;
-			MPI_Waitall(send_count, send_reqs, send_stats);
-		}
-
-		/* swap arrays */
-		tmp = src;
-	    src = dst;
-	    dst = tmp;
-	}
-	/* Get time elapsed */
-    timer = MPI_Wtime() - timer;
-
-	/* Parallel write */
-	char *outImage = malloc((strlen(image) + 9) * sizeof(char));
-	strcpy(outImage, "blur_");
-	strcat(outImage, image);
-	MPI_File outFile;
-	MPI_File_open(MPI_COMM_WORLD, outImage, MPI_MODE_CREATE | MPI_MODE_WRONLY, MPI_INFO_NULL, &outFile);
-	if (imageType == GREY) {
-		for (i = 1 ; i <= rows ; i++) {
-			MPI_File_seek(outFile, (start_row + i-1) * width + start_col, MPI_SEEK_SET);
-			tmpbuf = offset(src, i, 1, cols+2);
-			MPI_File_write(outFile, tmpbuf, cols, MPI_BYTE, MPI_STATUS_IGNORE);
+		/* I/O times go to stderr so that the compute time stays the last line of stdout */
+		MPI_Reduce(io_time, max_io_time, 3, MPI_DOUBLE, MPI_MAX, 0, MPI_COMM_WORLD);
+		if (process_id == 0) {
+			fprintf(stderr, "io: read %f s, write %f s\n", max_io_time[0], max_io_time[1]);
+			if (opts.checkpoint)
+				fprintf(stderr, "checkpoint: %d written, %f s\n", checkpoints, max_io_time[2]);
 		}
-	} else if (imageType == RGB) {
-		for (i = 1 ; i <= rows ; i++) {
-			MPI_File_seek(outFile, 3*(start_row + i-1) * width + 3*start_col, MPI_SEEK_SET);
-			tmpbuf = offset(src, i, 3, cols*3+6);
-			MPI_File_write(outFile, tmpbuf, cols*3, MPI_BYTE, MPI_STATUS_IGNORE);
-		}
-	}
-	MPI_File_close(&outFile);
-
-	/* Get times from other processes and print maximum */
-    if (process_id != 0)
-        MPI_Send(&timer, 1, MPI_DOUBLE, 0, 0, MPI_COMM_WORLD);
-    else {
-        for (i = 1 ; i != num_processes ; ++i) {
-            MPI_Recv(&remote_time, 1, MPI_DOUBLE, i, 0, MPI_COMM_WORLD, &status);
-            if (remote_time > timer)
-                timer = remote_time;
-        }
-        printf("%f\n", timer);
-    }
 
-    /* De-allocate space */
-    free(src);
-    free(dst);
-    MPI_Type_free(&rgb_col_type);
-    MPI_Type_free(&rgb_row_type);
-    MPI_Type_free(&grey_col_type);
-    MPI_Type_free(&grey_row_type);
+		/* Get times from other processes and print maximum */
+	    if (process_id != 0)
+	        MPI_Send(&timer, 1, MPI_DOUBLE, 0, 0, MPI_COMM_WORLD);
+	    else {
+	        for (i = 1 ; i != num_processes ; ++i) {
+	            MPI_Recv(&remote_time, 1, MPI_DOUBLE, i, 0, MPI_COMM_WORLD, &status);
+	            if (remote_time > timer)
+	                timer = remote_time;
+	        }
+	        /* In batch mode the compute time stays the last token of each job line */
+	        if (opts.batch)
+	            printf("job %d %s %f\n", job + 1, outImage, timer);
+	        else
+	            printf("%f\n", timer);
+	    }
+
+		/* De-allocate the geometry state unless the next job can reuse it */
+		if (job + 1 == njobs || !same_geometry(&jobs[job], &jobs[job + 1])) {
+			free(src);
+			free(dst);
+			free(stage);
+			stage = NULL;
+			if (scratch != NULL) {
+				for (i = 0 ; i < 2 * nthreads ; i++)
+					free(scratch[i]);
+				free(scratch);
+				scratch = NULL;
+			}
+			MPI_Type_free(&row_type);
+			MPI_Type_free(&col_type);
+			MPI_Type_free(&corner_type);
+			MPI_Type_free(&file_type);
+			MPI_Type_free(&block_type);
+		}
+	}
+	free(jobs);
+	free(names);
 
 	/* Finalize and exit */
     MPI_Finalize();
 	return EXIT_SUCCESS;
 }
 
-void convolute(uint8_t *src, uint8_t *dst, int row_from, int row_to, int col_from, int col_to, int width, int height, float** h, color_t imageType) {
+void convolute(uint8_t *src, uint8_t *dst, int row_from, int row_to, int col_from, int col_to, int width, int height, const filter_t *f, color_t imageType) {
 	int i, j;
-	if (imageType == GREY) {
+	float **h = f->h;
+	/* --tile: 0 spans the whole range in that direction */
+	int tile_rows = f->tile_rows ? f->tile_rows : row_to - row_from + 1;
+	int tile_cols = f->tile_cols ? f->tile_cols : col_to - col_from + 1;
+	if (tile_rows > 0 && tile_cols > 0 && (tile_rows <= row_to - row_from || tile_cols <= col_to - col_from)) {
+		/* Cache blocking: the same sweep one tile at a time; static tiles keep each thread on the rows it first touched */
+		filter_t whole = *f;
+		int k, nr = (row_to - row_from) / tile_rows + 1, nc = (col_to - col_from) / tile_cols + 1;
+		whole.tile_rows = whole.tile_cols = 0;
+#pragma omp parallel for shared(src, dst) schedule(static)
+		for (k = 0 ; k < nr * nc ; k++) {
+			int r = row_from + (k / nc) * tile_rows, c = col_from + (k % nc) * tile_cols;
+			convolute(src, dst, r, MIN(r + tile_rows - 1, row_to), c, MIN(c + tile_cols - 1, col_to), width, height, &whole, imageType);
+		}
+	} else if (f->separable) {
+#pragma omp parallel
+		{
+			/* Each thread runs the two passes over its own contiguous block of rows */
+			int nt = omp_get_num_threads(), id = omp_get_thread_num(), total = row_to - row_from + 1;
+			convolute_separable(src, dst, row_from + total * id / nt, row_from + total * (id + 1) / nt - 1,
+					col_from, col_to, width, f, imageType);
+		}
+	} else if (f->fixed) {
+		int stride = (imageType == GREY) ? width+2 : width*3+6;
+#pragma omp parallel for shared(src, dst) schedule(static)
+		for (i = row_from ; i <= row_to ; i++) {
+			if (imageType == GREY)
+				convolute_fixed_row(src + (i-1)*stride, src + i*stride, src + (i+1)*stride, dst + i*stride, col_from, col_to + 1, 1);
+			else
+				convolute_fixed_row(src + (i-1)*stride, src + i*stride, src + (i+1)*stride, dst + i*stride, col_from*3, (col_to + 1)*3, 3);
+		}
+	} else if (f->isa != ISA_SCALAR) {
+		int ch = (imageType == GREY) ? 1 : 3;
+		int stride = width * ch + 2 * ch;
+#pragma omp parallel for shared(src, dst) schedule(static)
+		for (i = row_from ; i <= row_to ; i++)
+			convolute_float_row(src + (i-1)*stride, src + i*stride, src + (i+1)*stride, dst + i*stride, col_from*ch, (col_to + 1)*ch, ch, h, f->isa);
+	} else if (imageType == GREY) {
 #pragma omp parallel for shared(src, dst) schedule(static) collapse(2)
 		for (i = row_from ; i <= row_to ; i++)
 			for (j = col_from ; j <= col_to ; j++)
@@ -362,6 +754,53 @@ void convolute(uint8_t *src, uint8_t *dst, int row_from, int row_to, int col_fro
 	} 
 }
 
+/* convolute() on each of the planes of a --planar block, plane_len bytes apart; planes is 1 otherwise */
+void convolute_planes(uint8_t *src, uint8_t *dst, int row_from, int row_to, int col_from, int col_to, int width, int height, const filter_t *f, color_t imageType, int planes, size_t plane_len) {
+	int p;
+	for (p = 0 ; p < planes ; p++)
+		convolute(src + p * plane_len, dst + p * plane_len, row_from, row_to, col_from, col_to, width, height, f, imageType);
+}
+
+/*
+ * --tile auto: time a sweep of rows [row_from, row_to] x columns [col_from,
+ * col_to] with each candidate tile (best of TILE_TRIALS, slowest
+ * rank) and leave the fastest in f; collective over MPI_COMM_WORLD. The candidates are whole rows plus
+ * row bands and column strips whose three input rows and output row fit
+ * TILE_CACHE_BYTES, or a quarter of it. Returns the seconds spent; dst is
+ * overwritten.
+ */
+double tune_tile(uint8_t *src, uint8_t *dst, int row_from, int row_to, int col_from, int col_to, int width, int height, filter_t *f, color_t imageType) {
+	int fit = TILE_CACHE_BYTES / (4 * ((imageType == GREY) ? 1 : 3));
+	const int tile_rows[4] = {0, 8, 32, 128};
+	const int tile_cols[3] = {0, fit / 4, fit};
+	int r, c, trial, best_rows = 0, best_cols = 0;
+	double best = -1, elapsed = 0;
+	double begin = MPI_Wtime(), start;
+	for (r = 0 ; r < 4 ; r++) {
+		for (c = 0 ; c < 3 ; c++) {
+			f->tile_rows = tile_rows[r];
+			f->tile_cols = tile_cols[c];
+			for (trial = 0 ; trial < TILE_TRIALS ; trial++) {
+				start = MPI_Wtime();
+				convolute(src, dst, row_from, row_to, col_from, col_to, width, height, f, imageType);
+				double t = MPI_Wtime() - start;
+				if (trial == 0 || t < elapsed)
+					elapsed = t;
+			}
+			/* The slowest rank counts, so every rank keeps the same tile */
+			MPI_Allreduce(MPI_IN_PLACE, &elapsed, 1, MPI_DOUBLE, MPI_MAX, MPI_COMM_WORLD);
+			if (best < 0 || elapsed < best) {
+				best = elapsed;
+				best_rows = tile_rows[r];
+				best_cols = tile_cols[c];
+			}
+		}
+	}
+	f->tile_rows = best_rows;
+	f->tile_cols = best_cols;
+	return MPI_Wtime() - begin;
+}
+
 static inline void convolute_grey(uint8_t *src, uint8_t *dst, int x, int y, int width, int height, float** h) {
 	const uint8_t *row0 = src + (x - 1) * width + (y - 1);
 	const uint8_t *row1 = row0 + width;
@@ -400,42 +839,816 @@ static inline void convolute_rgb(uint8_t *src, uint8_t *dst, int x, int y, int w
 	dst[width * x + y+2] = (uint8_t)blueval;
 }
 
+/*
+ * Float path, one row at a time in 16 (SSE4.1), 32 (AVX2) or 64 (AVX-512)
+ * byte steps. Grey and interleaved rgb are the same loop: every byte is one
+ * sample and its horizontal neighbours are ch bytes away. Each kernel keeps
+ * the operation order of convolute_grey()/convolute_rgb() (nine products,
+ * summed left to right, truncated) and never fuses a multiply into an add,
+ * so it matches the scalar reference bit-for-bit; --compare --isa checks it.
+ */
+#ifdef HAVE_X86_SIMD
+SIMD_KERNEL("sse4.1")
+static void convolute_float_row_sse4(const uint8_t *row0, const uint8_t *row1, const uint8_t *row2, uint8_t *out, int from, int to, int ch, float **h) {
+	const uint8_t *rows[3] = {row0 - ch, row1 - ch, row2 - ch};
+	__m128 tap[9];
+	int b, t;
+	for (t = 0 ; t < 9 ; t++)
+		tap[t] = _mm_set1_ps(h[t / 3][t % 3]);
+	for (b = from ; b + 16 <= to ; b += 16) {
+		__m128 acc[4];
+		for (t = 0 ; t < 9 ; t++) {
+			__m128i v = _mm_loadu_si128((const __m128i *)(rows[t / 3] + b + (t % 3) * ch));
+			__m128 p0 = _mm_mul_ps(_mm_cvtepi32_ps(_mm_cvtepu8_epi32(v)), tap[t]);
+			__m128 p1 = _mm_mul_ps(_mm_cvtepi32_ps(_mm_cvtepu8_epi32(_mm_srli_si128(v, 4))), tap[t]);
+			__m128 p2 = _mm_mul_ps(_mm_cvtepi32_ps(_mm_cvtepu8_epi32(_mm_srli_si128(v, 8))), tap[t]);
+			__m128 p3 = _mm_mul_ps(_mm_cvtepi32_ps(_mm_cvtepu8_epi32(_mm_srli_si128(v, 12))), tap[t]);
+			acc[0] = t ? _mm_add_ps(acc[0], p0) : p0;
+			acc[1] = t ? _mm_add_ps(acc[1], p1) : p1;
+			acc[2] = t ? _mm_add_ps(acc[2], p2) : p2;
+			acc[3] = t ? _mm_add_ps(acc[3], p3) : p3;
+		}
+		__m128i lo = _mm_packus_epi32(_mm_cvttps_epi32(acc[0]), _mm_cvttps_epi32(acc[1]));
+		__m128i hi = _mm_packus_epi32(_mm_cvttps_epi32(acc[2]), _mm_cvttps_epi32(acc[3]));
+		_mm_storeu_si128((__m128i *)(out + b), _mm_packus_epi16(lo, hi));
+	}
+	convolute_float_tail(row0, row1, row2, out, b, to, ch, h);
+}
+
+SIMD_KERNEL("avx2")
+static void convolute_float_row_avx2(const uint8_t *row0, const uint8_t *row1, const uint8_t *row2, uint8_t *out, int from, int to, int ch, float **h) {
+	const uint8_t *rows[3] = {row0 - ch, row1 - ch, row2 - ch};
+	/* packus works within 128-bit lanes; this puts the four 8-byte groups back in order */
+	const __m256i order = _mm256_setr_epi32(0, 4, 1, 5, 2, 6, 3, 7);
+	__m256 tap[9];
+	int b, q, t;
+	for (t = 0 ; t < 9 ; t++)
+		tap[t] = _mm256_set1_ps(h[t / 3][t % 3]);
+	for (b = from ; b + 32 <= to ; b += 32) {
+		__m256 acc[4];
+		for (t = 0 ; t < 9 ; t++) {
+			const uint8_t *in = rows[t / 3] + b + (t % 3) * ch;
+			for (q = 0 ; q < 4 ; q++) {
+				__m128i v = _mm_loadl_epi64((const __m128i *)(in + 8 * q));
+				__m256 p = _mm256_mul_ps(_mm256_cvtepi32_ps(_mm256_cvtepu8_epi32(v)), tap[t]);
+				acc[q] = t ? _mm256_add_ps(acc[q], p) : p;
+			}
+		}
+		__m256i lo = _mm256_packus_epi32(_mm256_cvttps_epi32(acc[0]), _mm256_cvttps_epi32(acc[1]));
+		__m256i hi = _mm256_packus_epi32(_mm256_cvttps_epi32(acc[2]), _mm256_cvttps_epi32(acc[3]));
+		_mm256_storeu_si256((__m256i *)(out + b), _mm256_permutevar8x32_epi32(_mm256_packus_epi16(lo, hi), order));
+	}
+	convolute_float_tail(row0, row1, row2, out, b, to, ch, h);
+}
+
+SIMD_KERNEL("avx512f")
+static void convolute_float_row_avx512(const uint8_t *row0, const uint8_t *row1, const uint8_t *row2, uint8_t *out, int from, int to, int ch, float **h) {
+	const uint8_t *rows[3] = {row0 - ch, row1 - ch, row2 - ch};
+	__m512 tap[9];
+	int b, q, t;
+	for (t = 0 ; t < 9 ; t++)
+		tap[t] = _mm512_set1_ps(h[t / 3][t % 3]);
+	for (b = from ; b + 64 <= to ; b += 64) {
+		__m512 acc[4];
+		for (t = 0 ; t < 9 ; t++) {
+			const uint8_t *in = rows[t / 3] + b + (t % 3) * ch;
+			for (q = 0 ; q < 4 ; q++) {
+				__m128i v = _mm_loadu_si128((const __m128i *)(in + 16 * q));
+				__m512 p = _mm512_mul_ps(_mm512_cvtepi32_ps(_mm512_cvtepu8_epi32(v)), tap[t]);
+				acc[q] = t ? _mm512_add_ps(acc[q], p) : p;
+			}
+		}
+		for (q = 0 ; q < 4 ; q++)
+			_mm_storeu_si128((__m128i *)(out + b + 16 * q), _mm512_cvtusepi32_epi8(_mm512_cvttps_epi32(acc[q])));
+	}
+	convolute_float_tail(row0, row1, row2, out, b, to, ch, h);
+}
+#endif
+
+/* Bytes [from, to) of one output row with the selected kernels */
+void convolute_float_row(const uint8_t *row0, const uint8_t *row1, const uint8_t *row2, uint8_t *out, int from, int to, int ch, float **h, isa_t isa) {
+	switch (isa) {
+#ifdef HAVE_X86_SIMD
+	case ISA_AVX512:
+		convolute_float_row_avx512(row0, row1, row2, out, from, to, ch, h);
+		break;
+	case ISA_AVX2:
+		convolute_float_row_avx2(row0, row1, row2, out, from, to, ch, h);
+		break;
+	case ISA_SSE4:
+		convolute_float_row_sse4(row0, row1, row2, out, from, to, ch, h);
+		break;
+#endif
+	default:
+		convolute_float_tail(row0, row1, row2, out, from, to, ch, h);
+	}
+}
+
+/* Scalar float row, the same sum as convolute_grey()/convolute_rgb(); also the tail of the SIMD kernels */
+static inline void convolute_float_tail(const uint8_t *row0, const uint8_t *row1, const uint8_t *row2, uint8_t *out, int from, int to, int ch, float **h) {
+	int b;
+	const float *h0 = h[0];
+	const float *h1 = h[1];
+	const float *h2 = h[2];
+	for (b = from ; b < to ; b++) {
+		float val =
+			row0[b-ch] * h0[0] + row0[b] * h0[1] + row0[b+ch] * h0[2] +
+			row1[b-ch] * h1[0] + row1[b] * h1[1] + row1[b+ch] * h1[2] +
+			row2[b-ch] * h2[0] + row2[b] * h2[1] + row2[b+ch] * h2[2];
+		out[b] = (uint8_t)val;
+	}
+}
+
+/* Widest float path kernels the local CPU runs */
+isa_t detect_isa(void) {
+#ifdef HAVE_X86_SIMD
+	__builtin_cpu_init();
+	if (__builtin_cpu_supports("avx512f"))
+		return ISA_AVX512;
+	if (__builtin_cpu_supports("avx2"))
+		return ISA_AVX2;
+	if (__builtin_cpu_supports("sse4.1"))
+		return ISA_SSE4;
+#endif
+	return ISA_SCALAR;
+}
+
+/* --isa spelling of isa */
+const char *isa_name(isa_t isa) {
+	static const char *names[] = {"scalar", "sse4", "avx2", "avx512", "auto"};
+	return names[isa];
+}
+
+/*
+ * Integer Gaussian row: out[b] = (sum of {1,2,1;2,4,2;1,2,1} taps) >> 4 for
+ * bytes b in [from, to). ch is the distance between horizontal neighbours
+ * (1 for grey, 3 for interleaved rgb); it is a literal at every call site so
+ * the loop compiles to plain 16-bit SIMD adds and shifts.
+ *
+ * Rounding contract: the result is floor(sum / 16). Every product and partial
+ * sum of the float path is a multiple of 1/16 below 256 and therefore exact in
+ * float, so for the Gaussian kernel both paths truncate the same value and
+ * agree bit-for-bit; --compare reports the measured difference.
+ */
+static inline void convolute_fixed_row(const uint8_t *restrict row0, const uint8_t *restrict row1, const uint8_t *restrict row2, uint8_t *restrict out, int from, int to, int ch) {
+	int b;
+	for (b = from ; b < to ; b++) {
+		unsigned top = row0[b-ch] + (row0[b] << 1) + row0[b+ch];
+		unsigned mid = row1[b-ch] + (row1[b] << 1) + row1[b+ch];
+		unsigned bot = row2[b-ch] + (row2[b] << 1) + row2[b+ch];
+		out[b] = (uint8_t)((top + (mid << 1) + bot) >> 4);
+	}
+}
+
+/*
+ * Separable path for rank-1 kernels: every source row gets one horizontal
+ * 1-D pass into a ring of three row buffers, and each output row is the
+ * vertical 1-D pass over the ring (6 taps per sample instead of 9). The ring
+ * holds 3 * n ints, so it stays in cache while the image rows stream through.
+ * The result is the exact floor(sum / divisor); for the Gaussian kernel that
+ * is bit-identical to the float 2-D path.
+ */
+void convolute_separable(uint8_t *src, uint8_t *dst, int row_from, int row_to, int col_from, int col_to, int width, const filter_t *f, color_t imageType) {
+	int i, b;
+	int ch = (imageType == GREY) ? 1 : 3;
+	int stride = width * ch + 2 * ch;
+	int from = col_from * ch, n = (col_to - col_from + 1) * ch;
+	const unsigned c0 = f->col_taps[0], c1 = f->col_taps[1], c2 = f->col_taps[2];
+	if (row_from > row_to || n <= 0)
+		return;
+	unsigned *ring = malloc(3 * (size_t)n * sizeof(unsigned));
+	if (ring == NULL) {
+		fprintf(stderr, "Not enough memory\n");
+		MPI_Abort(MPI_COMM_WORLD, EXIT_FAILURE);
+		exit(EXIT_FAILURE);
+	}
+	unsigned *above = ring, *centre = ring + n, *below = ring + 2 * n, *spare;
+
+	separable_row(src + (row_from - 1) * stride + from, above, n, ch, f->row_taps);
+	separable_row(src + row_from * stride + from, centre, n, ch, f->row_taps);
+	for (i = row_from ; i <= row_to ; i++) {
+		uint8_t *out = dst + i * stride + from;
+		separable_row(src + (i + 1) * stride + from, below, n, ch, f->row_taps);
+		if (f->shift >= 0) {
+			for (b = 0 ; b < n ; b++)
+				out[b] = (uint8_t)((c0 * above[b] + c1 * centre[b] + c2 * below[b]) >> f->shift);
+		} else {
+			for (b = 0 ; b < n ; b++)
+				out[b] = (uint8_t)(((uint64_t)(c0 * above[b] + c1 * centre[b] + c2 * below[b]) * f->recip) >> 32);
+		}
+		spare = above;
+		above = centre;
+		centre = below;
+		below = spare;
+	}
+	free(ring);
+}
+
+/* Horizontal 1-D pass over n bytes; ch is the distance between neighbouring samples */
+static inline void separable_row(const uint8_t *restrict in, unsigned *restrict out, int n, int ch, const unsigned *taps) {
+	int b;
+	const unsigned t0 = taps[0], t1 = taps[1], t2 = taps[2];
+	for (b = 0 ; b < n ; b++)
+		out[b] = t0 * in[b - ch] + t1 * in[b] + t2 * in[b + ch];
+}
+
+/*
+ * Split a non-negative rank-1 kernel as taps[i][j] == col_taps[i] * row_taps[j] / pivot,
+ * pivot being its first non-zero tap, and fold pivot into the divisor.
+ * Returns 0 (leaving f untouched) when the kernel is not rank-1.
+ */
+int split_separable(int taps[3][3], int divisor, filter_t *f) {
+	int i, j, pr = -1, pc = -1, pivot;
+	for (i = 0 ; i < 3 ; i++) {
+		for (j = 0 ; j < 3 ; j++) {
+			if (taps[i][j] < 0)
+				return 0;
+			if (pr < 0 && taps[i][j]) {
+				pr = i;
+				pc = j;
+			}
+		}
+	}
+	if (pr < 0)
+		return 0;
+	pivot = taps[pr][pc];
+	for (i = 0 ; i < 3 ; i++)
+		for (j = 0 ; j < 3 ; j++)
+			if (taps[i][j] * pivot != taps[i][pc] * taps[pr][j])
+				return 0;
+	for (i = 0 ; i < 3 ; i++) {
+		f->col_taps[i] = (unsigned)taps[i][pc];
+		f->row_taps[i] = (unsigned)taps[pr][i];
+	}
+	divisor *= pivot;
+	f->shift = -1;
+	for (i = 0 ; (1 << i) <= divisor ; i++)
+		if ((1 << i) == divisor)
+			f->shift = i;
+	f->recip = ((1ULL << 32) + (uint64_t)divisor - 1) / (uint64_t)divisor;
+	return 1;
+}
+
+/*
+ * Temporal blocking: run `steps` iterations from src to dst one band of at
+ * most `band` output rows at a time. [row_from, row_to] x [col_from, col_to]
+ * is the region that is valid after the last step. A side flagged in grow[]
+ * (north, south, west, east) holds halo data and is computed steps - s pixels
+ * wider at step s; a side that is not flagged is the image border and stays
+ * fixed. Each band copies the window of src it depends on into a scratch pair
+ * and shrinks the computed rows by one per step (a trapezoid), so the window
+ * stays in cache for all the steps. Bands only read src and write disjoint
+ * rows of dst, so the result equals `steps` full sweeps.
+ * Each scratch buffer holds band + 2 * steps rows with zeroed padding columns.
+ */
+void convolute_tblock(uint8_t *src, uint8_t *dst, uint8_t **scratch, int row_from, int row_to, int col_from, int col_to, const int grow[4], int steps, int band, int width, const filter_t *f, color_t imageType) {
+	int ch = (imageType == GREY) ? 1 : 3;
+	size_t stride = (size_t)width * ch + 2 * ch;
+	/* Rows computed by the first step */
+	int first = row_from - (grow[0] ? steps - 1 : 0);
+	int last = row_to + (grow[1] ? steps - 1 : 0);
+	int n, bands = (row_to - row_from + band) / band;
+#pragma omp parallel for schedule(static)
+	for (n = 0 ; n < bands ; n++) {
+		int a = row_from + n * band, b = MIN(a + band - 1, row_to);
+		int base = a - steps, g, s;
+		uint8_t *cur = scratch[2 * omp_get_thread_num()], *nxt = scratch[2 * omp_get_thread_num() + 1], *tmp;
+
+		for (g = MAX(base, first - 1) ; g <= MIN(b + steps, last + 1) ; g++) {
+			memcpy(cur + (g - base) * stride, src + g * stride, stride);
+			/* Border or halo rows are read unchanged by the later steps too */
+			if (g < first || g > last)
+				memcpy(nxt + (g - base) * stride, src + g * stride, stride);
+		}
+		for (s = 1 ; s <= steps ; s++) {
+			int wider = steps - s;
+			int r0 = MAX(a - wider, row_from - (grow[0] ? wider : 0));
+			int r1 = MIN(b + wider, row_to + (grow[1] ? wider : 0));
+			convolute(cur, nxt, r0 - base, r1 - base, col_from - (grow[2] ? wider : 0), col_to + (grow[3] ? wider : 0),
+					width, b - a + 1, f, imageType);
+			tmp = cur;
+			cur = nxt;
+			nxt = tmp;
+		}
+		for (g = a ; g <= b ; g++)
+			memcpy(dst + g * stride + col_from * ch, cur + (g - base) * stride + col_from * ch, (size_t)(col_to - col_from + 1) * ch);
+	}
+}
+
+/*
+ * One iteration overlapped with its halo exchange (--overlap). The master
+ * thread creates the interior bands as tasks, then waits for the receives one
+ * at a time and creates each border piece as soon as every halo it reads has
+ * arrived; the other threads run the tasks meanwhile. Only the master thread
+ * calls MPI, so MPI_THREAD_FUNNELED is enough. recv_bits[k] names the
+ * neighbour of recv_reqs[k]; a side without one is the image border and is
+ * never waited for. The pieces are those of the blocking path, so the result
+ * is the same. Under --planar every plane gets its own tasks.
+ */
+void convolute_overlap(uint8_t *src, uint8_t *dst, int rows, int cols, int halo, int width, MPI_Request *recv_reqs, const int *recv_bits, int recv_count, const filter_t *f, color_t imageType, int planes, size_t plane_len) {
+	/* row_from, row_to, col_from, col_to of the top row, bottom row, left and right columns */
+	const int piece[4][4] = {
+		{halo, halo, halo, cols+halo-1},
+		{rows+halo-1, rows+halo-1, halo, cols+halo-1},
+		{halo+1, rows+halo-2, halo, halo},
+		{halo+1, rows+halo-2, cols+halo-1, cols+halo-1}
+	};
+	const int used[4] = {cols > 0 && rows > 0, cols > 0 && rows > 1, cols > 0 && rows > 2, cols > 1 && rows > 2};
+	int need[4] = {HALO_N | HALO_NW | HALO_NE | HALO_W | HALO_E, HALO_S | HALO_SW | HALO_SE | HALO_W | HALO_E, HALO_W, HALO_E};
+	int k, have = 0;
+	for (k = 0 ; k < recv_count ; k++)
+		have |= recv_bits[k];
+	/* A one-row block reads the south halo from its top row, a one-column block the east halo from its left column */
+	if (rows == 1)
+		need[0] |= HALO_S | HALO_SW | HALO_SE;
+	if (cols == 1)
+		need[2] |= HALO_E;
+
+#pragma omp parallel
+#pragma omp master
+	{
+		int n, p, idx, arrived = 0, started = 0, inner = rows - 2;
+		if (rows >= 3 && cols >= 3) {
+			int bands = MIN(OVERLAP_BANDS * omp_get_num_threads(), inner);
+			for (p = 0 ; p < planes ; p++) {
+				for (n = 0 ; n < bands ; n++) {
+#pragma omp task firstprivate(n, p)
+					convolute(src + p * plane_len, dst + p * plane_len, halo+1 + inner * n / bands, halo + inner * (n + 1) / bands, halo+1, cols+halo-2, width, rows, f, imageType);
+				}
+			}
+		}
+		/* k == -1 starts the pieces that read no halo at all */
+		for (k = -1 ; k < recv_count ; k++) {
+			if (k >= 0) {
+				MPI_Waitany(recv_count, recv_reqs, &idx, MPI_STATUS_IGNORE);
+				arrived |= recv_bits[idx];
+			}
+			for (n = 0 ; n < 4 ; n++) {
+				if (used[n] && !(started & (1 << n)) && !(need[n] & have & ~arrived)) {
+					started |= 1 << n;
+					for (p = 0 ; p < planes ; p++) {
+#pragma omp task firstprivate(n, p)
+						convolute(src + p * plane_len, dst + p * plane_len, piece[n][0], piece[n][1], piece[n][2], piece[n][3], width, rows, f, imageType);
+					}
+				}
+			}
+		}
+	}
+}
+
 /* Get pointer to internal array position */
 uint8_t *offset(uint8_t *array, int i, int j, int width) {
     return &array[width * i + j];
 }
 
-void Usage(int argc, char **argv, char **image, int *width, int *height, int *loops, color_t *imageType) {
-	if (argc == 6 && !strcmp(argv[5], "grey")) {
-		*image = malloc((strlen(argv[1])+1) * sizeof(char));
-		strcpy(*image, argv[1]);	
-		*width = atoi(argv[2]);
-		*height = atoi(argv[3]);
-		*loops = atoi(argv[4]);
-		*imageType = GREY;
-	} else if (argc == 6 && !strcmp(argv[5], "rgb")) {
-		*image = malloc((strlen(argv[1])+1) * sizeof(char));
-		strcpy(*image, argv[1]);	
-		*width = atoi(argv[2]);
-		*height = atoi(argv[3]);
-		*loops = atoi(argv[4]);
-		*imageType = RGB;
+/*
+ * Zeroed buffer of planes x nrows rows of row_len bytes. calloc() would leave
+ * the first touch to the master thread's read, placing every page on its NUMA
+ * node; here each row is zeroed by the thread that the static schedule of
+ * convolute() gives it to, so the pages sit next to the thread that computes them.
+ */
+uint8_t *alloc_first_touch(int planes, int nrows, size_t row_len) {
+	uint8_t *buf = malloc((size_t)planes * nrows * row_len);
+	int p, i;
+	if (buf == NULL)
+		return NULL;
+	for (p = 0 ; p < planes ; p++) {
+#pragma omp parallel for schedule(static)
+		for (i = 0 ; i < nrows ; i++)
+			memset(buf + ((size_t)p * nrows + i) * row_len, 0, row_len);
+	}
+	return buf;
+}
+
+/*
+ * --bind: pin the OpenMP threads of this rank. The ranks of one node share out
+ * the CPUs that any of them may run on: ranks are spread evenly over the
+ * sockets, each one takes a contiguous slice of its socket's cores, and its
+ * threads go one per core (hardware-thread siblings only once every core of
+ * the slice has a thread). Writes where the threads went to report; returns
+ * -1, binding nothing, where the platform has no thread affinity.
+ */
+int bind_threads(MPI_Comm node, char *report, size_t len) {
+#ifdef __linux__
+	static cpu_info_t cpus[CPU_SETSIZE];
+	int core_start[CPU_SETSIZE + 1], socket_start[CPU_SETSIZE + 1], bound[CPU_SETSIZE];
+	uint64_t mask[CPU_SETSIZE / 64] = {0};
+	cpu_set_t allowed;
+	int rank, size, ncpus = 0, ncores = 0, nsockets = 0, first, last, c, i, n, nthreads = omp_get_max_threads();
+	char path[96];
+	FILE *fh;
+
+	if (sched_getaffinity(0, sizeof(allowed), &allowed) != 0)
+		return -1;
+	for (c = 0 ; c < CPU_SETSIZE ; c++)
+		if (CPU_ISSET(c, &allowed))
+			mask[c / 64] |= (uint64_t)1 << (c % 64);
+	/* A launcher may already have bound each rank to a few CPUs; share out all of them */
+	MPI_Allreduce(MPI_IN_PLACE, mask, CPU_SETSIZE / 64, MPI_UINT64_T, MPI_BOR, node);
+	MPI_Comm_rank(node, &rank);
+	MPI_Comm_size(node, &size);
+
+	for (c = 0 ; c < CPU_SETSIZE ; c++) {
+		if (!(mask[c / 64] >> (c % 64) & 1))
+			continue;
+		cpus[ncpus].cpu = c;
+		cpus[ncpus].socket = 0;
+		cpus[ncpus].core = c;
+		snprintf(path, sizeof(path), "/sys/devices/system/cpu/cpu%d/topology/physical_package_id", c);
+		if ((fh = fopen(path, "r")) != NULL) {
+			if (fscanf(fh, "%d", &cpus[ncpus].socket) != 1)
+				cpus[ncpus].socket = 0;
+			fclose(fh);
+		}
+		snprintf(path, sizeof(path), "/sys/devices/system/cpu/cpu%d/topology/core_id", c);
+		if ((fh = fopen(path, "r")) != NULL) {
+			if (fscanf(fh, "%d", &cpus[ncpus].core) != 1)
+				cpus[ncpus].core = c;
+			fclose(fh);
+		}
+		ncpus++;
+	}
+	if (ncpus == 0)
+		return -1;
+	/* Cores are runs of equal (socket, core), sockets runs of equal socket */
+	qsort(cpus, ncpus, sizeof(cpu_info_t), compare_cpus);
+	for (i = 0 ; i < ncpus ; i++) {
+		if (i == 0 || cpus[i].socket != cpus[i - 1].socket)
+			socket_start[nsockets++] = ncores;
+		if (i == 0 || cpus[i].socket != cpus[i - 1].socket || cpus[i].core != cpus[i - 1].core)
+			core_start[ncores++] = i;
+	}
+	core_start[ncores] = ncpus;
+	socket_start[nsockets] = ncores;
+
+	/* Cores [first, last) of this rank */
+	if (size <= nsockets) {
+		first = socket_start[rank * nsockets / size];
+		last = socket_start[(rank + 1) * nsockets / size];
+	} else {
+		int socket = rank * nsockets / size;
+		/* Ranks r0 .. r1-1 share this socket */
+		int r0 = (socket * size + nsockets - 1) / nsockets, r1 = ((socket + 1) * size + nsockets - 1) / nsockets;
+		int cores = socket_start[socket + 1] - socket_start[socket];
+		first = socket_start[socket] + (rank - r0) * cores / (r1 - r0);
+		last = MAX(socket_start[socket] + (rank - r0 + 1) * cores / (r1 - r0), first + 1);
+	}
+
+#pragma omp parallel
+	{
+		int t = omp_get_thread_num(), core = first + t % (last - first);
+		int cpu = cpus[core_start[core] + t / (last - first) % (core_start[core + 1] - core_start[core])].cpu;
+		cpu_set_t set;
+		CPU_ZERO(&set);
+		CPU_SET(cpu, &set);
+		/* Pid 0 is the calling thread */
+		bound[t] = (sched_setaffinity(0, sizeof(set), &set) == 0) ? cpu : -1;
+	}
+
+	n = snprintf(report, len, "socket %d", cpus[core_start[first]].socket);
+	if (cpus[core_start[last - 1]].socket != cpus[core_start[first]].socket)
+		n += snprintf(report + n, n < (int)len ? len - n : 0, "-%d", cpus[core_start[last - 1]].socket);
+	n += snprintf(report + n, n < (int)len ? len - n : 0, ", %d core%s, %d threads on cpu", last - first, (last - first > 1) ? "s" : "", nthreads);
+	for (i = 0 ; i < nthreads ; i++) {
+		if (bound[i] < 0)
+			n += snprintf(report + n, n < (int)len ? len - n : 0, " -");
+		else
+			n += snprintf(report + n, n < (int)len ? len - n : 0, " %d", bound[i]);
+	}
+	return 0;
+#else
+	return -1;
+#endif
+}
+
+/* qsort() order of cpu_info_t: socket, then core, then logical CPU */
+int compare_cpus(const void *a, const void *b) {
+	const cpu_info_t *x = a, *y = b;
+	if (x->socket != y->socket)
+		return x->socket - y->socket;
+	if (x->core != y->core)
+		return x->core - y->core;
+	return x->cpu - y->cpu;
+}
+
+/*
+ * --planar: rows x cols rgb pixels of an interleaved buffer (rgb_stride bytes
+ * a row) to three grey planes plane_len bytes apart (plane_stride bytes a
+ * row), and back. Runs once at load and once per written image.
+ */
+void split_planes(const uint8_t *rgb, size_t rgb_stride, uint8_t *plane, size_t plane_stride, size_t plane_len, int rows, int cols) {
+	int i, j, c;
+	for (c = 0 ; c < 3 ; c++)
+		for (i = 0 ; i < rows ; i++)
+			for (j = 0 ; j < cols ; j++)
+				plane[c * plane_len + i * plane_stride + j] = rgb[i * rgb_stride + 3 * j + c];
+}
+
+void merge_planes(const uint8_t *plane, size_t plane_stride, size_t plane_len, uint8_t *rgb, size_t rgb_stride, int rows, int cols) {
+	int i, j, c;
+	for (c = 0 ; c < 3 ; c++)
+		for (i = 0 ; i < rows ; i++)
+			for (j = 0 ; j < cols ; j++)
+				rgb[i * rgb_stride + 3 * j + c] = plane[c * plane_len + i * plane_stride + j];
+}
+
+/* Halo datatype: count blocks of blocklen bytes, stride apart, in each of the planes (plane_len bytes apart); committed */
+void halo_type(int count, int blocklen, int stride, int planes, MPI_Aint plane_len, MPI_Datatype *type) {
+	MPI_Datatype plane;
+	if (planes == 1) {
+		MPI_Type_vector(count, blocklen, stride, MPI_BYTE, type);
+	} else {
+		MPI_Type_vector(count, blocklen, stride, MPI_BYTE, &plane);
+		MPI_Type_create_hvector(planes, 1, plane_len, plane, type);
+		MPI_Type_free(&plane);
+	}
+	MPI_Type_commit(type);
+}
+
+/* PGM/PPM files are recognised by their .pgm/.ppm extension */
+int is_pnm(const char *path) {
+	size_t len = (path != NULL) ? strlen(path) : 0;
+	const char *ext = (len > 4) ? path + len - 4 : NULL;
+	return ext != NULL && ext[0] == '.' && tolower((unsigned char)ext[1]) == 'p'
+			&& (tolower((unsigned char)ext[2]) == 'g' || tolower((unsigned char)ext[2]) == 'p')
+			&& tolower((unsigned char)ext[3]) == 'm';
+}
+
+/* File name part of a path; outputs and checkpoints are named after it in the working directory */
+const char *base_name(const char *path) {
+	const char *p, *base = path;
+	for (p = path ; *p ; p++)
+		if (*p == '/' || *p == '\\')
+			base = p + 1;
+	return base;
+}
+
+/* Whitespace and # comments, then a decimal number and the whitespace byte ending it; -1 on error */
+static int pnm_field(FILE *fh) {
+	int c, value = 0, digits = 0;
+	while ((c = fgetc(fh)) != EOF) {
+		if (c == '#') {
+			while ((c = fgetc(fh)) != EOF && c != '\n')
+				;
+		} else if (!isspace(c))
+			break;
+	}
+	for ( ; isdigit(c) && value <= (INT_MAX - 9) / 10 ; c = fgetc(fh), digits++)
+		value = value * 10 + (c - '0');
+	return (digits && c != EOF && isspace(c)) ? value : -1;
+}
+
+/*
+ * Geometry and colour of a binary PGM (P5, grey) or PPM (P6, rgb) with maxval
+ * 255. Returns the offset of the first pixel, or -1 if the file is not one.
+ */
+long read_pnm_header(const char *path, int *width, int *height, color_t *imageType) {
+	int w, h, magic, c;
+	long pixels = -1;
+	FILE *fh = fopen(path, "rb");
+	if (fh == NULL)
+		return -1;
+	if (fgetc(fh) == 'P' && ((magic = fgetc(fh)) == '5' || magic == '6')
+			&& ((c = fgetc(fh)) == '#' || isspace(c)) && ungetc(c, fh) != EOF
+			&& (w = pnm_field(fh)) > 0 && (h = pnm_field(fh)) > 0 && pnm_field(fh) == 255) {
+		*width = w;
+		*height = h;
+		*imageType = (magic == '5') ? GREY : RGB;
+		pixels = ftell(fh);
+	}
+	fclose(fh);
+	return pixels;
+}
+
+/*
+ * image_name width height loops rgb|grey [options] for headerless images,
+ * image.pgm|image.ppm loops [options] with the geometry and colour taken from
+ * the PGM/PPM header, or --batch MANIFEST [options] for one job per manifest
+ * line. Runs on rank 0 only.
+ */
+void Usage(int argc, char **argv, job_t **jobs, int *njobs, char **names, int *names_len, options_t *opts) {
+	int i, width, height, loops;
+	int batch = argc >= 3 && !strcmp(argv[1], "--batch"), pnm = !batch && argc >= 3 && is_pnm(argv[1]);
+	color_t imageType;
+	memset(opts, 0, sizeof(*opts));
+	opts->isa = ISA_AUTO;
+	for (i = (batch || pnm) ? 3 : 6 ; i < argc ; i++) {
+		if (!strcmp(argv[i], "--fixed"))
+			opts->fixed = 1;
+		else if (!strcmp(argv[i], "--separable"))
+			opts->separable = 1;
+		else if (!strcmp(argv[i], "--compare"))
+			opts->compare = 1;
+		else if (!strcmp(argv[i], "--planar"))
+			opts->planar = 1;
+		else if (!strcmp(argv[i], "--isa") && i + 1 < argc) {
+			i++;
+			for (opts->isa = ISA_SCALAR ; opts->isa < ISA_AUTO && strcmp(argv[i], isa_name(opts->isa)) ; opts->isa++)
+				;
+			if (strcmp(argv[i], isa_name(opts->isa)))
+				argc = -1;
+		}
+		else if (!strcmp(argv[i], "--overlap"))
+			opts->overlap = 1;
+		else if (!strcmp(argv[i], "--bind"))
+			opts->bind = 1;
+		else if (!strcmp(argv[i], "--tblock") && i + 1 < argc && (opts->tblock = atoi(argv[i+1])) > 0)
+			i++;
+		else if (!strcmp(argv[i], "--tile") && i + 1 < argc) {
+			i++;
+			if (!strcmp(argv[i], "auto"))
+				opts->tile_auto = 1;
+			else if (sscanf(argv[i], "%dx%d", &opts->tile_rows, &opts->tile_cols) != 2 || opts->tile_rows < 0 || opts->tile_cols < 0)
+				argc = -1;
+		}
+		else if (!strcmp(argv[i], "--grid") && i + 1 < argc) {
+			i++;
+			if (sscanf(argv[i], "%dx%d", &opts->grid_rows, &opts->grid_cols) != 2 || opts->grid_rows <= 0 || opts->grid_cols <= 0)
+				argc = -1;
+		}
+		else if (!strcmp(argv[i], "--threads") && i + 1 < argc && (opts->threads = atoi(argv[i+1])) > 0)
+			i++;
+		else if (!strcmp(argv[i], "--tblock-rows") && i + 1 < argc && (opts->tblock_rows = atoi(argv[i+1])) > 0)
+			i++;
+		else if (!strcmp(argv[i], "--checkpoint") && i + 1 < argc && (opts->checkpoint = atoi(argv[i+1])) > 0)
+			i++;
+		else if (!strcmp(argv[i], "--resume") && i + 2 < argc && (opts->start = atoi(argv[i+2])) >= 0) {
+			opts->resume = i + 1;
+			i += 2;
+		}
+		else if (!strcmp(argv[i], "--output") && i + 1 < argc)
+			opts->output = ++i;
+		else if (!strcmp(argv[i], "--kernel") && i + 1 < argc) {
+			i++;
+			if (!strcmp(argv[i], "gaussian"))
+				opts->kernel = GAUSSIAN;
+			else if (!strcmp(argv[i], "box"))
+				opts->kernel = BOX;
+			else if (!strcmp(argv[i], "edge"))
+				opts->kernel = EDGE;
+			else
+				argc = -1;
+		} else
+			argc = -1;
+	}
+	if (opts->fixed && opts->kernel != GAUSSIAN) {
+		fprintf(stderr, "%s: --fixed requires the gaussian kernel\n", argv[0]);
+		MPI_Abort(MPI_COMM_WORLD, EXIT_FAILURE);
+		exit(EXIT_FAILURE);
+	}
+	if (batch && argc >= 3) {
+		if (opts->resume || opts->output) {
+			fprintf(stderr, "%s: --resume and --output name a single image, give the files in the manifest instead\n", argv[0]);
+			MPI_Abort(MPI_COMM_WORLD, EXIT_FAILURE);
+			exit(EXIT_FAILURE);
+		}
+		opts->batch = 2;
+		read_manifest(argv[0], argv[2], jobs, njobs, names, names_len);
+		return;
+	}
+	if (pnm && argc >= 3) {
+		if (read_pnm_header(argv[1], &width, &height, &imageType) < 0) {
+			fprintf(stderr, "%s: %s is not a binary PGM/PPM with maxval 255\n", argv[0], argv[1]);
+			MPI_Abort(MPI_COMM_WORLD, EXIT_FAILURE);
+			exit(EXIT_FAILURE);
+		}
+		loops = atoi(argv[2]);
+	} else if (!pnm && argc >= 6 && (!strcmp(argv[5], "grey") || !strcmp(argv[5], "rgb"))) {
+		width = atoi(argv[2]);
+		height = atoi(argv[3]);
+		loops = atoi(argv[4]);
+		imageType = !strcmp(argv[5], "grey") ? GREY : RGB;
 	} else {
 		MPI_Abort(MPI_COMM_WORLD, EXIT_FAILURE);
-		fprintf(stderr, "Error Input!\n%s image_name width height loops [rgb/grey].\n", argv[0]);
+		fprintf(stderr, "Error Input!\n%s image_name width height loops [rgb/grey] [options]\n%s image.pgm|image.ppm loops [options]\n%s --batch MANIFEST [options]\n"
+				"options: [--kernel gaussian|box|edge] [--fixed] [--separable] [--compare] [--isa scalar|sse4|avx2|avx512|auto] [--planar] [--overlap] [--bind] [--tblock T] [--tblock-rows B] [--tile RxC|auto] [--grid RxC] [--threads N] [--checkpoint N] [--resume FILE T] [--output PATH].\n", argv[0], argv[0], argv[0]);
+		exit(EXIT_FAILURE);
+	}
+	if (opts->start > loops) {
+		fprintf(stderr, "%s: --resume iteration %d is past loops\n", argv[0], opts->start);
+		MPI_Abort(MPI_COMM_WORLD, EXIT_FAILURE);
+		exit(EXIT_FAILURE);
+	}
+	/* Every rank reads its block straight from the file, so only the header offset is needed */
+	const char *input = opts->resume ? argv[opts->resume] : argv[1];
+	if (add_job(jobs, njobs, names, names_len, input, argv[1], opts->output ? argv[opts->output] : NULL, width, height, loops, imageType) != 0) {
+		fprintf(stderr, "%s: %s is not a %dx%d %s PGM/PPM\n", argv[0], input, width, height, (imageType == GREY) ? "grey" : "rgb");
+		MPI_Abort(MPI_COMM_WORLD, EXIT_FAILURE);
+		exit(EXIT_FAILURE);
+	}
+}
+
+/* Copy name to the end of the string table and return its offset */
+static int add_name(char **names, int *names_len, const char *name) {
+	int at = *names_len, len = (int)strlen(name) + 1;
+	*names = realloc(*names, at + len);
+	memcpy(*names + at, name, len);
+	*names_len += len;
+	return at;
+}
+
+/*
+ * Append a job that reads input (image itself, or an intermediate of it) and
+ * writes output, blur_<image> if NULL. Returns -1 if input is a PGM/PPM whose
+ * header does not match the geometry.
+ */
+int add_job(job_t **jobs, int *njobs, char **names, int *names_len, const char *input, const char *image, const char *output, int width, int height, int loops, color_t imageType) {
+	int w, h;
+	long header = 0;
+	color_t type;
+	job_t *jb;
+	if (is_pnm(input)) {
+		header = read_pnm_header(input, &w, &h, &type);
+		if (header < 0 || w != width || h != height || type != imageType)
+			return -1;
+	}
+	*jobs = realloc(*jobs, (*njobs + 1) * sizeof(job_t));
+	jb = &(*jobs)[(*njobs)++];
+	jb->input = add_name(names, names_len, input);
+	jb->image = add_name(names, names_len, image);
+	if (output != NULL)
+		jb->output = add_name(names, names_len, output);
+	else {
+		char *blurImage = malloc((strlen(image) + 9) * sizeof(char));
+		strcpy(blurImage, "blur_");
+		strcat(blurImage, base_name(image));
+		jb->output = add_name(names, names_len, blurImage);
+		free(blurImage);
+	}
+	jb->width = width;
+	jb->height = height;
+	jb->loops = loops;
+	jb->imageType = imageType;
+	jb->header = (int)header;
+	return 0;
+}
+
+/*
+ * --batch manifest: one job per line, either
+ *     input output width height loops rgb|grey
+ * for headerless images or
+ *     input.pgm|input.ppm output loops
+ * with the geometry taken from the header. Blank lines and # comments are
+ * skipped, paths are relative to the working directory. Runs on rank 0 only.
+ */
+void read_manifest(const char *prog, const char *path, job_t **jobs, int *njobs, char **names, int *names_len) {
+	char line[4096], *tok[7];
+	int n, lineno = 0, width, height, loops;
+	color_t imageType;
+	FILE *fh = fopen(path, "r");
+	if (fh == NULL) {
+		fprintf(stderr, "%s: Cannot read manifest %s\n", prog, path);
+		MPI_Abort(MPI_COMM_WORLD, EXIT_FAILURE);
+		exit(EXIT_FAILURE);
+	}
+	while (fgets(line, sizeof(line), fh) != NULL) {
+		lineno++;
+		for (n = 0 ; n < 7 && (tok[n] = strtok(n ? NULL : line, " \t\r\n")) != NULL ; n++)
+			;
+		if (n == 0 || tok[0][0] == '#')
+			continue;
+		if (n == 3 && is_pnm(tok[0]) && read_pnm_header(tok[0], &width, &height, &imageType) >= 0) {
+			loops = atoi(tok[2]);
+		} else if (n == 6 && (!strcmp(tok[5], "grey") || !strcmp(tok[5], "rgb"))) {
+			width = atoi(tok[2]);
+			height = atoi(tok[3]);
+			loops = atoi(tok[4]);
+			imageType = !strcmp(tok[5], "grey") ? GREY : RGB;
+		} else
+			width = 0;
+		if (width <= 0 || height <= 0 || loops < 0
+				|| add_job(jobs, njobs, names, names_len, tok[0], tok[0], tok[1], width, height, loops, imageType) != 0) {
+			fprintf(stderr, "%s: %s:%d: expected input output width height loops rgb|grey, or input.pgm|input.ppm output loops\n", prog, path, lineno);
+			MPI_Abort(MPI_COMM_WORLD, EXIT_FAILURE);
+			exit(EXIT_FAILURE);
+		}
+	}
+	fclose(fh);
+	if (*njobs == 0) {
+		fprintf(stderr, "%s: %s lists no images\n", prog, path);
+		MPI_Abort(MPI_COMM_WORLD, EXIT_FAILURE);
 		exit(EXIT_FAILURE);
 	}
 }
 
-/* Divide rows and columns in a way to minimize perimeter of blocks */
+/* Jobs of the same geometry share the decomposition, datatypes, buffers and halo requests */
+int same_geometry(const job_t *a, const job_t *b) {
+	return a->width == b->width && a->height == b->height && a->imageType == b->imageType;
+}
+
+/*
+ * Divide rows and columns in a way to minimize perimeter of blocks. Any
+ * factorisation of workers is allowed: blocks of one grid row/column differ by
+ * at most one row/column, so the perimeter of the largest block is minimized.
+ */
 int divide_rows(int rows, int cols, int workers) {
     int per, rows_to, cols_to, best = 0;
     int per_min = rows + cols + 1;
-    for (rows_to = 1 ; rows_to <= workers ; ++rows_to) {
-        if (workers % rows_to || rows % rows_to) continue;
+    for (rows_to = 1 ; rows_to <= workers && rows_to <= rows ; ++rows_to) {
+        if (workers % rows_to) continue;
         cols_to = workers / rows_to;
-        if (cols % cols_to) continue;
-        per = rows / rows_to + cols / cols_to;
+        if (cols_to > cols) continue;
+        per = (rows + rows_to - 1) / rows_to + (cols + cols_to - 1) / cols_to;
         if (per < per_min) {
             per_min = per;
             best = rows_to;
@@ -443,3 +1656,66 @@ int divide_rows(int rows, int cols, int workers) {
     }
     return best;
 }
+
+/* Size of block `index` when `total` is split into `parts`; *start receives its first row/column */
+int block_extent(int total, int parts, int index, int *start) {
+    int base = total / parts, extra = total % parts;
+    *start = index * base + (index < extra ? index : extra);
+    return base + (index < extra);
+}
+
+/*
+ * Collective write of every block through the file view; the file is cut to
+ * size so a longer old file leaves no tail. With pnm set rank 0 writes a
+ * PGM/PPM header and the view starts after it.
+ * Collective; returns -1 on all ranks if the open or any write failed on one.
+ */
+int write_block(const char *path, int pnm, uint8_t *buf, MPI_Datatype file_type, MPI_Datatype block_type, int width, int height, color_t imageType) {
+	MPI_File fh;
+	char header[64];
+	int rank, err, failed, len = 0, ch = (imageType == GREY) ? 1 : 3;
+	if (pnm)
+		len = snprintf(header, sizeof(header), "P%c\n%d %d\n255\n", (imageType == GREY) ? '5' : '6', width, height);
+	MPI_Comm_rank(MPI_COMM_WORLD, &rank);
+	err = MPI_File_open(MPI_COMM_WORLD, path, MPI_MODE_CREATE | MPI_MODE_WRONLY, MPI_INFO_NULL, &fh) != MPI_SUCCESS;
+	MPI_Allreduce(&err, &failed, 1, MPI_INT, MPI_MAX, MPI_COMM_WORLD);
+	if (failed) {
+		if (!err)
+			MPI_File_close(&fh);
+		return -1;
+	}
+	err |= MPI_File_set_size(fh, len + (MPI_Offset)height * width * ch) != MPI_SUCCESS;
+	if (rank == 0 && len > 0)
+		err |= MPI_File_write_at(fh, 0, header, len, MPI_CHAR, MPI_STATUS_IGNORE) != MPI_SUCCESS;
+	err |= MPI_File_set_view(fh, len, MPI_BYTE, file_type, "native", MPI_INFO_NULL) != MPI_SUCCESS;
+	err |= MPI_File_write_all(fh, buf, 1, block_type, MPI_STATUS_IGNORE) != MPI_SUCCESS;
+	err |= MPI_File_close(&fh) != MPI_SUCCESS;
+	MPI_Allreduce(&err, &failed, 1, MPI_INT, MPI_MAX, MPI_COMM_WORLD);
+	return failed ? -1 : 0;
+}
+
+/*
+ * Write ckpt_<t>_<image> through a temporary file that rank 0 renames once
+ * the collective write is closed, so that a run killed mid-write leaves the
+ * previous checkpoints intact. A PGM/PPM image gets PGM/PPM checkpoints.
+ * Collective; returns the same value on all ranks.
+ */
+int write_checkpoint(const char *image, int t, uint8_t *buf, MPI_Datatype file_type, MPI_Datatype block_type, int width, int height, color_t imageType) {
+	int rank, ret = 0;
+	size_t len = strlen(image) + 32;
+	char *path = malloc(len), *part = malloc(len + 4);
+	snprintf(path, len, "ckpt_%d_%s", t, base_name(image));
+	snprintf(part, len + 4, "%s.tmp", path);
+	MPI_Comm_rank(MPI_COMM_WORLD, &rank);
+	if (write_block(part, is_pnm(path), buf, file_type, block_type, width, height, imageType) != 0) {
+		ret = -1;
+	} else {
+		/* rename() does not replace an existing file on Windows */
+		if (rank == 0 && rename(part, path) != 0 && (remove(path) != 0 || rename(part, path) != 0))
+			ret = -1;
+		MPI_Bcast(&ret, 1, MPI_INT, 0, MPI_COMM_WORLD);
+	}
+	free(path);
+	free(part);
+	return ret;
+}
@@ -0,0 +1,9 @@
+"""
+Python helpers shared by the scripts/ and tools/ entry points.
+
+Requires NumPy. If missing, install: pip install numpy
+"""
+
+from .reference import KERNELS, convolute, convolute_raw, from_raw, iterate
+
+__all__ = ["KERNELS", "convolute", "convolute_raw", "from_raw", "iterate"]
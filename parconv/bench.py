@@ -0,0 +1,230 @@
+"""
+Benchmark runner shared by mpi/benchmark_table1_mpi.py and
+mpi_omp/benchmark_table2_mpi_omp.py.
+
+Every run is a Job that needs a number of CPUs (MPI ranks x threads per rank).
+run_jobs() starts jobs in order, one at a time by default. With parallel=True,
+independent jobs run side by side whenever enough CPUs are free. Each one is
+pinned to its own disjoint CPU set (sched_setaffinity, inherited by mpiexec and
+its ranks), so concurrent measurements do not share cores. A job that needs
+more CPUs than the machine has always runs alone and unpinned.
+
+Every job also gets its own scratch directory as TMPDIR, and as its working
+directory unless the job names one, so concurrent runs neither race on the
+Open MPI session directory nor overwrite each other's blur_<image> outputs.
+"""
+
+from __future__ import annotations
+
+import os
+import subprocess
+import tempfile
+import threading
+from dataclasses import dataclass, field
+from typing import Callable, Sequence
+
+
+@dataclass
+class Job:
+    cmd: list[str]
+    cpus: int = 1
+    cwd: str | None = None
+    env: dict[str, str] | None = None
+    key: tuple = ()
+
+    def __post_init__(self) -> None:
+        if self.cpus < 1:
+            raise ValueError(f"Job.cpus must be >= 1 (got {self.cpus})")
+
+
+@dataclass
+class Result:
+    job: Job
+    returncode: int | None = None
+    stdout: str = ""
+    stderr: str = ""
+    error: str | None = None
+    pinned: tuple[int, ...] = field(default_factory=tuple)
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and self.returncode == 0
+
+
+def parse_runtime(output: str):
+    text = output.strip().split()
+    if not text:
+        return None
+    try:
+        return float(text[-1])
+    except ValueError:
+        return None
+
+
+def format_number(val):
+    if val is None:
+        return "--"
+    s = f"{val:.2f}"
+    return s.replace(".", ",")
+
+
+def result_runtime(res: Result) -> tuple[float | None, str | None]:
+    """
+    Return (runtime, error-log entry) for a finished job; exactly one is None.
+
+    The runtime is the last token of stdout (stderr as a fallback), as printed
+    by every engine.
+    """
+    cmd = " ".join(res.job.cmd)
+    if res.error is not None:
+        return None, f"EXCEPTION: {cmd}\nerror: {res.error}\n\n"
+    if res.returncode != 0:
+        return None, f"FAIL: {cmd}\nstdout: {res.stdout}\nstderr: {res.stderr}\n\n"
+    rt = parse_runtime(res.stdout)
+    if rt is None and res.stderr:
+        rt = parse_runtime(res.stderr)
+    if rt is None:
+        return None, f"PARSE_FAIL: {cmd}\nstdout: {res.stdout}\nstderr: {res.stderr}\n\n"
+    return rt, None
+
+
+def batch_runtimes(res: Result, count: int) -> tuple[list[float | None], str | None]:
+    """
+    Per-image runtimes of an engine --batch run, in manifest order, and an
+    error-log entry (None if all count images finished).
+
+    Each finished image prints "job <k> <output> <seconds>"; the images that
+    finished before a failure keep their runtime.
+    """
+    runtimes: list[float | None] = [None] * count
+    for line in res.stdout.splitlines():
+        tokens = line.split()
+        if len(tokens) < 3 or tokens[0] != "job":
+            continue
+        try:
+            index, rt = int(tokens[1]) - 1, float(tokens[-1])
+        except ValueError:
+            continue
+        if 0 <= index < count:
+            runtimes[index] = rt
+    if not res.ok:
+        return runtimes, result_runtime(res)[1]
+    if None in runtimes:
+        cmd = " ".join(res.job.cmd)
+        return runtimes, f"PARSE_FAIL: {cmd}\nstdout: {res.stdout}\nstderr: {res.stderr}\n\n"
+    return runtimes, None
+
+
+def write_manifest(path: str | os.PathLike, entries: Sequence[tuple]) -> None:
+    """
+    Write an engine --batch manifest, one (input, output, width, height, loops,
+    mode) entry per line. The engines split lines on whitespace, so paths must
+    not contain any; relative paths are resolved against the run's cwd.
+    """
+    with open(path, "w", encoding="utf-8", newline="\n") as f:
+        for entry in entries:
+            f.write(" ".join(str(field) for field in entry) + "\n")
+
+
+def available_cpus() -> list[int]:
+    """CPUs this process may run on (all CPUs where affinity is not supported)."""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def _pin(cpu_set: set[int]) -> Callable[[], None]:
+    def preexec() -> None:
+        os.sched_setaffinity(0, cpu_set)
+
+    return preexec
+
+
+def _run_one(job: Job, pinned: Sequence[int]) -> Result:
+    result = Result(job=job, pinned=tuple(pinned))
+    preexec = _pin(set(pinned)) if pinned and hasattr(os, "sched_setaffinity") else None
+    try:
+        with tempfile.TemporaryDirectory(prefix="parconv_job_") as scratch:
+            env = dict(os.environ if job.env is None else job.env, TMPDIR=scratch)
+            proc = subprocess.run(
+                job.cmd, cwd=job.cwd or scratch, env=env, capture_output=True, text=True, check=False,
+                preexec_fn=preexec,
+            )
+    except Exception as e:
+        result.error = str(e)
+        return result
+    result.returncode = proc.returncode
+    result.stdout = proc.stdout
+    result.stderr = proc.stderr
+    return result
+
+
+def run_jobs(
+    jobs: Sequence[Job],
+    parallel: bool = False,
+    cpus: Sequence[int] | None = None,
+    on_done: Callable[[Result], None] | None = None,
+) -> list[Result]:
+    """
+    Run all jobs and return their results in job order.
+
+    Jobs are started first-fit in list order: a job starts as soon as its CPU
+    count is free, so small jobs fill the cores left over by larger ones.
+    on_done is called from the scheduling thread as each job finishes.
+    """
+    pool = list(cpus) if cpus is not None else available_cpus()
+    total = len(pool)
+    results: list[Result | None] = [None] * len(jobs)
+    if not parallel:
+        for i, job in enumerate(jobs):
+            results[i] = _run_one(job, ())
+            if on_done is not None:
+                on_done(results[i])
+        return results  # type: ignore[return-value]
+
+    free = list(pool)
+    pending = list(range(len(jobs)))
+    running = 0
+    done: list[tuple[int, Result, list[int], bool]] = []
+    cond = threading.Condition()
+
+    def worker(index: int, pinned: list[int], alone: bool) -> None:
+        res = _run_one(jobs[index], pinned)
+        with cond:
+            done.append((index, res, pinned, alone))
+            cond.notify()
+
+    with cond:
+        while pending or running:
+            started = True
+            while started:
+                started = False
+                for n, index in enumerate(pending):
+                    need = jobs[index].cpus
+                    if need > total:
+                        # Oversubscribed: wait for an idle machine, then run unpinned
+                        if running or len(free) != total:
+                            continue
+                        pinned: list[int] = []
+                        alone = True
+                        free.clear()
+                    elif need <= len(free):
+                        pinned, free[:] = free[:need], free[need:]
+                        alone = False
+                    else:
+                        continue
+                    del pending[n]
+                    running += 1
+                    threading.Thread(target=worker, args=(index, pinned, alone), daemon=True).start()
+                    started = True
+                    break
+            cond.wait_for(lambda: bool(done))
+            while done:
+                index, res, pinned, alone = done.pop()
+                running -= 1
+                free.extend(pool if alone else pinned)
+                free.sort()
+                results[index] = res
+                if on_done is not None:
+                    on_done(res)
+    return results  # type: ignore[return-value]
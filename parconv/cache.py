@@ -0,0 +1,187 @@
+"""
+On-disk cache of sequential reference outputs.
+
+Entries are addressed by the SHA-256 of the input bytes plus the run
+parameters and stored as
+
+    <root>/<sha[:2]>/<sha>/<width>x<height>_<mode>_<kernel>_<loops>.raw
+
+Every lookup bumps the entry's mtime; once the cache grows past max_bytes the
+least recently used entries are deleted. The convolution is a pure function
+of the previous frame, so a missing loops=N entry is derived from the largest
+cached loops=M < N by running only the remaining N - M iterations.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import subprocess
+import tempfile
+from pathlib import Path
+from typing import Callable
+
+from .reference import channels_for, convolute_raw
+
+DEFAULT_MAX_BYTES = 2 << 30
+
+# advance(data, loops) -> data after `loops` more iterations
+Advance = Callable[[bytes, int], bytes]
+
+
+def default_cache_dir() -> Path:
+    env = os.environ.get("PARCONV_CACHE_DIR")
+    if env:
+        return Path(env).expanduser()
+    base = os.environ.get("XDG_CACHE_HOME") or os.environ.get("LOCALAPPDATA") or Path.home() / ".cache"
+    return Path(base) / "parconv"
+
+
+def numpy_advance(width: int, height: int, mode: str, kernel: str = "gaussian") -> Advance:
+    return lambda data, loops: convolute_raw(data, width, height, loops, mode, kernel)
+
+
+def seq_conv_advance(exe: str | os.PathLike, width: int, height: int, mode: str, kernel: str = "gaussian") -> Advance:
+    """Advance with a seq_conv binary, run in a scratch directory."""
+    exe = Path(exe).resolve()
+
+    def advance(data: bytes, loops: int) -> bytes:
+        with tempfile.TemporaryDirectory(prefix="parconv_seq_") as tmp:
+            src = Path(tmp) / "in.raw"
+            src.write_bytes(data)
+            cmd = [str(exe), src.name, str(width), str(height), str(loops), mode]
+            if kernel != "gaussian":
+                cmd += ["--kernel", kernel]
+            result = subprocess.run(cmd, cwd=tmp, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+            if result.returncode != 0:
+                raise RuntimeError(f"{exe} failed with exit code {result.returncode}: {result.stderr.strip()}")
+            return (Path(tmp) / f"blur_{src.name}").read_bytes()
+
+    return advance
+
+
+class ReferenceCache:
+    def __init__(self, root: str | os.PathLike | None = None, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        self.root = Path(root).expanduser() if root is not None else default_cache_dir()
+        self.max_bytes = max_bytes
+
+    def _dir(self, sha: str) -> Path:
+        return self.root / sha[:2] / sha
+
+    @staticmethod
+    def _stem(width: int, height: int, mode: str, kernel: str) -> str:
+        return f"{width}x{height}_{mode}_{kernel}"
+
+    def path_for(self, sha: str, width: int, height: int, mode: str, loops: int, kernel: str = "gaussian") -> Path:
+        return self._dir(sha) / f"{self._stem(width, height, mode, kernel)}_{loops}.raw"
+
+    def get(self, sha: str, width: int, height: int, mode: str, loops: int, kernel: str = "gaussian") -> Path | None:
+        path = self.path_for(sha, width, height, mode, loops, kernel)
+        expected = width * height * channels_for(mode)
+        try:
+            if path.stat().st_size != expected:
+                return None
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    def nearest(
+        self, sha: str, width: int, height: int, mode: str, loops: int, kernel: str = "gaussian"
+    ) -> tuple[int, Path] | None:
+        """The valid cached entry with the most iterations not exceeding `loops`."""
+        stem = self._stem(width, height, mode, kernel)
+        candidates = []
+        for path in self._dir(sha).glob(f"{stem}_*.raw"):
+            tail = path.stem[len(stem) + 1:]
+            if tail.isdigit() and int(tail) <= loops:
+                candidates.append((int(tail), path))
+        # An entry of the wrong size (truncated write, stale file) falls back to the next lower count
+        for done, path in sorted(candidates, reverse=True):
+            if self.get(sha, width, height, mode, done, kernel) is not None:
+                return done, path
+        return None
+
+    def put(self, sha: str, width: int, height: int, mode: str, loops: int, kernel: str, data: bytes) -> Path:
+        path = self.path_for(sha, width, height, mode, loops, kernel)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(prefix=path.name, suffix=".tmp", dir=path.parent)
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        self.evict(keep=path)
+        return path
+
+    def evict(self, keep: Path | None = None) -> None:
+        """Delete least recently used entries until the cache fits in max_bytes."""
+        entries = []
+        total = 0
+        for path in self.root.glob("*/*/*.raw"):
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime_ns, st.st_size, path))
+            total += st.st_size
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            if keep is not None and path == keep:
+                continue
+            path.unlink(missing_ok=True)
+            total -= size
+            try:
+                path.parent.rmdir()
+                path.parent.parent.rmdir()
+            except OSError:
+                pass
+
+    def blur(
+        self,
+        data: bytes,
+        width: int,
+        height: int,
+        mode: str,
+        loops: int,
+        kernel: str = "gaussian",
+        advance: Advance | None = None,
+    ) -> bytes:
+        """
+        Return `data` after `loops` iterations, from the cache when possible.
+
+        advance defaults to the NumPy reference engine; pass seq_conv_advance()
+        to derive missing entries with seq_conv instead.
+        """
+        if loops == 0:
+            return bytes(data)
+        sha = hashlib.sha256(data).hexdigest()
+        hit = self.nearest(sha, width, height, mode, loops, kernel)
+        if hit is not None and hit[0] == loops:
+            return hit[1].read_bytes()
+        start, current = (hit[0], hit[1].read_bytes()) if hit is not None else (0, bytes(data))
+        if advance is None:
+            advance = numpy_advance(width, height, mode, kernel)
+        result = advance(current, loops - start)
+        self.put(sha, width, height, mode, loops, kernel, result)
+        return result
+
+    def blur_file(
+        self,
+        input_path: str | os.PathLike,
+        out_path: str | os.PathLike,
+        width: int,
+        height: int,
+        mode: str,
+        loops: int,
+        kernel: str = "gaussian",
+        advance: Advance | None = None,
+        header: int = 0,
+    ) -> None:
+        """
+        blur() for files; out_path gets a private copy, never a link into the
+        cache. The first `header` bytes of input_path (a PGM/PPM header) are
+        not part of the image.
+        """
+        result = self.blur(Path(input_path).read_bytes()[header:], width, height, mode, loops, kernel, advance)
+        Path(out_path).write_bytes(result)
@@ -0,0 +1,165 @@
+"""
+Streaming comparison of two raw GREY/RGB frames.
+
+Both files are memory-mapped and walked in row chunks, so the cost is one
+sequential read of each file and memory use stays at a few chunk-sized
+temporaries whatever the frame size. Chunks that are byte-identical are
+counted without further work. Everything else is derived from a per-channel
+histogram of |lhs - rhs|, which makes the error sums exact integers.
+"""
+
+from __future__ import annotations
+
+import math
+import os
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from .rawio import create_pnm, open_raw
+from .reference import channels_for
+
+CHUNK_BYTES = 1 << 24
+CHANNEL_NAMES = {1: ("grey",), 3: ("R", "G", "B")}
+
+
+@dataclass
+class DiffStats:
+    width: int
+    height: int
+    channels: int
+    diff_pixels: int = 0
+    hist: np.ndarray = field(default=None)  # (channels, 256) counts of |lhs - rhs|
+    first_mismatch: int | None = None  # byte offset
+
+    def __post_init__(self) -> None:
+        if self.hist is None:
+            self.hist = np.zeros((self.channels, 256), dtype=np.int64)
+
+    @property
+    def samples(self) -> int:
+        return self.width * self.height * self.channels
+
+    @property
+    def diff_samples(self) -> int:
+        return self.samples - int(self.hist[:, 0].sum())
+
+    @property
+    def max_abs(self) -> int:
+        nz = np.flatnonzero(self.hist.sum(axis=0))
+        return int(nz[-1]) if nz.size else 0
+
+    @property
+    def mean_abs(self) -> float:
+        values = np.arange(256, dtype=np.int64)
+        return int((self.hist * values).sum()) / self.samples if self.samples else 0.0
+
+    @property
+    def mse(self) -> float:
+        values = np.arange(256, dtype=np.int64)
+        return int((self.hist * values * values).sum()) / self.samples if self.samples else 0.0
+
+    @property
+    def psnr(self) -> float:
+        mse = self.mse
+        return math.inf if mse == 0 else 10.0 * math.log10(255.0 * 255.0 / mse)
+
+    @property
+    def identical(self) -> bool:
+        return self.diff_samples == 0
+
+    def within(self, tolerance: int) -> bool:
+        return self.max_abs <= tolerance
+
+    def summary(self) -> str:
+        if self.identical:
+            return "identical"
+        pixels = self.width * self.height
+        return (
+            f"{self.diff_pixels} of {pixels} pixels differ ({100.0 * self.diff_pixels / pixels:.4f}%), "
+            f"max {self.max_abs}, mean {self.mean_abs:.6f}, PSNR {self.psnr:.2f} dB, "
+            f"first mismatch at byte {self.first_mismatch}"
+        )
+
+    def histogram_lines(self) -> list[str]:
+        """One line per channel listing the non-zero |diff| bins, e.g. 'R: 1:1200 2:3'."""
+        lines = []
+        for name, row in zip(CHANNEL_NAMES[self.channels], self.hist):
+            bins = " ".join(f"{v}:{int(row[v])}" for v in np.flatnonzero(row) if v)
+            lines.append(f"{name}: {bins or '-'}")
+        return lines
+
+
+def _pixel_max(d: np.ndarray, channels: int) -> np.ndarray:
+    """Largest channel error of every pixel in a (rows, width * channels) block."""
+    if channels == 1:
+        return d
+    d = d.reshape(d.shape[0], -1, channels)
+    return np.maximum(np.maximum(d[:, :, 0], d[:, :, 1]), d[:, :, 2])
+
+
+def compare_raw(
+    lhs: str | os.PathLike,
+    rhs: str | os.PathLike,
+    width: int,
+    height: int,
+    mode: str,
+    heatmap: str | os.PathLike | None = None,
+    chunk_bytes: int = CHUNK_BYTES,
+) -> DiffStats:
+    """
+    Compare two raw frames of the given geometry.
+
+    With `heatmap`, a binary PGM of the per-pixel maximum channel error is
+    written, scaled so the largest error is white (all black if identical).
+    Raises ValueError if either file does not have the expected size.
+    """
+    channels = channels_for(mode)
+    row_bytes = width * channels
+    a = open_raw(lhs, width, height, mode).reshape(height, row_bytes)
+    b = open_raw(rhs, width, height, mode).reshape(height, row_bytes)
+
+    stats = DiffStats(width, height, channels)
+    if a.size == 0:
+        return stats
+    heat = create_pnm(heatmap, width, height, "grey") if heatmap is not None else None
+
+    rows_per_chunk = max(1, chunk_bytes // row_bytes)
+    for row_from in range(0, height, rows_per_chunk):
+        row_to = min(height, row_from + rows_per_chunk)
+        ca = a[row_from:row_to]
+        cb = b[row_from:row_to]
+        if memoryview(ca) == memoryview(cb):
+            stats.hist[:, 0] += (row_to - row_from) * width
+            continue
+        # |a - b| without widening: max - min stays in uint8
+        d = np.maximum(ca, cb) - np.minimum(ca, cb)
+        flat = d.reshape(-1)
+        samples = (row_to - row_from) * width
+        if np.count_nonzero(flat) * 8 < flat.size:
+            # Sparse differences (the usual case): only look at the non-zero bytes
+            nz = np.flatnonzero(flat)
+            counts = np.bincount(flat[nz] + 256 * (nz % channels), minlength=256 * channels).reshape(channels, 256)
+            counts[:, 0] = samples - counts.sum(axis=1)
+            pix = nz // channels
+            stats.diff_pixels += 1 + int(np.count_nonzero(pix[1:] != pix[:-1]))
+            first = int(nz[0])
+        else:
+            counts = np.stack([np.bincount(flat[c::channels], minlength=256) for c in range(channels)])
+            first = int(np.flatnonzero(flat)[0])
+            stats.diff_pixels += int(np.count_nonzero(_pixel_max(d, channels)))
+        stats.hist += counts
+        if stats.first_mismatch is None:
+            stats.first_mismatch = row_from * row_bytes + first
+        if heat is not None:
+            heat[row_from:row_to] = _pixel_max(d, channels)
+
+    if heat is not None:
+        gain = 255 // stats.max_abs if stats.max_abs else 1
+        if gain > 1:
+            for row_from in range(0, height, rows_per_chunk):
+                chunk = heat[row_from:row_from + rows_per_chunk]
+                chunk *= np.uint8(gain)
+        heat.flush()
+        del heat
+    return stats
@@ -0,0 +1,228 @@
+"""
+Benchmark input generation: headerless raw images written in chunks.
+
+Streams
+-------
+"v1"  The historical inputs: byte i is random.Random(seed).getrandbits(8) of
+      the i-th call, i.e. the top 8 bits of the i-th MT19937 output. The
+      Python generator state is loaded into NumPy's MT19937 so the same bytes
+      come out in bulk instead of one Python call per byte.
+"v2"  PCG64(seed) raw 64-bit outputs as little-endian bytes. Not compatible
+      with v1; select it explicitly.
+
+Patterns
+--------
+"noise" is the stream itself (the only pattern the benchmarks used so far).
+"gradient", "edges" and "mixed" are synthetic images computed from pixel
+coordinates with integer arithmetic, so their bytes are identical on every
+platform; "mixed" adds stream noise on top of gradient + edges.
+
+ensure_data_file() keeps a small index (.datagen.json) next to the files with
+the generating spec and the SHA-256 of each file's content. A file is reused
+only when the spec matches and its content still hashes to the recorded value;
+otherwise it is regenerated.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import random
+from pathlib import Path
+from typing import Iterator
+
+import numpy as np
+
+from .reference import channels_for
+
+SEED = 123
+STREAMS = ("v1", "v2")
+PATTERNS = ("noise", "gradient", "edges", "mixed")
+CHUNK_BYTES = 1 << 22
+INDEX_NAME = ".datagen.json"
+
+
+class ByteStream:
+    """Deterministic byte source; successive take() calls continue the stream."""
+
+    def __init__(self, seed: int = SEED, stream: str = "v1") -> None:
+        if stream == "v1":
+            state = random.Random(seed).getstate()[1]
+            self._bitgen = np.random.MT19937()
+            self._bitgen.state = {
+                "bit_generator": "MT19937",
+                "state": {"key": np.asarray(state[:624], dtype=np.uint32), "pos": state[624]},
+            }
+        elif stream == "v2":
+            self._bitgen = np.random.PCG64(seed)
+        else:
+            raise ValueError(f"Unknown stream: {stream}")
+        self.stream = stream
+        self._spare = np.empty(0, dtype=np.uint8)
+
+    def take(self, n: int) -> np.ndarray:
+        if self.stream == "v1":
+            # getrandbits(8) == genrand_uint32() >> 24
+            return (self._bitgen.random_raw(n) >> 24).astype(np.uint8)
+        need = n - self._spare.size
+        if need <= 0:
+            out, self._spare = self._spare[:n], self._spare[n:]
+            return out
+        words = self._bitgen.random_raw((need + 7) // 8).astype("<u8").view(np.uint8)
+        out = np.concatenate((self._spare, words[:need]))
+        self._spare = words[need:]
+        return out
+
+
+def _gradient(y: np.ndarray, x: np.ndarray, width: int, height: int, channels: int) -> np.ndarray:
+    gx = x * 255 // max(width - 1, 1)
+    gy = y * 255 // max(height - 1, 1)
+    if channels == 1:
+        return (gx + gy) // 2
+    # Red runs left to right, green top to bottom, blue along the diagonal
+    return np.stack(np.broadcast_arrays(gx, gy, (gx + gy) // 2), axis=-1)
+
+
+def _edges(y: np.ndarray, x: np.ndarray, width: int, height: int, channels: int) -> np.ndarray:
+    cell = max(8, min(width, height) // 8)
+    checker = np.where(((y // cell) + (x // cell)) & 1, 208, 48)
+    dy = 2 * y - (height - 1)
+    dx = 2 * x - (width - 1)
+    d2 = dx * dx + dy * dy
+    r = min(width, height) * 3 // 4
+    ring = (d2 >= r * r) & (d2 < (r + cell) * (r + cell))
+    grey = np.where(ring, 255 - checker, checker)
+    if channels == 1:
+        return grey
+    return np.stack(np.broadcast_arrays(grey, 255 - grey, np.where(ring, 255, 96)), axis=-1)
+
+
+def image_chunks(
+    width: int,
+    height: int,
+    mode: str,
+    pattern: str = "noise",
+    seed: int = SEED,
+    stream: str = "v1",
+    chunk_bytes: int = CHUNK_BYTES,
+) -> Iterator[np.ndarray]:
+    """Yield the image bytes in file order as uint8 arrays of about chunk_bytes each."""
+    if pattern not in PATTERNS:
+        raise ValueError(f"Unknown pattern: {pattern}")
+    channels = channels_for(mode)
+    row_bytes = width * channels
+    rows_per_chunk = max(1, chunk_bytes // max(row_bytes, 1))
+    source = ByteStream(seed, stream) if pattern in ("noise", "mixed") else None
+    x = np.arange(width, dtype=np.int64)[None, :]
+
+    for row_from in range(0, height, rows_per_chunk):
+        rows = min(rows_per_chunk, height - row_from)
+        if pattern == "noise":
+            yield source.take(rows * row_bytes)
+            continue
+        y = np.arange(row_from, row_from + rows, dtype=np.int64)[:, None]
+        if pattern == "gradient":
+            values = _gradient(y, x, width, height, channels)
+        elif pattern == "edges":
+            values = _edges(y, x, width, height, channels)
+        else:
+            noise = source.take(rows * row_bytes).reshape(rows, width, channels).astype(np.int64)
+            if channels == 1:
+                noise = noise[:, :, 0]
+            base = (_gradient(y, x, width, height, channels) + _edges(y, x, width, height, channels)) // 2
+            values = base + (noise >> 3) - 16
+        yield np.clip(values, 0, 255).astype(np.uint8).reshape(-1)
+
+
+def synthetic_image(
+    width: int, height: int, mode: str, pattern: str = "noise", seed: int = SEED, stream: str = "v1"
+) -> np.ndarray:
+    """The whole image as a (height, width) or (height, width, 3) uint8 array."""
+    flat = np.concatenate(list(image_chunks(width, height, mode, pattern, seed, stream)))
+    if channels_for(mode) == 1:
+        return flat.reshape(height, width)
+    return flat.reshape(height, width, 3)
+
+
+def write_data_file(
+    path: str | os.PathLike,
+    width: int,
+    height: int,
+    mode: str,
+    pattern: str = "noise",
+    seed: int = SEED,
+    stream: str = "v1",
+) -> str:
+    """Write the image chunk by chunk and return the SHA-256 of its content."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    digest = hashlib.sha256()
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        for chunk in image_chunks(width, height, mode, pattern, seed, stream):
+            digest.update(chunk)
+            f.write(chunk)
+    os.replace(tmp, path)
+    return digest.hexdigest()
+
+
+def sha256_file(path: str | os.PathLike, chunk_bytes: int = CHUNK_BYTES) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while block := f.read(chunk_bytes):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _load_index(directory: Path) -> dict:
+    try:
+        return json.loads((directory / INDEX_NAME).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+def _store_index(directory: Path, index: dict) -> None:
+    tmp = directory / (INDEX_NAME + ".tmp")
+    tmp.write_text(json.dumps(index, indent=1, sort_keys=True), encoding="utf-8")
+    os.replace(tmp, directory / INDEX_NAME)
+
+
+def ensure_data_file(
+    path: str | os.PathLike,
+    width: int,
+    height: int,
+    mode: str,
+    pattern: str = "noise",
+    seed: int = SEED,
+    stream: str = "v1",
+) -> str:
+    """
+    Make sure `path` holds the requested image and return its SHA-256.
+
+    The file is regenerated when it is missing, was produced from a different
+    spec, or no longer matches the content hash recorded when it was written.
+    """
+    path = Path(path)
+    spec = {"width": width, "height": height, "mode": mode, "pattern": pattern, "seed": seed, "stream": stream}
+    index = _load_index(path.parent)
+    entry = index.get(path.name)
+    if entry is not None and entry.get("spec") == spec and path.is_file():
+        if path.stat().st_size == entry.get("size") and sha256_file(path) == entry.get("sha256"):
+            return entry["sha256"]
+
+    sha = write_data_file(path, width, height, mode, pattern, seed, stream)
+    index = _load_index(path.parent)
+    index[path.name] = {"spec": spec, "size": path.stat().st_size, "sha256": sha}
+    _store_index(path.parent, index)
+    return sha
+
+
+def data_file_name(width: int, height: int, mode: str, pattern: str = "noise", stream: str = "v1") -> str:
+    """File name used under data/: the v1 noise inputs keep their historical names."""
+    parts = [mode]
+    if pattern != "noise":
+        parts.append(pattern)
+    if stream != "v1":
+        parts.append(stream)
+    return "_".join(parts) + f"_{width}x{height}.bin"
@@ -0,0 +1,119 @@
+"""
+Memory-mapped I/O for headerless raw frames and binary PGM/PPM files.
+
+Readers return numpy.memmap views shaped (height, width) for grey and
+(height, width, 3) for rgb, so a frame is paged in from the file on demand
+instead of being copied into a bytes object first. Writers emit the short
+PNM header and then hand a memoryview of the pixels to the file, so a frame
+that is itself a mapping goes from page cache to page cache without an
+intermediate copy.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+
+import numpy as np
+
+from .reference import channels_for
+
+PNM_MAGIC = {"grey": b"P5", "rgb": b"P6"}
+PNM_SUFFIX = {"grey": ".pgm", "rgb": ".ppm"}
+# magic, width, height, maxval, each preceded by whitespace and/or comments, then one whitespace byte
+_PNM_HEADER = re.compile(rb"(P[56])((?:\s+|#[^\n]*\n)+)(\d+)((?:\s+|#[^\n]*\n)+)(\d+)((?:\s+|#[^\n]*\n)+)(\d+)\s")
+_HEADER_PEEK = 4096
+
+
+def frame_shape(width: int, height: int, mode: str) -> tuple[int, ...]:
+    channels = channels_for(mode)
+    return (height, width) if channels == 1 else (height, width, channels)
+
+
+def mode_of(image: np.ndarray) -> str:
+    if image.dtype != np.uint8 or image.ndim not in (2, 3) or (image.ndim == 3 and image.shape[2] != 3):
+        raise ValueError("image must be a uint8 array of shape (H, W) or (H, W, 3)")
+    return "grey" if image.ndim == 2 else "rgb"
+
+
+def _map(path: str | os.PathLike, offset: int, shape: tuple[int, ...], access: str) -> np.ndarray:
+    expected = int(np.prod(shape))
+    size = os.path.getsize(path) - offset
+    if size != expected:
+        raise ValueError(f"{path}: {size} bytes of pixel data (expected {expected})")
+    if expected == 0:
+        return np.zeros(shape, dtype=np.uint8)
+    return np.memmap(path, dtype=np.uint8, mode=access, offset=offset, shape=shape)
+
+
+def open_raw(path: str | os.PathLike, width: int, height: int, mode: str, writable: bool = False) -> np.ndarray:
+    """Map a headerless raw frame; raises ValueError if the file size does not match."""
+    return _map(path, 0, frame_shape(width, height, mode), "r+" if writable else "r")
+
+
+def create_raw(path: str | os.PathLike, width: int, height: int, mode: str) -> np.ndarray:
+    """Create (or truncate) a raw frame of the given geometry and map it writable, zero filled."""
+    shape = frame_shape(width, height, mode)
+    with open(path, "wb") as f:
+        f.truncate(int(np.prod(shape)))
+    return _map(path, 0, shape, "r+")
+
+
+def pnm_header(width: int, height: int, mode: str) -> bytes:
+    return PNM_MAGIC[mode] + f"\n{width} {height}\n255\n".encode("ascii")
+
+
+def create_pnm(path: str | os.PathLike, width: int, height: int, mode: str) -> np.ndarray:
+    """Create a PGM/PPM of the given geometry and map its pixels writable, zero filled."""
+    header = pnm_header(width, height, mode)
+    shape = frame_shape(width, height, mode)
+    with open(path, "wb") as f:
+        f.write(header)
+        f.truncate(len(header) + int(np.prod(shape)))
+    return _map(path, len(header), shape, "r+")
+
+
+def read_pnm_header(path: str | os.PathLike) -> tuple[int, int, str, int]:
+    """(width, height, mode, pixel offset) of a binary PGM (P5) or PPM (P6) with maxval 255."""
+    with open(path, "rb") as f:
+        head = f.read(_HEADER_PEEK)
+    match = _PNM_HEADER.match(head)
+    if match is None:
+        raise ValueError(f"{path}: not a binary PGM/PPM file")
+    magic, width, height, maxval = match.group(1, 3, 5, 7)
+    if int(maxval) != 255:
+        raise ValueError(f"{path}: maxval {int(maxval)} is not supported (only 255)")
+    mode = "grey" if magic == b"P5" else "rgb"
+    return int(width), int(height), mode, match.end()
+
+
+def read_pnm(path: str | os.PathLike, writable: bool = False) -> np.ndarray:
+    """Map the pixels of a binary PGM/PPM; the mode follows from the shape of the result."""
+    width, height, mode, offset = read_pnm_header(path)
+    return _map(path, offset, frame_shape(width, height, mode), "r+" if writable else "r")
+
+
+def _write(path: str | os.PathLike, header: bytes, image: np.ndarray) -> None:
+    # ascontiguousarray only copies views that are not laid out in file order
+    pixels = memoryview(np.ascontiguousarray(image)).cast("B")
+    with open(path, "wb") as f:
+        f.write(header)
+        f.write(pixels)
+
+
+def write_raw(path: str | os.PathLike, image: np.ndarray) -> None:
+    mode_of(image)
+    _write(path, b"", image)
+
+
+def write_pnm(path: str | os.PathLike, image: np.ndarray) -> None:
+    """Write a grey image as PGM (P5) or an rgb image as PPM (P6)."""
+    height, width = image.shape[:2]
+    _write(path, pnm_header(width, height, mode_of(image)), image)
+
+
+def raw_to_pnm(
+    src: str | os.PathLike, dst: str | os.PathLike, width: int, height: int, mode: str
+) -> None:
+    """Convert a raw frame to PGM/PPM without reading it into memory first."""
+    write_pnm(dst, open_raw(src, width, height, mode))
@@ -0,0 +1,107 @@
+"""
+Vectorized NumPy reference for the 3x3 convolution implemented in seq/seq_conv.c.
+
+The arithmetic mirrors convolute_grey/convolute_rgb tap by tap: every product is
+taken in float32 with the float kernel h = taps / divisor, the nine products
+are summed left to right, and the result is truncated to uint8. Borders are
+zero padded exactly like the (height+2) x (width+2) arrays of the C engines.
+"""
+
+from __future__ import annotations
+
+from typing import Iterator
+
+import numpy as np
+
+KERNELS: dict[str, tuple[tuple[tuple[int, int, int], ...], int]] = {
+    "gaussian": (((1, 2, 1), (2, 4, 2), (1, 2, 1)), 16),
+    "box": (((1, 1, 1), (1, 1, 1), (1, 1, 1)), 9),
+    "edge": (((1, 4, 1), (4, 8, 4), (1, 4, 1)), 28),
+}
+
+
+def float_kernel(kernel: str = "gaussian") -> np.ndarray:
+    try:
+        taps, divisor = KERNELS[kernel]
+    except KeyError:
+        raise ValueError(f"Unknown kernel: {kernel}") from None
+    # Same as `taps[i][j] / 16.0f` in C: the division happens in float32.
+    return np.asarray(taps, dtype=np.float32) / np.float32(divisor)
+
+
+def channels_for(mode: str) -> int:
+    if mode == "grey":
+        return 1
+    if mode == "rgb":
+        return 3
+    raise ValueError(f"Unknown mode: {mode}")
+
+
+def from_raw(data: bytes | bytearray | memoryview, width: int, height: int, mode: str) -> np.ndarray:
+    """Interpret headerless raw bytes as a (height, width) or (height, width, 3) image."""
+    channels = channels_for(mode)
+    expected = width * height * channels
+    arr = np.frombuffer(data, dtype=np.uint8)
+    if arr.size != expected:
+        raise ValueError(f"raw size mismatch: {arr.size} bytes (expected {expected})")
+    if channels == 1:
+        return arr.reshape(height, width)
+    return arr.reshape(height, width, channels)
+
+
+def iterate(image: np.ndarray, kernel: str = "gaussian") -> Iterator[np.ndarray]:
+    """
+    Yield the image after 1, 2, 3, ... iterations.
+
+    Two zero-padded ping-pong buffers and the float32 accumulators are
+    allocated once; each step only does the arithmetic. The yielded array is a
+    view into a ping-pong buffer and is overwritten by the step after next, so
+    copy it if it has to outlive the iteration.
+    """
+    if image.dtype != np.uint8 or image.ndim not in (2, 3) or (image.ndim == 3 and image.shape[2] != 3):
+        raise ValueError("image must be a uint8 array of shape (H, W) or (H, W, 3)")
+    h = float_kernel(kernel)
+    height, width = image.shape[:2]
+    padded_shape = (height + 2, width + 2) + image.shape[2:]
+
+    src = np.zeros(padded_shape, dtype=np.uint8)
+    dst = np.zeros(padded_shape, dtype=np.uint8)
+    src[1:-1, 1:-1] = image
+    acc = np.empty(image.shape, dtype=np.float32)
+    prod = np.empty(image.shape, dtype=np.float32)
+
+    while True:
+        np.multiply(src[0:height, 0:width], h[0, 0], out=acc, dtype=np.float32)
+        for i in range(3):
+            for j in range(3):
+                if i == 0 and j == 0:
+                    continue
+                np.multiply(src[i:i + height, j:j + width], h[i, j], out=prod, dtype=np.float32)
+                np.add(acc, prod, out=acc)
+        np.copyto(dst[1:-1, 1:-1], acc, casting="unsafe")
+        src, dst = dst, src
+        yield src[1:-1, 1:-1]
+
+
+def convolute(image: np.ndarray, loops: int, kernel: str = "gaussian") -> np.ndarray:
+    """Return a new array holding `image` after `loops` iterations."""
+    if loops < 0:
+        raise ValueError("loops must be >= 0")
+    if loops == 0:
+        return np.array(image, dtype=np.uint8, copy=True)
+    steps = iterate(image, kernel)
+    for _ in range(loops - 1):
+        next(steps)
+    return next(steps).copy()
+
+
+def convolute_raw(
+    data: bytes | bytearray | memoryview,
+    width: int,
+    height: int,
+    loops: int,
+    mode: str,
+    kernel: str = "gaussian",
+) -> bytes:
+    """Raw bytes in, raw bytes out; the drop-in replacement for a seq_conv run."""
+    return convolute(from_raw(data, width, height, mode), loops, kernel).tobytes()
@@ -0,0 +1,267 @@
+"""
+Launch-configuration autotuning for seq_conv, mpi_conv and mpi_omp_conv.
+
+For one case (width, height, mode, loops) and a core budget, search() times
+short trial runs over
+
+    MPI ranks x OpenMP threads per rank x grid (row x column blocks) x tile
+
+and returns the fastest configuration. The search is staged: every
+ranks/threads/grid layout first runs untiled, then the tile candidates run on
+the `keep` fastest layouts only, so the number of trials grows with the sum of
+the axes rather than their product. A trial is scored by the compute time the
+engine prints (best of `repeats`), so process start-up and I/O do not count.
+
+TuneDB stores the winners in a JSON file keyed by engine, case and core
+budget. lookup() falls back to the entry with the nearest loop count for the
+same engine, shape, mode and budget, since the decomposition that wins hardly
+depends on it. launch_command() turns an entry back into the command line;
+scripts/autotune.py "run" is the launcher built on it.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import tempfile
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Callable, Sequence
+
+from .bench import Job, Result, result_runtime, run_jobs
+from .cache import default_cache_dir
+from .reference import channels_for
+
+# Must match TILE_CACHE_BYTES of the engines: L1 budget for one --tile strip
+TILE_CACHE_BYTES = 32 * 1024
+TRIAL_LOOPS = 5
+REPEATS = 2
+KEEP = 3
+
+# engine name -> (runs under mpiexec, takes --threads)
+ENGINES = {
+    "seq_conv": (False, False),
+    "mpi_conv": (True, False),
+    "mpi_omp_conv": (True, True),
+}
+
+
+@dataclass(frozen=True)
+class Config:
+    ranks: int = 1
+    threads: int = 1
+    grid: str | None = None  # "RxC"; None leaves the split to divide_rows()
+    tile: str = "0x0"
+
+    def engine_args(self, engine: str) -> list[str]:
+        mpi, threaded = ENGINES[engine]
+        args = []
+        if mpi and self.grid is not None:
+            args += ["--grid", self.grid]
+        if threaded:
+            args += ["--threads", str(self.threads)]
+        if self.tile != "0x0":
+            args += ["--tile", self.tile]
+        return args
+
+    def label(self) -> str:
+        return f"ranks={self.ranks} threads={self.threads} grid={self.grid or '-'} tile={self.tile}"
+
+
+def engine_name(exe: str | os.PathLike) -> str:
+    name = Path(exe).name
+    if name.lower().endswith(".exe"):
+        name = name[:-4]
+    if name not in ENGINES:
+        raise ValueError(f"Unknown engine {name!r}; expected one of {', '.join(ENGINES)}")
+    return name
+
+
+def grids(ranks: int, width: int, height: int) -> list[str]:
+    """Every R x C split of `ranks` processes whose blocks are at least 1 x 1."""
+    return [f"{r}x{ranks // r}" for r in range(1, ranks + 1) if ranks % r == 0 and r <= height and ranks // r <= width]
+
+
+def thread_counts(cores: int) -> list[int]:
+    """Powers of two up to the core budget, and the budget itself."""
+    counts = []
+    t = 1
+    while t <= cores:
+        counts.append(t)
+        t *= 2
+    if counts[-1] != cores:
+        counts.append(cores)
+    return counts
+
+
+def layouts(engine: str, cores: int, width: int, height: int) -> list[Config]:
+    """The untiled configurations of stage 1 that fit the core budget."""
+    mpi, threaded = ENGINES[engine]
+    if not mpi:
+        return [Config()]
+    configs = []
+    for threads in thread_counts(cores) if threaded else [1]:
+        for ranks in range(1, cores // threads + 1):
+            configs += [Config(ranks, threads, grid) for grid in grids(ranks, width, height)]
+    return configs
+
+
+def tiles(width: int, mode: str) -> list[str]:
+    """
+    Stage 2 tile candidates: row bands, and column strips whose three input
+    rows and output row fit TILE_CACHE_BYTES or a quarter of it. "0x0" (no
+    tiling) is the stage 1 baseline.
+    """
+    fit = TILE_CACHE_BYTES // (4 * channels_for(mode))
+    candidates = ["8x0", "32x0", "128x0"]
+    for cols in (fit, fit // 4):
+        if cols < width:
+            candidates += [f"0x{cols}", f"32x{cols}"]
+    return candidates
+
+
+def launch_command(
+    exe: str | os.PathLike,
+    config: Config,
+    image: str,
+    width: int,
+    height: int,
+    loops: int,
+    mode: str,
+    mpiexec: str = "mpiexec",
+    extra: Sequence[str] = (),
+) -> list[str]:
+    engine = engine_name(exe)
+    cmd = [str(exe), image, str(width), str(height), str(loops), mode] + config.engine_args(engine) + list(extra)
+    if ENGINES[engine][0]:
+        cmd = [mpiexec, "-n", str(config.ranks)] + cmd
+    return cmd
+
+
+def trial_loop_count(loops: int, trial_loops: int = TRIAL_LOOPS) -> int:
+    """Iterations each trial of search() runs: min(loops, trial_loops), at least 1."""
+    return max(1, min(loops, trial_loops))
+
+
+def search(
+    exe: str | os.PathLike,
+    image: str | os.PathLike,
+    width: int,
+    height: int,
+    mode: str,
+    loops: int,
+    cores: int,
+    mpiexec: str = "mpiexec",
+    trial_loops: int = TRIAL_LOOPS,
+    repeats: int = REPEATS,
+    keep: int = KEEP,
+    extra: Sequence[str] = (),
+    env: dict[str, str] | None = None,
+    on_trial: Callable[[Config, float | None], None] | None = None,
+) -> tuple[Config, float, list[tuple[Config, float | None]]]:
+    """
+    Return (best config, its trial seconds, every trial) for one case.
+
+    Trials run one at a time on trial_loop_count(loops, trial_loops)
+    iterations of `image`, in a scratch directory that receives the outputs. A trial that
+    fails (a grid the engine rejects, too few MPI slots, ...) scores None and
+    is skipped; if every trial fails, RuntimeError carries the first error.
+    """
+    exe = Path(exe).resolve()
+    image = str(Path(image).resolve())
+    engine = engine_name(exe)
+    trial_loops = trial_loop_count(loops, trial_loops)
+    trials: list[tuple[Config, float | None]] = []
+    errors: list[str] = []
+
+    with tempfile.TemporaryDirectory(prefix="parconv_tune_") as tmp:
+
+        def measure(configs: list[Config]) -> None:
+            jobs = [
+                Job(cmd=launch_command(exe, config, image, width, height, trial_loops, mode, mpiexec, extra),
+                    cpus=config.ranks * config.threads, cwd=tmp, env=env, key=config)
+                for config in configs for _ in range(repeats)
+            ]
+            best: dict[Config, float] = {}
+
+            def done(res: Result) -> None:
+                rt, err = result_runtime(res)
+                if err is not None:
+                    errors.append(err)
+                elif res.job.key not in best or rt < best[res.job.key]:
+                    best[res.job.key] = rt
+
+            run_jobs(jobs, on_done=done)
+            for config in configs:
+                trials.append((config, best.get(config)))
+                if on_trial is not None:
+                    on_trial(config, best.get(config))
+
+        measure(layouts(engine, cores, width, height))
+        ranked = sorted((rt, n, config) for n, (config, rt) in enumerate(trials) if rt is not None)
+        top = [config for _, _, config in ranked[:keep]]
+        measure([Config(c.ranks, c.threads, c.grid, tile) for c in top for tile in tiles(width, mode)])
+
+    scored = [(rt, n, config) for n, (config, rt) in enumerate(trials) if rt is not None]
+    if not scored:
+        raise RuntimeError("every trial failed\n" + (errors[0] if errors else ""))
+    rt, _, config = min(scored)
+    return config, rt, trials
+
+
+def default_db_path() -> Path:
+    env = os.environ.get("PARCONV_TUNE_DB")
+    if env:
+        return Path(env).expanduser()
+    return default_cache_dir() / "tune.json"
+
+
+class TuneDB:
+    """Best configuration per (engine, width, height, mode, loops, cores), as JSON."""
+
+    def __init__(self, path: str | os.PathLike | None = None) -> None:
+        self.path = Path(path).expanduser() if path is not None else default_db_path()
+        try:
+            self.entries: dict[str, dict] = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            self.entries = {}
+
+    @staticmethod
+    def key(engine: str, width: int, height: int, mode: str, loops: int, cores: int) -> str:
+        return f"{engine} {width}x{height} {mode} loops={loops} cores={cores}"
+
+    def lookup(self, engine: str, width: int, height: int, mode: str, loops: int, cores: int) -> dict | None:
+        """The exact entry, else the one with the nearest loop count for the same shape and budget."""
+        entry = self.entries.get(self.key(engine, width, height, mode, loops, cores))
+        if entry is not None:
+            return entry
+        same = [
+            e for e in self.entries.values()
+            if (e["engine"], e["width"], e["height"], e["mode"], e["cores"]) == (engine, width, height, mode, cores)
+        ]
+        return min(same, key=lambda e: (abs(e["loops"] - loops), e["loops"]), default=None)
+
+    def store(
+        self, engine: str, width: int, height: int, mode: str, loops: int, cores: int, config: Config, seconds: float,
+        trials: int,
+    ) -> dict:
+        entry = {
+            "engine": engine, "width": width, "height": height, "mode": mode, "loops": loops, "cores": cores,
+            **asdict(config),
+            "seconds": seconds, "trials": trials, "tuned": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        self.entries[self.key(engine, width, height, mode, loops, cores)] = entry
+        self.save()
+        return entry
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(prefix=self.path.name, suffix=".tmp", dir=self.path.parent)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, indent=1, sort_keys=True)
+        os.replace(tmp, self.path)
+
+
+def entry_config(entry: dict) -> Config:
+    return Config(entry["ranks"], entry["threads"], entry["grid"], entry["tile"])
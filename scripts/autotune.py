@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Find and reuse the fastest launch configuration per image shape.
+
+    autotune.py tune --exe mpi_omp/mpi_omp_conv --width 1920 --height 2520 --mode rgb --loops 20 --cores 16
+    autotune.py show
+    autotune.py run --exe mpi_omp/mpi_omp_conv --cores 16 image.raw 1920 2520 20 rgb
+
+"tune" searches MPI ranks x OpenMP threads x grid x tile with short trial
+runs (see parconv.tune) on a generated input of that shape, or on --image,
+and stores the winner in the tuning database (--db, default
+$PARCONV_TUNE_DB or <cache dir>/tune.json). "run" looks the case up and
+launches the engine with the stored --grid/--threads/--tile under
+mpiexec -n <ranks>; a case that was never tuned runs with the engine
+defaults (no --grid/--threads/--tile) on the whole budget (mpi_conv) or
+on one rank (mpi_omp_conv).
+Options after -- are passed to every engine run, e.g. -- --bind.
+"""
+
+from __future__ import annotations
+
+import argparse
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT))
+
+try:
+    from parconv.bench import available_cpus
+    from parconv.data import PATTERNS, SEED, data_file_name, ensure_data_file
+    from parconv.tune import KEEP, REPEATS, TRIAL_LOOPS, Config, TuneDB, engine_name, entry_config, launch_command, search, trial_loop_count
+except ImportError as exc:
+    raise SystemExit("autotune.py requires NumPy. Install it with: pip install numpy") from exc
+
+
+def resolve_exe(raw: str) -> Path:
+    for base in (Path(raw).expanduser(), REPO_ROOT / raw):
+        for path in (base, Path(str(base) + ".exe")):
+            if path.is_file():
+                return path.resolve()
+    raise FileNotFoundError(f"Executable not found: {raw}")
+
+
+def cmd_tune(args: argparse.Namespace) -> int:
+    exe, engine = args.exe, args.engine
+    if args.image:
+        image = Path(args.image)
+    else:
+        image = Path(args.data_dir) / data_file_name(args.width, args.height, args.mode, args.pattern)
+        ensure_data_file(image, args.width, args.height, args.mode, args.pattern, SEED)
+
+    def report(config: Config, seconds: float | None) -> None:
+        print(f"  {config.label():<50} {'failed' if seconds is None else f'{seconds:.6f} s'}")
+
+    print(f"[info] {engine} {args.width}x{args.height} {args.mode} loops={args.loops} cores={args.cores}")
+    try:
+        config, seconds, trials = search(
+            exe, image, args.width, args.height, args.mode, args.loops, args.cores,
+            mpiexec=shutil.which(args.mpiexec) or args.mpiexec, trial_loops=args.trial_loops,
+            repeats=args.repeats, keep=args.keep, extra=args.extra, on_trial=report,
+        )
+    except RuntimeError as exc:
+        print(str(exc).rstrip(), file=sys.stderr)
+        return 1
+    db = TuneDB(args.db)
+    db.store(engine, args.width, args.height, args.mode, args.loops, args.cores, config, seconds, len(trials))
+    print(f"[info] best: {config.label()} ({seconds:.6f} s for {trial_loop_count(args.loops, args.trial_loops)} loops)")
+    print(f"[info] stored in {db.path}")
+    return 0
+
+
+def cmd_show(args: argparse.Namespace) -> int:
+    db = TuneDB(args.db)
+    for key in sorted(db.entries):
+        config = entry_config(db.entries[key])
+        print(f"{key:<48} {config.label()}  {db.entries[key]['seconds']:.6f} s")
+    return 0
+
+
+def cmd_run(args: argparse.Namespace) -> int:
+    exe, engine = args.exe, args.engine
+    entry = TuneDB(args.db).lookup(engine, args.width, args.height, args.mode, args.loops, args.cores)
+    mpiexec = shutil.which(args.mpiexec) or args.mpiexec
+    if entry is not None:
+        cmd = launch_command(exe, entry_config(entry), args.image, args.width, args.height, args.loops, args.mode,
+                             mpiexec, args.extra)
+    else:
+        print(f"[warn] {args.width}x{args.height} {args.mode} was not tuned for {args.cores} cores, using engine defaults",
+              file=sys.stderr)
+        cmd = [str(exe), args.image, str(args.width), str(args.height), str(args.loops), args.mode] + args.extra
+        if engine != "seq_conv":
+            cmd = [mpiexec, "-n", str(args.cores if engine == "mpi_conv" else 1)] + cmd
+    print(" ".join(cmd), file=sys.stderr)
+    if args.dry_run:
+        return 0
+    return subprocess.run(cmd).returncode
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Autotune engine launch configurations per image shape")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def common(p: argparse.ArgumentParser) -> None:
+        p.add_argument("--db", default=None, help="Tuning database (default: $PARCONV_TUNE_DB or <cache dir>/tune.json)")
+
+    def engine_args(p: argparse.ArgumentParser) -> None:
+        p.add_argument("--exe", default=str(REPO_ROOT / "mpi_omp" / "mpi_omp_conv"), help="seq_conv, mpi_conv or mpi_omp_conv binary")
+        p.add_argument("--mpiexec", default="mpiexec", help="mpiexec path")
+        p.add_argument("--cores", type=int, default=len(available_cpus()), help="Core budget: ranks x threads (default: available CPUs)")
+
+    tune = sub.add_parser("tune", help="Search the fastest configuration of one case and store it")
+    common(tune)
+    engine_args(tune)
+    tune.add_argument("--width", type=int, required=True, help="Image width")
+    tune.add_argument("--height", type=int, required=True, help="Image height")
+    tune.add_argument("--mode", choices=["grey", "rgb"], required=True, help="Image mode")
+    tune.add_argument("--loops", type=int, required=True, help="Iterations of the production runs")
+    tune.add_argument("--image", default=None, help="Trial input (default: a generated image of that shape)")
+    tune.add_argument("--pattern", choices=PATTERNS, default="noise", help="Generated input content (default: noise)")
+    tune.add_argument("--data-dir", default=str(REPO_ROOT / "data"), help="Directory for generated inputs")
+    tune.add_argument("--trial-loops", type=int, default=TRIAL_LOOPS, help=f"Iterations per trial (default: {TRIAL_LOOPS})")
+    tune.add_argument("--repeats", type=int, default=REPEATS, help=f"Runs per trial, the fastest counts (default: {REPEATS})")
+    tune.add_argument("--keep", type=int, default=KEEP, help=f"Layouts that go on to the tile search (default: {KEEP})")
+    tune.add_argument("extra", nargs="*", help="Extra engine options after --, e.g. -- --bind")
+    tune.set_defaults(func=cmd_tune)
+
+    show = sub.add_parser("show", help="List the tuned cases")
+    common(show)
+    show.set_defaults(func=cmd_show)
+
+    run = sub.add_parser("run", help="Launch an engine with the configuration tuned for the case")
+    common(run)
+    engine_args(run)
+    run.add_argument("--dry-run", action="store_true", help="Only print the command")
+    run.add_argument("image", help="Input image")
+    run.add_argument("width", type=int)
+    run.add_argument("height", type=int)
+    run.add_argument("loops", type=int)
+    run.add_argument("mode", choices=["grey", "rgb"])
+    run.add_argument("extra", nargs="*", help="Extra engine options after --, e.g. -- --bind")
+    run.set_defaults(func=cmd_run)
+
+    args = parser.parse_args()
+    if args.command != "show":
+        if args.cores < 1:
+            parser.error("--cores must be >= 1")
+        if args.width <= 0 or args.height <= 0:
+            parser.error("width and height must be positive integers")
+        if args.loops < 0:
+            parser.error("loops must be >= 0")
+        try:
+            args.exe = resolve_exe(args.exe)
+            args.engine = engine_name(args.exe)
+        except (FileNotFoundError, ValueError) as exc:
+            parser.error(str(exc))
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
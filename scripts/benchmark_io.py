@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Time block I/O separately from compute for mpi_conv / mpi_omp_conv.
+
+The engines print the compute time as the last line of stdout and, on
+stderr, the slowest rank's collective read and write time:
+
+    io: read 0.012345 s, write 0.006789 s
+
+This script runs every (mode, height, p) case, takes the median of each
+phase over the repeats and also records the wall time of the whole mpiexec
+run (which additionally contains process start-up). With --batch the repeats
+of a case share one mpiexec run through the engine's --batch manifest mode,
+which prints one "job <k> <output> <seconds>" line and one io: line per
+image; the wall time is then that of the whole run divided by the repeats.
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+
+WIDTH = 1920
+HEIGHTS = [630, 1260, 2520, 5040]
+PS = [1, 2, 4, 9, 16, 25]
+IMAGE_TYPES = ["grey", "rgb"]
+LOOPS = 20
+REPEATS = 3
+SEED = 123
+
+sys.path.insert(0, str(REPO_ROOT))
+from parconv.bench import write_manifest  # noqa: E402
+from parconv.data import PATTERNS, data_file_name, ensure_data_file  # noqa: E402
+
+IO_RE = re.compile(r"^io: read ([0-9.]+) s, write ([0-9.]+) s$", re.MULTILINE)
+
+
+def parse_phases(stdout: str, stderr: str) -> tuple[float, float, float] | None:
+    """Return (read, compute, write) seconds, or None if the output has no timing."""
+    match = IO_RE.search(stderr)
+    tokens = stdout.strip().split()
+    if match is None or not tokens:
+        return None
+    try:
+        compute = float(tokens[-1])
+    except ValueError:
+        return None
+    return float(match.group(1)), compute, float(match.group(2))
+
+
+def parse_batch_phases(stdout: str, stderr: str) -> list[tuple[float, float, float]]:
+    """(read, compute, write) seconds of every image a --batch run finished, in manifest order."""
+    computes = []
+    for line in stdout.splitlines():
+        tokens = line.split()
+        if len(tokens) >= 3 and tokens[0] == "job":
+            try:
+                computes.append(float(tokens[-1]))
+            except ValueError:
+                break
+    return [(float(m.group(1)), compute, float(m.group(2))) for m, compute in zip(IO_RE.finditer(stderr), computes)]
+
+
+def median_or_none(values: list[float]) -> float | None:
+    # Engines print microsecond resolution; keep the CSV at the same precision
+    return round(statistics.median(values), 6) if values else None
+
+
+def format_seconds(val: float | None) -> str:
+    return "--" if val is None else f"{val:.4f}"
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark MPI block I/O separately from compute")
+    parser.add_argument("--exe", default=str(REPO_ROOT / "mpi" / "mpi_conv"), help="mpi_conv or mpi_omp_conv binary")
+    parser.add_argument("--mpiexec", default="mpiexec", help="mpiexec path")
+    parser.add_argument("--width", type=int, default=WIDTH, help=f"Image width (default: {WIDTH})")
+    parser.add_argument("--heights", type=int, nargs="+", default=HEIGHTS, help="Image heights")
+    parser.add_argument("--np", type=int, nargs="+", default=PS, dest="ps", help="Process counts")
+    parser.add_argument("--modes", nargs="+", choices=IMAGE_TYPES, default=IMAGE_TYPES, help="Image modes")
+    parser.add_argument("--loops", type=int, default=LOOPS, help=f"Iterations per run (default: {LOOPS})")
+    parser.add_argument("--repeats", type=int, default=REPEATS, help=f"Repeats per case (default: {REPEATS})")
+    parser.add_argument("--pattern", choices=PATTERNS, default="noise", help="Input image content (default: noise)")
+    parser.add_argument("--data-dir", default=str(REPO_ROOT / "data"), help="Directory for generated inputs")
+    parser.add_argument("--csv", default="io_times.csv", help="Output CSV (default: io_times.csv)")
+    parser.add_argument("--batch", action="store_true", help="Run the repeats of each case in one --batch launch")
+    parser.add_argument("extra", nargs="*", help="Extra engine options after --, e.g. -- --halo 4")
+    args = parser.parse_args()
+
+    exe = Path(args.exe)
+    if not exe.is_file() and Path(str(exe) + ".exe").is_file():
+        exe = Path(str(exe) + ".exe")
+    if not exe.is_file():
+        print(f"Executable not found: {args.exe}", file=sys.stderr)
+        return 1
+    mpiexec = shutil.which(args.mpiexec) or args.mpiexec
+    data_dir = Path(args.data_dir)
+
+    rows = []
+    for image_type in args.modes:
+        for height in args.heights:
+            data_path = data_dir / data_file_name(args.width, height, image_type, args.pattern)
+            ensure_data_file(data_path, args.width, height, image_type, args.pattern, SEED)
+
+            for p in args.ps:
+                phases: list[tuple[float, float, float]] = []
+                walls: list[float] = []
+                if args.batch:
+                    manifest = data_dir / "benchmark_io_batch.txt"
+                    write_manifest(manifest, [(data_path.name, f"blur_{data_path.name}", args.width, height, args.loops, image_type)] * args.repeats)
+                    cmd = [mpiexec, "-n", str(p), str(exe.resolve()), "--batch", manifest.name] + args.extra
+                    start = time.perf_counter()
+                    proc = subprocess.run(cmd, cwd=str(data_dir), capture_output=True, text=True)
+                    wall = time.perf_counter() - start
+                    phases = parse_batch_phases(proc.stdout, proc.stderr)
+                    if proc.returncode != 0 or len(phases) != args.repeats:
+                        print(f"[fail] {' '.join(cmd)}\n{proc.stderr.strip()}", file=sys.stderr)
+                    if phases:
+                        walls.append(wall / args.repeats)
+                cmd = [mpiexec, "-n", str(p), str(exe.resolve()), data_path.name, str(args.width), str(height),
+                       str(args.loops), image_type] + args.extra
+                for _ in range(0 if args.batch else args.repeats):
+                    start = time.perf_counter()
+                    proc = subprocess.run(cmd, cwd=str(data_dir), capture_output=True, text=True)
+                    wall = time.perf_counter() - start
+                    parsed = parse_phases(proc.stdout, proc.stderr) if proc.returncode == 0 else None
+                    if parsed is None:
+                        print(f"[fail] {' '.join(cmd)}\n{proc.stderr.strip()}", file=sys.stderr)
+                        continue
+                    phases.append(parsed)
+                    walls.append(wall)
+
+                read_s = median_or_none([ph[0] for ph in phases])
+                compute_s = median_or_none([ph[1] for ph in phases])
+                write_s = median_or_none([ph[2] for ph in phases])
+                wall_s = median_or_none(walls)
+                rows.append((image_type, args.width, height, p, read_s, compute_s, write_s, wall_s))
+                io_share = None
+                if read_s is not None and compute_s is not None and write_s is not None:
+                    total = read_s + compute_s + write_s
+                    io_share = (read_s + write_s) / total if total > 0 else None
+                print(
+                    f"{image_type:4} {args.width}x{height:<5} p={p:<3} read {format_seconds(read_s)} "
+                    f"compute {format_seconds(compute_s)} write {format_seconds(write_s)} "
+                    f"wall {format_seconds(wall_s)}"
+                    + ("" if io_share is None else f"  io {io_share:.0%}")
+                )
+
+    with open(args.csv, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["image_type", "width", "height", "p", "read_seconds", "compute_seconds", "write_seconds", "wall_seconds"])
+        writer.writerows(rows)
+    print(f"[info] wrote {args.csv}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
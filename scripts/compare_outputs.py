@@ -1,19 +1,59 @@
 #!/usr/bin/env python3
 """
-Run seq, mpi, and mpi_omp convolution and compare output files byte-by-byte.
+Run seq, mpi, and mpi_omp convolution and compare the outputs against seq.
+
+Outputs are compared with parconv.compare (memory-mapped, chunked): the report
+gives the number of differing pixels, max/mean absolute error, PSNR and a
+per-channel error histogram. --tolerance N accepts outputs whose largest
+per-byte error is at most N (e.g. 1 for float-rounding variants).
 """
 
 from __future__ import annotations
 
 import argparse
+import csv
 import hashlib
+import json
 import os
 import shutil
 import subprocess
 import sys
 import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT))
+
+try:
+    from parconv.bench import parse_runtime
+    from parconv.cache import ReferenceCache, seq_conv_advance
+    from parconv.compare import compare_raw
+    from parconv.rawio import PNM_SUFFIX, read_pnm_header
+except ImportError as exc:
+    raise SystemExit("compare_outputs.py requires NumPy. Install it with: pip install numpy") from exc
+
+REPORT_FIELDS = [
+    "engine",
+    "mode",
+    "width",
+    "height",
+    "loops",
+    "np",
+    "omp_threads",
+    "args",
+    "status",
+    "diff_pixels",
+    "max_abs",
+    "mean_abs",
+    "psnr",
+    "runtime_seconds",
+    "wall_seconds",
+    "reference_wall_seconds",
+    "detail",
+]
+
 
 def resolve_input_path(raw: str, repo_root: Path) -> Path:
     candidate = Path(raw).expanduser()
@@ -75,26 +115,14 @@ def sha256_file(path: Path) -> str:
     return digest.hexdigest()
 
 
-def compare_files(lhs: Path, rhs: Path) -> tuple[bool, str]:
-    lhs_size = lhs.stat().st_size
-    rhs_size = rhs.stat().st_size
-    if lhs_size != rhs_size:
-        return False, f"size mismatch ({lhs_size} vs {rhs_size} bytes)"
-
-    offset = 0
-    with lhs.open("rb") as f1, rhs.open("rb") as f2:
-        while True:
-            b1 = f1.read(1024 * 1024)
-            b2 = f2.read(1024 * 1024)
-            if not b1 and not b2:
-                return True, "identical"
-            if b1 != b2:
-                limit = min(len(b1), len(b2))
-                for i in range(limit):
-                    if b1[i] != b2[i]:
-                        return False, f"first mismatch at byte {offset + i}: {b1[i]} != {b2[i]}"
-                return False, f"mismatch near byte {offset + limit}"
-            offset += len(b1)
+def link_or_copy(src: Path, dst: Path) -> None:
+    """Hard-link src to dst, copying only when the filesystem cannot link."""
+    if dst.exists():
+        dst.unlink()
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
 
 
 def run_and_collect(
@@ -103,10 +131,13 @@ def run_and_collect(
     cwd: Path,
     out_file: Path,
     expected_size: int,
-    snapshot_path: Path,
     env: dict[str, str] | None = None,
-) -> tuple[str, int]:
+) -> tuple[str, int, float | None]:
+    """Run one engine writing out_file (its --output); return the file's sha256, size and the runtime the engine printed."""
     print(f"[run] {name}: {' '.join(cmd)}")
+    # Concurrent mpiexec launches race on a shared session directory under
+    # TMPDIR (Open MPI: "orte_session_dir failed"); give each run its own.
+    env = dict(os.environ if env is None else env, TMPDIR=str(cwd))
     result = subprocess.run(cmd, cwd=str(cwd), env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
     if result.returncode != 0:
         print(result.stdout.rstrip())
@@ -122,25 +153,304 @@ def run_and_collect(
             f"{name} output size mismatch: {output_size} bytes (expected {expected_size})"
         )
 
-    shutil.copy2(out_file, snapshot_path)
-    return sha256_file(snapshot_path), output_size
+    return sha256_file(out_file), output_size, parse_runtime(result.stdout)
+
+
+def reference_collect(
+    input_path: Path,
+    width: int,
+    height: int,
+    loops: int,
+    mode: str,
+    snapshot_path: Path,
+    header: int = 0,
+) -> tuple[str, int, float | None]:
+    try:
+        from parconv import convolute_raw
+    except ImportError as exc:
+        raise RuntimeError("--reference numpy requires NumPy. Install it with: pip install numpy") from exc
+    print(f"[run] seq: NumPy reference engine ({loops} loops, {mode})")
+    start = time.perf_counter()
+    snapshot_path.write_bytes(convolute_raw(input_path.read_bytes()[header:], width, height, loops, mode))
+    return sha256_file(snapshot_path), snapshot_path.stat().st_size, time.perf_counter() - start
+
+
+def cached_reference_collect(
+    cache: ReferenceCache,
+    seq_exe: Path | None,
+    input_path: Path,
+    width: int,
+    height: int,
+    loops: int,
+    mode: str,
+    snapshot_path: Path,
+    header: int = 0,
+) -> tuple[str, int, float | None]:
+    """Reference from the cache; misses are filled by seq_conv (or NumPy without seq_exe)."""
+    advance = seq_conv_advance(seq_exe, width, height, mode) if seq_exe is not None else None
+    print(f"[run] seq: reference cache {cache.root} ({loops} loops, {mode})")
+    start = time.perf_counter()
+    cache.blur_file(input_path, snapshot_path, width, height, mode, loops, advance=advance, header=header)
+    return sha256_file(snapshot_path), snapshot_path.stat().st_size, time.perf_counter() - start
+
+
+def parse_size(raw: str) -> tuple[int, int]:
+    try:
+        width, height = (int(v) for v in str(raw).lower().split("x"))
+    except ValueError:
+        raise ValueError(f"size must look like WIDTHxHEIGHT: {raw}") from None
+    if width <= 0 or height <= 0:
+        raise ValueError(f"size must be positive: {raw}")
+    return width, height
+
+
+def load_matrix_spec(path: Path, args: argparse.Namespace) -> dict:
+    """
+    Read a JSON grid spec. Keys not given fall back to the command-line values:
+
+        {"sizes": ["64x40", "1920x2520"], "modes": ["grey", "rgb"], "loops": [1, 20],
+         "np": [1, 2, 4, 9], "omp_threads": [4], "pattern": "noise",
+         "mpi_args": [[], ["--halo", "2"]], "mpi_omp_args": [[]]}
+    """
+    raw = json.loads(path.read_text(encoding="utf-8"))
+
+    def unique(values) -> list:
+        # A repeated value would run (and name) the same grid point twice
+        return list(dict.fromkeys(values))
+
+    spec = {
+        "sizes": unique(parse_size(v) for v in raw.get("sizes", [])),
+        "modes": unique(raw.get("modes", [args.mode])),
+        "loops": unique(int(v) for v in raw.get("loops", [args.loops])),
+        "np": unique(int(v) for v in raw.get("np", [args.np])),
+        "omp_threads": unique(int(v) for v in raw.get("omp_threads", [args.omp_threads])),
+        "pattern": raw.get("pattern", "noise"),
+        "mpi_args": [list(a) for a in unique(tuple(map(str, a)) for a in raw.get("mpi_args", [[]]))],
+        "mpi_omp_args": [list(a) for a in unique(tuple(map(str, a)) for a in raw.get("mpi_omp_args", [[]]))],
+    }
+    if not spec["sizes"]:
+        raise ValueError("matrix spec needs at least one entry in \"sizes\"")
+    for mode in spec["modes"]:
+        if mode not in ("grey", "rgb"):
+            raise ValueError(f"unknown mode in matrix spec: {mode}")
+    if any(v < 0 for v in spec["loops"]) or any(v <= 0 for v in spec["np"] + spec["omp_threads"]):
+        raise ValueError("matrix spec needs loops >= 0 and np, omp_threads >= 1")
+    return spec
+
+
+def write_report(rows: list[dict], paths: list[str]) -> None:
+    for raw in paths:
+        path = Path(raw)
+        if path.suffix.lower() == ".json":
+            path.write_text(json.dumps(rows, indent=1), encoding="utf-8")
+        else:
+            with path.open("w", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=REPORT_FIELDS)
+                writer.writeheader()
+                writer.writerows(rows)
+        print(f"[info] wrote {path}")
+
+
+def run_matrix(
+    args: argparse.Namespace,
+    spec: dict,
+    seq_exe: Path | None,
+    mpi_exe: Path,
+    mpi_omp_exe: Path,
+    mpiexec: str,
+    temp_dir: Path,
+    cache: ReferenceCache | None = None,
+) -> list[dict]:
+    """
+    Verify every grid point; the reference is produced once per (size, mode,
+    loops) and shared by all parallel configurations of that case.
+    """
+    from parconv.data import data_file_name, ensure_data_file
+
+    data_dir = Path(args.data_dir).expanduser()
+    rows: list[dict] = []
+    for width, height in spec["sizes"]:
+        for mode in spec["modes"]:
+            input_path = data_dir / data_file_name(width, height, mode, spec["pattern"])
+            ensure_data_file(input_path, width, height, mode, spec["pattern"])
+            expected_size = input_path.stat().st_size
+
+            for loops in spec["loops"]:
+                case = f"{mode}_{width}x{height}_l{loops}"
+                engine_args = [str(input_path.resolve()), str(width), str(height), str(loops), mode]
+                ref_dir = temp_dir / case / "seq"
+                ref_dir.mkdir(parents=True)
+                ref_path = temp_dir / case / "blur_seq.raw"
+                ref_error = ""
+                start = time.perf_counter()
+                try:
+                    if cache is not None:
+                        cached_reference_collect(cache, seq_exe, input_path, width, height, loops, mode, ref_path)
+                    elif seq_exe is None:
+                        reference_collect(input_path, width, height, loops, mode, ref_path)
+                    else:
+                        run_and_collect(
+                            "seq",
+                            [str(seq_exe)] + engine_args + ["--output", str(ref_path)],
+                            ref_dir,
+                            ref_path,
+                            expected_size,
+                        )
+                except RuntimeError as exc:
+                    ref_path = None
+                    ref_error = str(exc)
+                ref_wall = round(time.perf_counter() - start, 6)
+
+                configs = []
+                for np_count in spec["np"]:
+                    for extra in spec["mpi_args"]:
+                        configs.append(("mpi", mpi_exe, np_count, None, extra))
+                    for threads in spec["omp_threads"]:
+                        for extra in spec["mpi_omp_args"]:
+                            configs.append(("mpi_omp", mpi_omp_exe, np_count, threads, extra))
+
+                def verify(index: int, config: tuple) -> dict:
+                    engine, exe, np_count, threads, extra = config
+                    row = {
+                        "engine": engine,
+                        "mode": mode,
+                        "width": width,
+                        "height": height,
+                        "loops": loops,
+                        "np": np_count,
+                        "omp_threads": threads,
+                        "args": " ".join(extra),
+                        "reference_wall_seconds": ref_wall,
+                    }
+                    if ref_path is None:
+                        row.update(status="error", detail=f"reference failed: {ref_error}")
+                        return row
+                    work = temp_dir / case / f"{index}_{engine}"
+                    work.mkdir()
+                    # mpi_omp_conv sets its own thread count; OMP_NUM_THREADS does not reach it
+                    thread_args = ["--threads", str(threads)] if threads is not None else []
+                    snapshot = work / f"blur_{engine}.raw"
+                    start = time.perf_counter()
+                    try:
+                        _, _, runtime = run_and_collect(
+                            f"{engine} {case} np={np_count}",
+                            [mpiexec, "-n", str(np_count), str(exe)] + engine_args + thread_args + extra
+                            + ["--output", str(snapshot)],
+                            work,
+                            snapshot,
+                            expected_size,
+                        )
+                    except RuntimeError as exc:
+                        row.update(status="error", detail=str(exc))
+                        return row
+                    finally:
+                        row["wall_seconds"] = round(time.perf_counter() - start, 6)
+                    stats = compare_raw(ref_path, snapshot, width, height, mode)
+                    if stats.identical:
+                        status = "identical"
+                    elif stats.within(args.tolerance):
+                        status = "within_tolerance"
+                    else:
+                        status = "mismatch"
+                    row.update(
+                        status=status,
+                        diff_pixels=stats.diff_pixels,
+                        max_abs=stats.max_abs,
+                        mean_abs=round(stats.mean_abs, 6),
+                        psnr=None if stats.identical else round(stats.psnr, 3),
+                        runtime_seconds=runtime,
+                        detail=stats.summary(),
+                    )
+                    if not args.keep_temp:
+                        shutil.rmtree(work, ignore_errors=True)
+                    return row
+
+                with ThreadPoolExecutor(max_workers=args.jobs) as pool:
+                    case_rows = list(pool.map(verify, range(len(configs)), configs))
+                for row in case_rows:
+                    threads = "" if row["omp_threads"] is None else f" threads={row['omp_threads']}"
+                    print(f"[{row['status']}] {row['engine']} {case} np={row['np']}{threads} {row['args']}".rstrip()
+                          + f": {row['detail']}")
+                rows.extend(case_rows)
+                if not args.keep_temp:
+                    shutil.rmtree(temp_dir / case, ignore_errors=True)
+    return rows
 
 
 def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(
-        description="Run seq/mpi/mpi_omp and compare blur outputs byte-by-byte."
+        description="Run seq/mpi/mpi_omp and compare blur outputs against seq."
+    )
+    parser.add_argument(
+        "--input",
+        help="Path to input raw image, or a .pgm/.ppm whose header gives width, height and mode (required unless --matrix)",
     )
-    parser.add_argument("--input", required=True, help="Path to input raw image")
-    parser.add_argument("--width", type=int, required=True, help="Image width")
-    parser.add_argument("--height", type=int, required=True, help="Image height")
+    parser.add_argument("--width", type=int, help="Image width (required unless --matrix or a PGM/PPM --input)")
+    parser.add_argument("--height", type=int, help="Image height (required unless --matrix or a PGM/PPM --input)")
     parser.add_argument("--loops", type=int, default=20, help="Convolution loop count (default: 20)")
     parser.add_argument("--mode", choices=["grey", "rgb"], default="grey", help="Image mode (default: grey)")
     parser.add_argument("--np", type=int, default=4, help="MPI process count (default: 4)")
-    parser.add_argument("--omp-threads", type=int, default=4, help="OMP_NUM_THREADS for mpi_omp (default: 4)")
+    parser.add_argument("--omp-threads", type=int, default=4, help="Threads per rank for mpi_omp (--threads N, default: 4)")
     parser.add_argument("--mpiexec", default="mpiexec", help="mpiexec command/path (default: mpiexec)")
+    parser.add_argument(
+        "--reference",
+        choices=["seq", "numpy"],
+        default="seq",
+        help="Produce the sequential reference with seq_conv or in-process with NumPy (default: seq)",
+    )
     parser.add_argument("--seq-exe", default="seq/seq_conv", help="Path to seq executable")
     parser.add_argument("--mpi-exe", default="mpi/mpi_conv", help="Path to mpi executable")
     parser.add_argument("--mpi-omp-exe", default="mpi_omp/mpi_omp_conv", help="Path to mpi_omp executable")
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=3,
+        help="How many engines may run at the same time (default: 3, all of them)",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=int,
+        default=0,
+        help="Largest per-byte absolute error still counted as a pass (default: 0, bit-exact)",
+    )
+    parser.add_argument(
+        "--diff-map",
+        default=None,
+        help="Optional directory to write diff_seq_vs_<engine>.pgm heatmaps for differing outputs",
+    )
+    parser.add_argument(
+        "--cache",
+        nargs="?",
+        const="",
+        default=None,
+        metavar="DIR",
+        help="Take the seq reference from the content-addressed reference cache, filling misses "
+        "(default DIR: $PARCONV_CACHE_DIR or ~/.cache/parconv)",
+    )
+    parser.add_argument(
+        "--cache-max-mb",
+        type=int,
+        default=2048,
+        help="Reference cache size limit; least recently used entries are evicted (default: 2048)",
+    )
+    parser.add_argument(
+        "--matrix",
+        default=None,
+        metavar="SPEC",
+        help="JSON grid spec; verify every (size, mode, loops, np, omp-threads, args) point instead of one run",
+    )
+    parser.add_argument(
+        "--report",
+        nargs="+",
+        default=[],
+        metavar="PATH",
+        help="Matrix report files; .json writes JSON, anything else CSV",
+    )
+    parser.add_argument(
+        "--data-dir",
+        default=str(REPO_ROOT / "data"),
+        help="Where matrix inputs are generated or reused (default: data/)",
+    )
     parser.add_argument(
         "--save-outdir",
         default=None,
@@ -158,7 +468,11 @@ def main() -> int:
     args = parse_args()
     repo_root = Path(__file__).resolve().parents[1]
 
-    if args.width <= 0 or args.height <= 0:
+    pnm_input = args.input is not None and Path(args.input).suffix.lower() in PNM_SUFFIX.values()
+    if args.matrix is None and (args.input is None or not pnm_input and (args.width is None or args.height is None)):
+        print("--input, --width and --height are required without --matrix", file=sys.stderr)
+        return 1
+    if args.matrix is None and not pnm_input and (args.width <= 0 or args.height <= 0):
         print("width and height must be positive integers", file=sys.stderr)
         return 1
     if args.loops < 0:
@@ -170,10 +484,16 @@ def main() -> int:
     if args.omp_threads <= 0:
         print("omp-threads must be >= 1", file=sys.stderr)
         return 1
+    if args.jobs <= 0:
+        print("jobs must be >= 1", file=sys.stderr)
+        return 1
+    if not 0 <= args.tolerance <= 255:
+        print("tolerance must be in [0, 255]", file=sys.stderr)
+        return 1
 
     try:
-        input_path = resolve_input_path(args.input, repo_root)
-        seq_exe = resolve_local_exe(args.seq_exe, repo_root)
+        input_path = resolve_input_path(args.input, repo_root) if args.matrix is None else None
+        seq_exe = resolve_local_exe(args.seq_exe, repo_root) if args.reference == "seq" else None
         mpi_exe = resolve_local_exe(args.mpi_exe, repo_root)
         mpi_omp_exe = resolve_local_exe(args.mpi_omp_exe, repo_root)
         mpiexec = resolve_mpiexec(args.mpiexec, repo_root)
@@ -181,9 +501,39 @@ def main() -> int:
         print(str(exc), file=sys.stderr)
         return 1
 
+    cache = None
+    if args.cache is not None:
+        cache = ReferenceCache(args.cache or None, max_bytes=args.cache_max_mb << 20)
+
+    if args.matrix is not None:
+        try:
+            spec = load_matrix_spec(Path(args.matrix), args)
+        except (OSError, ValueError) as exc:
+            print(f"Bad matrix spec: {exc}", file=sys.stderr)
+            return 1
+        temp_dir = Path(tempfile.mkdtemp(prefix="compare_outputs_"))
+        print(f"[info] temp dir: {temp_dir}")
+        try:
+            rows = run_matrix(args, spec, seq_exe, mpi_exe, mpi_omp_exe, mpiexec, temp_dir, cache)
+        finally:
+            if not args.keep_temp:
+                shutil.rmtree(temp_dir, ignore_errors=True)
+        write_report(rows, args.report)
+        failed = [row for row in rows if row["status"] not in ("identical", "within_tolerance")]
+        print(f"[{'fail' if failed else 'pass'}] {len(rows) - len(failed)} of {len(rows)} configurations passed")
+        return 2 if failed else 0
+
+    # The engines read a PGM/PPM in place, geometry and mode come from its header
+    header = 0
+    if pnm_input:
+        try:
+            args.width, args.height, args.mode, header = read_pnm_header(input_path)
+        except ValueError as exc:
+            print(str(exc), file=sys.stderr)
+            return 1
     bytes_per_pixel = 1 if args.mode == "grey" else 3
     expected_size = args.width * args.height * bytes_per_pixel
-    input_size = input_path.stat().st_size
+    input_size = input_path.stat().st_size - header
     if input_size != expected_size:
         print(
             f"Input size mismatch: {input_size} bytes (expected {expected_size})",
@@ -197,6 +547,12 @@ def main() -> int:
         if not save_dir.is_absolute():
             save_dir = Path.cwd() / save_dir
         save_dir.mkdir(parents=True, exist_ok=True)
+    diff_dir = None
+    if args.diff_map:
+        diff_dir = Path(args.diff_map).expanduser()
+        if not diff_dir.is_absolute():
+            diff_dir = Path.cwd() / diff_dir
+        diff_dir.mkdir(parents=True, exist_ok=True)
 
     temp_dir = Path(tempfile.mkdtemp(prefix="compare_outputs_"))
     print(f"[info] temp dir: {temp_dir}")
@@ -205,80 +561,63 @@ def main() -> int:
 
     statuses: dict[str, tuple[str, int]] = {}
     try:
-        temp_input = temp_dir / input_path.name
-        shutil.copy2(input_path, temp_input)
-        blur_name = f"blur_{temp_input.name}"
-        blur_path = temp_dir / blur_name
-
-        snapshots = {
-            "seq": temp_dir / "blur_seq.raw",
-            "mpi": temp_dir / "blur_mpi.raw",
-            "mpi_omp": temp_dir / "blur_mpi_omp.raw",
-        }
-
-        if blur_path.exists():
-            blur_path.unlink()
-        statuses["seq"] = run_and_collect(
-            "seq",
-            [
-                str(seq_exe),
-                temp_input.name,
-                str(args.width),
-                str(args.height),
-                str(args.loops),
-                args.mode,
-            ],
-            temp_dir,
-            blur_path,
-            expected_size,
-            snapshots["seq"],
-        )
-
-        if blur_path.exists():
-            blur_path.unlink()
-        statuses["mpi"] = run_and_collect(
+        # One working directory per engine so they can run at the same time; all
+        # of them read the input in place and write straight to their snapshot.
+        snapshots = {name: temp_dir / f"blur_{name}.raw" for name in ("seq", "mpi", "mpi_omp")}
+        work_dirs = {}
+        for name in snapshots:
+            work_dirs[name] = temp_dir / name
+            work_dirs[name].mkdir()
+        if pnm_input:
+            engine_args = [str(input_path.resolve()), str(args.loops)]
+        else:
+            engine_args = [str(input_path.resolve()), str(args.width), str(args.height), str(args.loops), args.mode]
+        output_args = {name: ["--output", str(path)] for name, path in snapshots.items()}
+
+        tasks = {}
+        if cache is not None:
+            tasks["seq"] = lambda: cached_reference_collect(
+                cache, seq_exe, input_path, args.width, args.height, args.loops, args.mode, snapshots["seq"], header
+            )
+        elif seq_exe is None:
+            tasks["seq"] = lambda: reference_collect(
+                input_path, args.width, args.height, args.loops, args.mode, snapshots["seq"], header
+            )
+        else:
+            tasks["seq"] = lambda: run_and_collect(
+                "seq",
+                [str(seq_exe)] + engine_args + output_args["seq"],
+                work_dirs["seq"],
+                snapshots["seq"],
+                expected_size,
+            )
+        tasks["mpi"] = lambda: run_and_collect(
             "mpi",
-            [
-                mpiexec,
-                "-n",
-                str(args.np),
-                str(mpi_exe),
-                temp_input.name,
-                str(args.width),
-                str(args.height),
-                str(args.loops),
-                args.mode,
-            ],
-            temp_dir,
-            blur_path,
-            expected_size,
+            [mpiexec, "-n", str(args.np), str(mpi_exe)] + engine_args + output_args["mpi"],
+            work_dirs["mpi"],
             snapshots["mpi"],
+            expected_size,
         )
-
-        env = os.environ.copy()
-        env["OMP_NUM_THREADS"] = str(args.omp_threads)
-        if blur_path.exists():
-            blur_path.unlink()
-        statuses["mpi_omp"] = run_and_collect(
+        tasks["mpi_omp"] = lambda: run_and_collect(
             "mpi_omp",
-            [
-                mpiexec,
-                "-n",
-                str(args.np),
-                str(mpi_omp_exe),
-                temp_input.name,
-                str(args.width),
-                str(args.height),
-                str(args.loops),
-                args.mode,
-            ],
-            temp_dir,
-            blur_path,
-            expected_size,
+            [mpiexec, "-n", str(args.np), str(mpi_omp_exe)] + engine_args + ["--threads", str(args.omp_threads)]
+            + output_args["mpi_omp"],
+            work_dirs["mpi_omp"],
             snapshots["mpi_omp"],
-            env=env,
+            expected_size,
         )
 
+        with ThreadPoolExecutor(max_workers=args.jobs) as pool:
+            futures = {name: pool.submit(task) for name, task in tasks.items()}
+        failures = []
+        for name, future in futures.items():
+            try:
+                statuses[name] = future.result()
+            except RuntimeError as exc:
+                failures.append(str(exc))
+        if failures:
+            raise RuntimeError("\n".join(failures))
+
         print("")
         print("Output hashes:")
         print(f"  seq     : {statuses['seq'][0]} ({statuses['seq'][1]} bytes)")
@@ -286,23 +625,37 @@ def main() -> int:
         print(f"  mpi_omp : {statuses['mpi_omp'][0]} ({statuses['mpi_omp'][1]} bytes)")
 
         ok_all = True
+        exact_all = True
         for name in ("mpi", "mpi_omp"):
-            same, detail = compare_files(snapshots["seq"], snapshots[name])
-            if same:
+            heatmap = None
+            if diff_dir is not None and statuses[name][0] != statuses["seq"][0]:
+                heatmap = diff_dir / f"diff_seq_vs_{name}.pgm"
+            stats = compare_raw(snapshots["seq"], snapshots[name], args.width, args.height, args.mode, heatmap)
+            if stats.identical:
                 print(f"[match] seq vs {name}: identical")
+                continue
+            exact_all = False
+            if stats.within(args.tolerance):
+                print(f"[within tolerance] seq vs {name}: {stats.summary()}")
             else:
-                print(f"[mismatch] seq vs {name}: {detail}")
+                print(f"[mismatch] seq vs {name}: {stats.summary()}")
                 ok_all = False
+            for line in stats.histogram_lines():
+                print(f"    |diff| {line}")
+            if heatmap is not None:
+                print(f"    diff map: {heatmap}")
 
         if save_dir is not None:
             for name, path in snapshots.items():
-                target = save_dir / f"blur_{name}.raw"
-                shutil.copy2(path, target)
+                link_or_copy(path, save_dir / f"blur_{name}.raw")
             print(f"[info] saved snapshots to: {save_dir}")
 
-        if ok_all:
+        if ok_all and exact_all:
             print("[pass] All outputs are identical")
             return 0
+        if ok_all:
+            print(f"[pass] All outputs are within tolerance {args.tolerance}")
+            return 0
         print("[fail] Outputs are different")
         return 2
 
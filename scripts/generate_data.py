@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Generate headerless raw benchmark inputs with parconv.data.
+
+With the defaults (pattern noise, stream v1, seed 123) the bytes are the same
+as the data/ files the benchmark scripts have always used.
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT))
+
+from parconv.data import PATTERNS, SEED, STREAMS, data_file_name, ensure_data_file  # noqa: E402
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Generate raw GREY/RGB benchmark inputs")
+    parser.add_argument("width", type=int)
+    parser.add_argument("height", type=int)
+    parser.add_argument("mode", choices=["grey", "rgb"])
+    parser.add_argument("--pattern", choices=PATTERNS, default="noise", help="Image content (default: noise)")
+    parser.add_argument("--stream", choices=STREAMS, default="v1", help="Random stream version (default: v1)")
+    parser.add_argument("--seed", type=int, default=SEED, help=f"Random seed (default: {SEED})")
+    parser.add_argument("-o", "--output", default=None, help="Output path (default: data/<standard name>)")
+    args = parser.parse_args()
+
+    if args.width <= 0 or args.height <= 0:
+        print("width and height must be positive", file=sys.stderr)
+        return 1
+    out = Path(args.output) if args.output else (
+        REPO_ROOT / "data" / data_file_name(args.width, args.height, args.mode, args.pattern, args.stream)
+    )
+    sha = ensure_data_file(out, args.width, args.height, args.mode, args.pattern, args.seed, args.stream)
+    print(f"{out} sha256={sha}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,24 +1,115 @@
 ﻿#include <stdio.h>
 #include <stdlib.h>
 #include <string.h>
+#include <ctype.h>
+#include <limits.h>
 #include <stdint.h>
 #include <time.h>
+#if defined(__GNUC__) && (defined(__x86_64__) || defined(__i386__))
+#include <immintrin.h>
+/* SSE4.1/AVX2/AVX-512 float kernels, each compiled for its own ISA and picked at run time */
+#define HAVE_X86_SIMD 1
+#if defined(__clang__)
+#define SIMD_KERNEL(isa) __attribute__((target(isa)))
+#else
+#define SIMD_KERNEL(isa) __attribute__((target(isa), optimize("fp-contract=off")))
+#endif
+#endif
+
+#define MIN(a, b) ((a) < (b) ? (a) : (b))
+#define MAX(a, b) ((a) > (b) ? (a) : (b))
+/* Working set budget for one temporal-blocking band (both scratch buffers) */
+#define TBLOCK_CACHE_BYTES (512 * 1024)
+/* L1 budget for one --tile strip: three input rows and the output row */
+#define TILE_CACHE_BYTES (32 * 1024)
+/* Sweeps per candidate of --tile auto; the fastest one counts */
+#define TILE_TRIALS 3
 
 typedef enum {RGB, GREY} color_t;
+typedef enum {GAUSSIAN, BOX, EDGE} kernel_t;
+/* Float path kernels, narrowest first; ISA_AUTO only appears in options_t */
+typedef enum {ISA_SCALAR, ISA_SSE4, ISA_AVX2, ISA_AVX512, ISA_AUTO} isa_t;
+
+/* Command line options following the positional arguments */
+typedef struct {
+	kernel_t kernel;	/* --kernel gaussian|box|edge */
+	int fixed;		/* --fixed: integer (sum >> 4) Gaussian path */
+	int separable;	/* --separable: two 1-D passes when the kernel is rank-1 */
+	isa_t isa;		/* --isa scalar|sse4|avx2|avx512|auto: float path kernels, auto picks the widest the CPU runs */
+	int planar;		/* --planar: rgb as three grey planes from load to output */
+	int compare;	/* --compare: run the float 2-D path and the selected path, report the difference */
+	int tblock;		/* --tblock T: iterations applied to a band before moving on */
+	int tblock_rows;	/* --tblock-rows B: band height, 0 sizes it to TBLOCK_CACHE_BYTES */
+	int tile_rows, tile_cols;	/* --tile RxC: convolute() sweeps R x C pixel tiles, 0 spans the whole range */
+	int tile_auto;	/* --tile auto: time candidate tiles on the first image of each geometry */
+	int checkpoint;	/* --checkpoint N: also write ckpt_<t>_<image> after every N-th iteration t */
+	int resume;		/* --resume FILE T: argv index of FILE, an intermediate image after T iterations */
+	int start;		/* T of --resume: the iteration count the run starts from */
+	int output;		/* --output PATH: argv index of PATH, written instead of blur_<image> */
+	int batch;		/* --batch MANIFEST: argv index of MANIFEST, one job per line */
+} options_t;
+
+/* One image to blur; names are offsets into a shared string table */
+typedef struct {
+	int input;		/* file read: the image, or the --resume intermediate */
+	int image;		/* image the checkpoints are named after */
+	int output;		/* file written */
+	int width, height, loops;
+	color_t imageType;
+} job_t;
+
+/* Filter handed to convolute() */
+typedef struct {
+	float **h;		/* float taps used by the reference path */
+	int fixed;		/* use the integer 1-2-1 path instead of h */
+	int separable;	/* use the row_taps/col_taps passes instead of h */
+	isa_t isa;		/* kernels of the float path; ISA_SCALAR is the per-pixel reference */
+	int tile_rows, tile_cols;	/* 2-D cache blocking of the sweep, 0 = none in that direction */
+	unsigned row_taps[3];	/* horizontal pass weights */
+	unsigned col_taps[3];	/* vertical pass weights */
+	int shift;		/* log2 of the separable divisor, -1 if not a power of two */
+	uint64_t recip;	/* ceil(2^32 / divisor): floor(sum / divisor) == (sum * recip) >> 32 */
+} filter_t;
 
-void convolute(uint8_t *, uint8_t *, int, int, int, int, int, int, float**, color_t);
+void convolute(uint8_t *, uint8_t *, int, int, int, int, int, int, const filter_t *, color_t);
 static inline void convolute_grey(uint8_t *, uint8_t *, int, int, int, int, float **);
 static inline void convolute_rgb(uint8_t *, uint8_t *, int, int, int, int, float **);
-void Usage(int, char **, char **, int *, int *, int *, color_t *);
+void convolute_float_row(const uint8_t *, const uint8_t *, const uint8_t *, uint8_t *, int, int, int, float **, isa_t);
+static inline void convolute_float_tail(const uint8_t *, const uint8_t *, const uint8_t *, uint8_t *, int, int, int, float **);
+isa_t detect_isa(void);
+const char *isa_name(isa_t);
+double tune_tile(uint8_t *, uint8_t *, int, int, int, int, int, int, filter_t *, color_t);
+static inline void convolute_fixed_row(const uint8_t *restrict, const uint8_t *restrict, const uint8_t *restrict, uint8_t *restrict, int, int, int);
+void convolute_separable(uint8_t *, uint8_t *, int, int, int, int, int, const filter_t *, color_t);
+static inline void separable_row(const uint8_t *restrict, unsigned *restrict, int, int, const unsigned *);
+int split_separable(int [3][3], int, filter_t *);
+void convolute_tblock(uint8_t *, uint8_t *, uint8_t **, int, int, int, int, const int [4], int, int, int, const filter_t *, color_t);
+void Usage(int, char **, job_t **, int *, char **, int *, options_t *);
+int add_job(job_t **, int *, char **, int *, const char *, const char *, const char *, int, int, int, color_t);
+void read_manifest(const char *, const char *, job_t **, int *, char **, int *);
+int same_geometry(const job_t *, const job_t *);
 uint8_t *offset(uint8_t *, int, int, int);
+void split_planes(const uint8_t *, size_t, uint8_t *, size_t, size_t, int, int);
+void merge_planes(const uint8_t *, size_t, size_t, uint8_t *, size_t, int, int);
+int is_pnm(const char *);
+const char *base_name(const char *);
+long read_pnm_header(const char *, int *, int *, color_t *);
+int read_image(const char *, uint8_t *, int, int, int, color_t);
+int write_image(const char *, int, uint8_t *, int, int, int, color_t);
+int write_checkpoint(const char *, int, uint8_t *, int, int, int, color_t);
 
 int main(int argc, char** argv) {
-	int i, j, width, height, loops, t;
-	double timer;
-	char *image = NULL;
-	color_t imageType;
+	int i, j, width = 0, height = 0, loops, t, pass, checkpoints;
+	double timer, float_timer, ckpt_timer;
+	char *image;
+	color_t imageType = GREY;
+	options_t opts;
+	/* One job per image: a single one from the command line, or one per line of the --batch manifest */
+	job_t *jobs = NULL;
+	char *names = NULL;
+	int njobs = 0, names_len = 0, job;
 
-	Usage(argc, argv, &image, &width, &height, &loops, &imageType);
+	Usage(argc, argv, &jobs, &njobs, &names, &names_len, &opts);
 
 	/* Init filters */
 	int box_blur[3][3] = {{1, 1, 1}, {1, 1, 1}, {1, 1, 1}};
@@ -36,119 +127,276 @@ int main(int argc, char** argv) {
 			return EXIT_FAILURE;
 		}
 	}
+	int (*taps)[3] = gaussian_blur;
+	int divisor = 16;
+	if (opts.kernel == BOX) {
+		taps = box_blur;
+		divisor = 9;
+	} else if (opts.kernel == EDGE) {
+		taps = edge_detection;
+		divisor = 28;
+	}
 	for (i = 0 ; i < 3 ; i++) {
 		for (j = 0 ; j < 3 ; j++){
-			/* h[i][j] = box_blur[i][j] / 9.0f; */
-			h[i][j] = gaussian_blur[i][j] / 16.0f;
-			/* h[i][j] = edge_detection[i][j] / 28.0f; */
+			h[i][j] = taps[i][j] / (float)divisor;
+		}
+	}
+	filter_t reference = {0}, filter = {0};
+	reference.h = filter.h = h;
+	filter.fixed = opts.fixed;
+	if (opts.separable) {
+		filter.separable = split_separable(taps, divisor, &filter);
+		if (!filter.separable)
+			fprintf(stderr, "%s: kernel is not rank-1, using the 2-D path\n", argv[0]);
+	}
+	/* Float path kernels: the widest this CPU runs, or the ones --isa names */
+	filter.isa = detect_isa();
+	if (opts.isa != ISA_AUTO) {
+		if (opts.isa > filter.isa) {
+			fprintf(stderr, "%s: this CPU does not run --isa %s\n", argv[0], isa_name(opts.isa));
+			return EXIT_FAILURE;
 		}
+		filter.isa = opts.isa;
 	}
+	filter.tile_rows = opts.tile_rows;
+	filter.tile_cols = opts.tile_cols;
+	/* --compare on its own measures the fixed path (Gaussian only); with --isa it checks those kernels against the scalar ones */
+	if (opts.compare && !filter.fixed && !filter.separable && opts.kernel == GAUSSIAN && opts.isa == ISA_AUTO)
+		filter.fixed = 1;
+	if (!filter.fixed && !filter.separable)
+		fprintf(stderr, "isa: %s\n", isa_name(filter.isa));
 
-	/* Init arrays */
+	/* State that only depends on the geometry; kept from one job to the next while the geometry does not change */
 	uint8_t *src = NULL, *dst = NULL, *tmp = NULL;
 	int row_stride = 0;
-	if (imageType == GREY) {
-		row_stride = width + 2;
-		src = calloc((size_t)(height + 2) * (size_t)row_stride, sizeof(uint8_t));
-		dst = calloc((size_t)(height + 2) * (size_t)row_stride, sizeof(uint8_t));
-	} else if (imageType == RGB) {
-		row_stride = width * 3 + 6;
-		src = calloc((size_t)(height + 2) * (size_t)row_stride, sizeof(uint8_t));
-		dst = calloc((size_t)(height + 2) * (size_t)row_stride, sizeof(uint8_t));
-	}
-	if (src == NULL || dst == NULL) {
-		fprintf(stderr, "%s: Not enough memory\n", argv[0]);
-		return EXIT_FAILURE;
-	}
+	uint8_t *scratch[2] = {NULL, NULL};
+	/* --planar rgb: three grey planes plane_len bytes apart, loaded and written through an interleaved stage */
+	int planes = 1, p, io_stride = 0;
+	size_t plane_len = 0;
+	color_t layout = GREY;
+	uint8_t *stage = NULL;
+	int band, steps;
+	const int no_halo[4] = {0, 0, 0, 0};
 
-	/* Read input file */
-	FILE *fh = fopen(image, "rb");
-	if (fh == NULL) {
-		fprintf(stderr, "%s: Cannot open input file %s\n", argv[0], image);
-		return EXIT_FAILURE;
-	}
-	if (imageType == GREY) {
-		for (i = 1 ; i <= height ; i++) {
-			uint8_t *row = offset(src, i, 1, row_stride);
-			if (fread(row, 1, (size_t)width, fh) != (size_t)width) {
-				fprintf(stderr, "%s: Read error\n", argv[0]);
-				fclose(fh);
+	for (job = 0 ; job < njobs ; job++) {
+		image = names + jobs[job].image;
+		loops = jobs[job].loops;
+		if (job == 0 || !same_geometry(&jobs[job], &jobs[job - 1])) {
+			width = jobs[job].width;
+			height = jobs[job].height;
+			imageType = jobs[job].imageType;
+
+			/* Each plane is a grey image with its own padding, so the planes never read each other */
+			planes = (opts.planar && imageType == RGB) ? 3 : 1;
+			layout = (planes > 1) ? GREY : imageType;
+			io_stride = (imageType == GREY) ? width + 2 : width * 3 + 6;
+
+			/* Init arrays */
+			if (layout == GREY) {
+				row_stride = width + 2;
+				plane_len = (size_t)(height + 2) * (size_t)row_stride;
+				src = calloc(planes * plane_len, sizeof(uint8_t));
+				dst = calloc(planes * plane_len, sizeof(uint8_t));
+			} else if (layout == RGB) {
+				row_stride = width * 3 + 6;
+				plane_len = (size_t)(height + 2) * (size_t)row_stride;
+				src = calloc(plane_len, sizeof(uint8_t));
+				dst = calloc(plane_len, sizeof(uint8_t));
+			}
+			if (planes > 1)
+				stage = calloc((size_t)(height + 2) * (size_t)io_stride, sizeof(uint8_t));
+			if (src == NULL || dst == NULL || (planes > 1 && stage == NULL)) {
+				fprintf(stderr, "%s: Not enough memory\n", argv[0]);
 				return EXIT_FAILURE;
 			}
+
+			/* Temporal blocking scratch pair, sized for one band and its trapezoid */
+			band = opts.tblock_rows;
+			if (opts.tblock > 1) {
+				if (band <= 0)
+					band = TBLOCK_CACHE_BYTES / (2 * row_stride) - 2 * opts.tblock;
+				band = MIN(MAX(band, opts.tblock), height);
+				for (i = 0 ; i < 2 ; i++) {
+					scratch[i] = calloc((size_t)(band + 2 * opts.tblock) * (size_t)row_stride, sizeof(uint8_t));
+					if (scratch[i] == NULL) {
+						fprintf(stderr, "%s: Not enough memory\n", argv[0]);
+						return EXIT_FAILURE;
+					}
+				}
+			}
+
+			/* --tile auto: one tile shape per geometry, picked before the first timed sweep */
+			if (opts.tile_auto) {
+				double spent = tune_tile(src, dst, 1, height, 1, width, width, height, &filter, layout);
+				fprintf(stderr, "tile: %dx%d (auto, %f s)\n", filter.tile_rows, filter.tile_cols, spent);
+			}
 		}
-	} else if (imageType == RGB) {
-		for (i = 1 ; i <= height ; i++) {
-			uint8_t *row = offset(src, i, 3, row_stride);
-			if (fread(row, 1, (size_t)width * 3, fh) != (size_t)width * 3) {
-				fprintf(stderr, "%s: Read error\n", argv[0]);
-				fclose(fh);
+		checkpoints = 0;
+		timer = float_timer = ckpt_timer = 0.0;
+
+		/* Read input file, or the intermediate image of --resume */
+		const char *input = names + jobs[job].input;
+		if (read_image(input, (planes > 1) ? stage : src, width, height, io_stride, imageType) != 0) {
+			fprintf(stderr, "%s: Cannot read input file %s\n", argv[0], input);
+			return EXIT_FAILURE;
+		}
+		if (planes > 1)
+			split_planes(stage + io_stride + 3, io_stride, src + row_stride + 1, row_stride, plane_len, height, width);
+
+		/* Compare mode: pass 0 runs the float 2-D path, pass 1 the selected path on the same input */
+		size_t buf_len = planes * plane_len;
+		uint8_t *orig = NULL, *ref = NULL;
+		if (opts.compare) {
+			orig = malloc(buf_len);
+			ref = malloc(buf_len);
+			if (orig == NULL || ref == NULL) {
+				fprintf(stderr, "%s: Not enough memory\n", argv[0]);
 				return EXIT_FAILURE;
 			}
+			memcpy(orig, src, buf_len);
 		}
-	}
-	fclose(fh);
 
-	/* Convolute "loops" times */
-	clock_t start = clock();
-	for (t = 0 ; t < loops ; t++) {
-		convolute(src, dst, 1, height, 1, width, width, height, h, imageType);
-		tmp = src;
-		src = dst;
-		dst = tmp;
-	}
-	timer = (double)(clock() - start) / CLOCKS_PER_SEC;
+		for (pass = 0 ; pass < (opts.compare ? 2 : 1) ; pass++) {
+			const filter_t *active = (opts.compare && pass == 0) ? &reference : &filter;
+			if (opts.compare && pass)
+				memcpy(src, orig, buf_len);
 
-	/* Write output file */
-	size_t out_len = strlen(image) + 6;
-	char *outImage = malloc(out_len);
-	if (outImage == NULL) {
-		fprintf(stderr, "%s: Not enough memory\n", argv[0]);
-		return EXIT_FAILURE;
-	}
-	snprintf(outImage, out_len, "blur_%s", image);
-	FILE *outFile = fopen(outImage, "wb");
-	if (outFile == NULL) {
-		fprintf(stderr, "%s: Cannot open output file %s\n", argv[0], outImage);
-		return EXIT_FAILURE;
-	}
-	if (imageType == GREY) {
-		for (i = 1 ; i <= height ; i++) {
-			uint8_t *row = offset(src, i, 1, row_stride);
-			if (fwrite(row, 1, (size_t)width, outFile) != (size_t)width) {
-				fprintf(stderr, "%s: Write error\n", argv[0]);
-				fclose(outFile);
-				return EXIT_FAILURE;
+			/* Convolute up to iteration "loops" */
+			clock_t start = clock();
+			for (t = opts.start ; t < loops ; t += steps) {
+				/* The reference pass of --compare always sweeps one iteration at a time */
+				steps = (opts.tblock > 1 && active == &filter) ? MIN(opts.tblock, loops - t) : 1;
+				/* Temporal blocks end on checkpoints */
+				if (opts.checkpoint)
+					steps = MIN(steps, opts.checkpoint - t % opts.checkpoint);
+				for (p = 0 ; p < planes ; p++) {
+					if (steps > 1)
+						convolute_tblock(src + p * plane_len, dst + p * plane_len, scratch, 1, height, 1, width, no_halo, steps, band, width, active, layout);
+					else
+						convolute(src + p * plane_len, dst + p * plane_len, 1, height, 1, width, width, height, active, layout);
+				}
+				tmp = src;
+				src = dst;
+				dst = tmp;
+
+				/* Checkpoints come from the selected path only and are not timed; the last one is blur_<image> */
+				if (opts.checkpoint && active == &filter && (t + steps) % opts.checkpoint == 0 && t + steps < loops) {
+					clock_t ckpt_start = clock();
+					if (planes > 1)
+						merge_planes(src + row_stride + 1, row_stride, plane_len, stage + io_stride + 3, io_stride, height, width);
+					if (write_checkpoint(image, t + steps, (planes > 1) ? stage : src, width, height, io_stride, imageType) != 0) {
+						fprintf(stderr, "%s: Cannot write checkpoint %d\n", argv[0], t + steps);
+						return EXIT_FAILURE;
+					}
+					clock_t spent = clock() - ckpt_start;
+					ckpt_timer += (double)spent / CLOCKS_PER_SEC;
+					start += spent;
+					checkpoints++;
+				}
+			}
+			timer = (double)(clock() - start) / CLOCKS_PER_SEC;
+
+			if (opts.compare && pass == 0) {
+				memcpy(ref, src, buf_len);
+				float_timer = timer;
 			}
 		}
-	} else if (imageType == RGB) {
-		for (i = 1 ; i <= height ; i++) {
-			uint8_t *row = offset(src, i, 3, row_stride);
-			if (fwrite(row, 1, (size_t)width * 3, outFile) != (size_t)width * 3) {
-				fprintf(stderr, "%s: Write error\n", argv[0]);
-				fclose(outFile);
-				return EXIT_FAILURE;
+
+		if (opts.compare) {
+			int channels = (layout == GREY) ? 1 : 3;
+			long long differ = 0, samples = (long long)height * width * channels * planes;
+			int max_diff = 0, d;
+			size_t at;
+			for (p = 0 ; p < planes ; p++) {
+				for (i = 1 ; i <= height ; i++) {
+					for (j = channels ; j < channels * (width + 1) ; j++) {
+						at = p * plane_len + (size_t)i * row_stride + j;
+						d = abs((int)src[at] - (int)ref[at]);
+						if (d) {
+							differ++;
+							if (d > max_diff)
+								max_diff = d;
+						}
+					}
+				}
 			}
+			fprintf(stderr, "compare: float 2-D %f s, selected %f s, %lld of %lld samples differ, max |diff| = %d\n",
+					float_timer, timer, differ, samples, max_diff);
+			free(orig);
+			free(ref);
+		}
+
+		/* Write output file: --output PATH, or blur_<image> in the working directory */
+		const char *outImage = names + jobs[job].output;
+		if (planes > 1)
+			merge_planes(src + row_stride + 1, row_stride, plane_len, stage + io_stride + 3, io_stride, height, width);
+		if (write_image(outImage, is_pnm(outImage), (planes > 1) ? stage : src, width, height, io_stride, imageType) != 0) {
+			fprintf(stderr, "%s: Cannot write output file %s\n", argv[0], outImage);
+			return EXIT_FAILURE;
 		}
-	}
-	fclose(outFile);
 
-	printf("%f\n", timer);
+		if (opts.checkpoint)
+			fprintf(stderr, "checkpoint: %d written, %f s\n", checkpoints, ckpt_timer);
+		/* In batch mode the compute time stays the last token of each job line */
+		if (opts.batch)
+			printf("job %d %s %f\n", job + 1, outImage, timer);
+		else
+			printf("%f\n", timer);
+
+		/* De-allocate the geometry state unless the next job can reuse it */
+		if (job + 1 == njobs || !same_geometry(&jobs[job], &jobs[job + 1])) {
+			free(src);
+			free(dst);
+			free(stage);
+			stage = NULL;
+			free(scratch[0]);
+			free(scratch[1]);
+			scratch[0] = scratch[1] = NULL;
+		}
+	}
 
 	/* De-allocate space */
-	free(src);
-	free(dst);
 	for (i = 0 ; i < 3 ; i++)
 		free(h[i]);
 	free(h);
-	free(image);
-	free(outImage);
+	free(jobs);
+	free(names);
 
 	return EXIT_SUCCESS;
 }
 
-void convolute(uint8_t *src, uint8_t *dst, int row_from, int row_to, int col_from, int col_to, int width, int height, float** h, color_t imageType) {
+void convolute(uint8_t *src, uint8_t *dst, int row_from, int row_to, int col_from, int col_to, int width, int height, const filter_t *f, color_t imageType) {
 	int i, j;
-	if (imageType == GREY) {
+	float **h = f->h;
+	/* --tile: 0 spans the whole range in that direction */
+	int tile_rows = f->tile_rows ? f->tile_rows : row_to - row_from + 1;
+	int tile_cols = f->tile_cols ? f->tile_cols : col_to - col_from + 1;
+	if (tile_rows > 0 && tile_cols > 0 && (tile_rows <= row_to - row_from || tile_cols <= col_to - col_from)) {
+		/* Cache blocking: the same sweep one tile at a time, tiles in row-major order */
+		filter_t whole = *f;
+		int k, nr = (row_to - row_from) / tile_rows + 1, nc = (col_to - col_from) / tile_cols + 1;
+		whole.tile_rows = whole.tile_cols = 0;
+		for (k = 0 ; k < nr * nc ; k++) {
+			int r = row_from + (k / nc) * tile_rows, c = col_from + (k % nc) * tile_cols;
+			convolute(src, dst, r, MIN(r + tile_rows - 1, row_to), c, MIN(c + tile_cols - 1, col_to), width, height, &whole, imageType);
+		}
+	} else if (f->separable) {
+		convolute_separable(src, dst, row_from, row_to, col_from, col_to, width, f, imageType);
+	} else if (f->fixed) {
+		int ch = (imageType == GREY) ? 1 : 3;
+		int stride = (imageType == GREY) ? width+2 : width*3+6;
+		for (i = row_from ; i <= row_to ; i++) {
+			if (ch == 1)
+				convolute_fixed_row(src + (i-1)*stride, src + i*stride, src + (i+1)*stride, dst + i*stride, col_from, col_to + 1, 1);
+			else
+				convolute_fixed_row(src + (i-1)*stride, src + i*stride, src + (i+1)*stride, dst + i*stride, col_from*3, (col_to + 1)*3, 3);
+		}
+	} else if (f->isa != ISA_SCALAR) {
+		int ch = (imageType == GREY) ? 1 : 3;
+		int stride = width * ch + 2 * ch;
+		for (i = row_from ; i <= row_to ; i++)
+			convolute_float_row(src + (i-1)*stride, src + i*stride, src + (i+1)*stride, dst + i*stride, col_from*ch, (col_to + 1)*ch, ch, h, f->isa);
+	} else if (imageType == GREY) {
 		for (i = row_from ; i <= row_to ; i++)
 			for (j = col_from ; j <= col_to ; j++)
 				convolute_grey(src, dst, i, j, width+2, height, h);
@@ -159,6 +407,44 @@ void convolute(uint8_t *src, uint8_t *dst, int row_from, int row_to, int col_fro
 	}
 }
 
+/*
+ * --tile auto: time a sweep of rows [row_from, row_to] x columns [col_from,
+ * col_to] with each candidate tile (best of TILE_TRIALS) and leave the
+ * fastest in f. The candidates are whole rows plus
+ * row bands and column strips whose three input rows and output row fit
+ * TILE_CACHE_BYTES, or a quarter of it. Returns the seconds spent; dst is
+ * overwritten.
+ */
+double tune_tile(uint8_t *src, uint8_t *dst, int row_from, int row_to, int col_from, int col_to, int width, int height, filter_t *f, color_t imageType) {
+	int fit = TILE_CACHE_BYTES / (4 * ((imageType == GREY) ? 1 : 3));
+	const int tile_rows[4] = {0, 8, 32, 128};
+	const int tile_cols[3] = {0, fit / 4, fit};
+	int r, c, trial, best_rows = 0, best_cols = 0;
+	double best = -1, elapsed = 0;
+	clock_t begin = clock(), start;
+	for (r = 0 ; r < 4 ; r++) {
+		for (c = 0 ; c < 3 ; c++) {
+			f->tile_rows = tile_rows[r];
+			f->tile_cols = tile_cols[c];
+			for (trial = 0 ; trial < TILE_TRIALS ; trial++) {
+				start = clock();
+				convolute(src, dst, row_from, row_to, col_from, col_to, width, height, f, imageType);
+				double t = (double)(clock() - start) / CLOCKS_PER_SEC;
+				if (trial == 0 || t < elapsed)
+					elapsed = t;
+			}
+			if (best < 0 || elapsed < best) {
+				best = elapsed;
+				best_rows = tile_rows[r];
+				best_cols = tile_cols[c];
+			}
+		}
+	}
+	f->tile_rows = best_rows;
+	f->tile_cols = best_cols;
+	return (double)(clock() - begin) / CLOCKS_PER_SEC;
+}
+
 static inline void convolute_grey(uint8_t *src, uint8_t *dst, int x, int y, int width, int height, float** h) {
 	const uint8_t *row0 = src + (x - 1) * width + (y - 1);
 	const uint8_t *row1 = row0 + width;
@@ -197,28 +483,636 @@ static inline void convolute_rgb(uint8_t *src, uint8_t *dst, int x, int y, int w
 	dst[width * x + y+2] = (uint8_t)blueval;
 }
 
+/*
+ * Float path, one row at a time in 16 (SSE4.1), 32 (AVX2) or 64 (AVX-512)
+ * byte steps. Grey and interleaved rgb are the same loop: every byte is one
+ * sample and its horizontal neighbours are ch bytes away. Each kernel keeps
+ * the operation order of convolute_grey()/convolute_rgb() (nine products,
+ * summed left to right, truncated) and never fuses a multiply into an add,
+ * so it matches the scalar reference bit-for-bit; --compare --isa checks it.
+ */
+#ifdef HAVE_X86_SIMD
+SIMD_KERNEL("sse4.1")
+static void convolute_float_row_sse4(const uint8_t *row0, const uint8_t *row1, const uint8_t *row2, uint8_t *out, int from, int to, int ch, float **h) {
+	const uint8_t *rows[3] = {row0 - ch, row1 - ch, row2 - ch};
+	__m128 tap[9];
+	int b, t;
+	for (t = 0 ; t < 9 ; t++)
+		tap[t] = _mm_set1_ps(h[t / 3][t % 3]);
+	for (b = from ; b + 16 <= to ; b += 16) {
+		__m128 acc[4];
+		for (t = 0 ; t < 9 ; t++) {
+			__m128i v = _mm_loadu_si128((const __m128i *)(rows[t / 3] + b + (t % 3) * ch));
+			__m128 p0 = _mm_mul_ps(_mm_cvtepi32_ps(_mm_cvtepu8_epi32(v)), tap[t]);
+			__m128 p1 = _mm_mul_ps(_mm_cvtepi32_ps(_mm_cvtepu8_epi32(_mm_srli_si128(v, 4))), tap[t]);
+			__m128 p2 = _mm_mul_ps(_mm_cvtepi32_ps(_mm_cvtepu8_epi32(_mm_srli_si128(v, 8))), tap[t]);
+			__m128 p3 = _mm_mul_ps(_mm_cvtepi32_ps(_mm_cvtepu8_epi32(_mm_srli_si128(v, 12))), tap[t]);
+			acc[0] = t ? _mm_add_ps(acc[0], p0) : p0;
+			acc[1] = t ? _mm_add_ps(acc[1], p1) : p1;
+			acc[2] = t ? _mm_add_ps(acc[2], p2) : p2;
+			acc[3] = t ? _mm_add_ps(acc[3], p3) : p3;
+		}
+		__m128i lo = _mm_packus_epi32(_mm_cvttps_epi32(acc[0]), _mm_cvttps_epi32(acc[1]));
+		__m128i hi = _mm_packus_epi32(_mm_cvttps_epi32(acc[2]), _mm_cvttps_epi32(acc[3]));
+		_mm_storeu_si128((__m128i *)(out + b), _mm_packus_epi16(lo, hi));
+	}
+	convolute_float_tail(row0, row1, row2, out, b, to, ch, h);
+}
+
+SIMD_KERNEL("avx2")
+static void convolute_float_row_avx2(const uint8_t *row0, const uint8_t *row1, const uint8_t *row2, uint8_t *out, int from, int to, int ch, float **h) {
+	const uint8_t *rows[3] = {row0 - ch, row1 - ch, row2 - ch};
+	/* packus works within 128-bit lanes; this puts the four 8-byte groups back in order */
+	const __m256i order = _mm256_setr_epi32(0, 4, 1, 5, 2, 6, 3, 7);
+	__m256 tap[9];
+	int b, q, t;
+	for (t = 0 ; t < 9 ; t++)
+		tap[t] = _mm256_set1_ps(h[t / 3][t % 3]);
+	for (b = from ; b + 32 <= to ; b += 32) {
+		__m256 acc[4];
+		for (t = 0 ; t < 9 ; t++) {
+			const uint8_t *in = rows[t / 3] + b + (t % 3) * ch;
+			for (q = 0 ; q < 4 ; q++) {
+				__m128i v = _mm_loadl_epi64((const __m128i *)(in + 8 * q));
+				__m256 p = _mm256_mul_ps(_mm256_cvtepi32_ps(_mm256_cvtepu8_epi32(v)), tap[t]);
+				acc[q] = t ? _mm256_add_ps(acc[q], p) : p;
+			}
+		}
+		__m256i lo = _mm256_packus_epi32(_mm256_cvttps_epi32(acc[0]), _mm256_cvttps_epi32(acc[1]));
+		__m256i hi = _mm256_packus_epi32(_mm256_cvttps_epi32(acc[2]), _mm256_cvttps_epi32(acc[3]));
+		_mm256_storeu_si256((__m256i *)(out + b), _mm256_permutevar8x32_epi32(_mm256_packus_epi16(lo, hi), order));
+	}
+	convolute_float_tail(row0, row1, row2, out, b, to, ch, h);
+}
+
+SIMD_KERNEL("avx512f")
+static void convolute_float_row_avx512(const uint8_t *row0, const uint8_t *row1, const uint8_t *row2, uint8_t *out, int from, int to, int ch, float **h) {
+	const uint8_t *rows[3] = {row0 - ch, row1 - ch, row2 - ch};
+	__m512 tap[9];
+	int b, q, t;
+	for (t = 0 ; t < 9 ; t++)
+		tap[t] = _mm512_set1_ps(h[t / 3][t % 3]);
+	for (b = from ; b + 64 <= to ; b += 64) {
+		__m512 acc[4];
+		for (t = 0 ; t < 9 ; t++) {
+			const uint8_t *in = rows[t / 3] + b + (t % 3) * ch;
+			for (q = 0 ; q < 4 ; q++) {
+				__m128i v = _mm_loadu_si128((const __m128i *)(in + 16 * q));
+				__m512 p = _mm512_mul_ps(_mm512_cvtepi32_ps(_mm512_cvtepu8_epi32(v)), tap[t]);
+				acc[q] = t ? _mm512_add_ps(acc[q], p) : p;
+			}
+		}
+		for (q = 0 ; q < 4 ; q++)
+			_mm_storeu_si128((__m128i *)(out + b + 16 * q), _mm512_cvtusepi32_epi8(_mm512_cvttps_epi32(acc[q])));
+	}
+	convolute_float_tail(row0, row1, row2, out, b, to, ch, h);
+}
+#endif
+
+/* Bytes [from, to) of one output row with the selected kernels */
+void convolute_float_row(const uint8_t *row0, const uint8_t *row1, const uint8_t *row2, uint8_t *out, int from, int to, int ch, float **h, isa_t isa) {
+	switch (isa) {
+#ifdef HAVE_X86_SIMD
+	case ISA_AVX512:
+		convolute_float_row_avx512(row0, row1, row2, out, from, to, ch, h);
+		break;
+	case ISA_AVX2:
+		convolute_float_row_avx2(row0, row1, row2, out, from, to, ch, h);
+		break;
+	case ISA_SSE4:
+		convolute_float_row_sse4(row0, row1, row2, out, from, to, ch, h);
+		break;
+#endif
+	default:
+		convolute_float_tail(row0, row1, row2, out, from, to, ch, h);
+	}
+}
+
+/* Scalar float row, the same sum as convolute_grey()/convolute_rgb(); also the tail of the SIMD kernels */
+static inline void convolute_float_tail(const uint8_t *row0, const uint8_t *row1, const uint8_t *row2, uint8_t *out, int from, int to, int ch, float **h) {
+	int b;
+	const float *h0 = h[0];
+	const float *h1 = h[1];
+	const float *h2 = h[2];
+	for (b = from ; b < to ; b++) {
+		float val =
+			row0[b-ch] * h0[0] + row0[b] * h0[1] + row0[b+ch] * h0[2] +
+			row1[b-ch] * h1[0] + row1[b] * h1[1] + row1[b+ch] * h1[2] +
+			row2[b-ch] * h2[0] + row2[b] * h2[1] + row2[b+ch] * h2[2];
+		out[b] = (uint8_t)val;
+	}
+}
+
+/* Widest float path kernels the local CPU runs */
+isa_t detect_isa(void) {
+#ifdef HAVE_X86_SIMD
+	__builtin_cpu_init();
+	if (__builtin_cpu_supports("avx512f"))
+		return ISA_AVX512;
+	if (__builtin_cpu_supports("avx2"))
+		return ISA_AVX2;
+	if (__builtin_cpu_supports("sse4.1"))
+		return ISA_SSE4;
+#endif
+	return ISA_SCALAR;
+}
+
+/* --isa spelling of isa */
+const char *isa_name(isa_t isa) {
+	static const char *names[] = {"scalar", "sse4", "avx2", "avx512", "auto"};
+	return names[isa];
+}
+
+/*
+ * Integer Gaussian row: out[b] = (sum of {1,2,1;2,4,2;1,2,1} taps) >> 4 for
+ * bytes b in [from, to). ch is the distance between horizontal neighbours
+ * (1 for grey, 3 for interleaved rgb); it is a literal at every call site so
+ * the loop compiles to plain 16-bit SIMD adds and shifts.
+ *
+ * Rounding contract: the result is floor(sum / 16). Every product and partial
+ * sum of the float path is a multiple of 1/16 below 256 and therefore exact in
+ * float, so for the Gaussian kernel both paths truncate the same value and
+ * agree bit-for-bit; --compare reports the measured difference.
+ */
+static inline void convolute_fixed_row(const uint8_t *restrict row0, const uint8_t *restrict row1, const uint8_t *restrict row2, uint8_t *restrict out, int from, int to, int ch) {
+	int b;
+	for (b = from ; b < to ; b++) {
+		unsigned top = row0[b-ch] + (row0[b] << 1) + row0[b+ch];
+		unsigned mid = row1[b-ch] + (row1[b] << 1) + row1[b+ch];
+		unsigned bot = row2[b-ch] + (row2[b] << 1) + row2[b+ch];
+		out[b] = (uint8_t)((top + (mid << 1) + bot) >> 4);
+	}
+}
+
+/*
+ * Separable path for rank-1 kernels: every source row gets one horizontal
+ * 1-D pass into a ring of three row buffers, and each output row is the
+ * vertical 1-D pass over the ring (6 taps per sample instead of 9). The ring
+ * holds 3 * n ints, so it stays in cache while the image rows stream through.
+ * The result is the exact floor(sum / divisor); for the Gaussian kernel that
+ * is bit-identical to the float 2-D path.
+ */
+void convolute_separable(uint8_t *src, uint8_t *dst, int row_from, int row_to, int col_from, int col_to, int width, const filter_t *f, color_t imageType) {
+	int i, b;
+	int ch = (imageType == GREY) ? 1 : 3;
+	int stride = width * ch + 2 * ch;
+	int from = col_from * ch, n = (col_to - col_from + 1) * ch;
+	const unsigned c0 = f->col_taps[0], c1 = f->col_taps[1], c2 = f->col_taps[2];
+	if (row_from > row_to || n <= 0)
+		return;
+	unsigned *ring = malloc(3 * (size_t)n * sizeof(unsigned));
+	if (ring == NULL) {
+		fprintf(stderr, "Not enough memory\n");
+		exit(EXIT_FAILURE);
+	}
+	unsigned *above = ring, *centre = ring + n, *below = ring + 2 * n, *spare;
+
+	separable_row(src + (row_from - 1) * stride + from, above, n, ch, f->row_taps);
+	separable_row(src + row_from * stride + from, centre, n, ch, f->row_taps);
+	for (i = row_from ; i <= row_to ; i++) {
+		uint8_t *out = dst + i * stride + from;
+		separable_row(src + (i + 1) * stride + from, below, n, ch, f->row_taps);
+		if (f->shift >= 0) {
+			for (b = 0 ; b < n ; b++)
+				out[b] = (uint8_t)((c0 * above[b] + c1 * centre[b] + c2 * below[b]) >> f->shift);
+		} else {
+			for (b = 0 ; b < n ; b++)
+				out[b] = (uint8_t)(((uint64_t)(c0 * above[b] + c1 * centre[b] + c2 * below[b]) * f->recip) >> 32);
+		}
+		spare = above;
+		above = centre;
+		centre = below;
+		below = spare;
+	}
+	free(ring);
+}
+
+/* Horizontal 1-D pass over n bytes; ch is the distance between neighbouring samples */
+static inline void separable_row(const uint8_t *restrict in, unsigned *restrict out, int n, int ch, const unsigned *taps) {
+	int b;
+	const unsigned t0 = taps[0], t1 = taps[1], t2 = taps[2];
+	for (b = 0 ; b < n ; b++)
+		out[b] = t0 * in[b - ch] + t1 * in[b] + t2 * in[b + ch];
+}
+
+/*
+ * Split a non-negative rank-1 kernel as taps[i][j] == col_taps[i] * row_taps[j] / pivot,
+ * pivot being its first non-zero tap, and fold pivot into the divisor.
+ * Returns 0 (leaving f untouched) when the kernel is not rank-1.
+ */
+int split_separable(int taps[3][3], int divisor, filter_t *f) {
+	int i, j, pr = -1, pc = -1, pivot;
+	for (i = 0 ; i < 3 ; i++) {
+		for (j = 0 ; j < 3 ; j++) {
+			if (taps[i][j] < 0)
+				return 0;
+			if (pr < 0 && taps[i][j]) {
+				pr = i;
+				pc = j;
+			}
+		}
+	}
+	if (pr < 0)
+		return 0;
+	pivot = taps[pr][pc];
+	for (i = 0 ; i < 3 ; i++)
+		for (j = 0 ; j < 3 ; j++)
+			if (taps[i][j] * pivot != taps[i][pc] * taps[pr][j])
+				return 0;
+	for (i = 0 ; i < 3 ; i++) {
+		f->col_taps[i] = (unsigned)taps[i][pc];
+		f->row_taps[i] = (unsigned)taps[pr][i];
+	}
+	divisor *= pivot;
+	f->shift = -1;
+	for (i = 0 ; (1 << i) <= divisor ; i++)
+		if ((1 << i) == divisor)
+			f->shift = i;
+	f->recip = ((1ULL << 32) + (uint64_t)divisor - 1) / (uint64_t)divisor;
+	return 1;
+}
+
+/*
+ * Temporal blocking: run `steps` iterations from src to dst one band of at
+ * most `band` output rows at a time. [row_from, row_to] x [col_from, col_to]
+ * is the region that is valid after the last step. A side flagged in grow[]
+ * (north, south, west, east) holds halo data and is computed steps - s pixels
+ * wider at step s; a side that is not flagged is the image border and stays
+ * fixed. Each band copies the window of src it depends on into a scratch pair
+ * and shrinks the computed rows by one per step (a trapezoid), so the window
+ * stays in cache for all the steps. Bands only read src and write disjoint
+ * rows of dst, so the result equals `steps` full sweeps.
+ * Each scratch buffer holds band + 2 * steps rows with zeroed padding columns.
+ */
+void convolute_tblock(uint8_t *src, uint8_t *dst, uint8_t **scratch, int row_from, int row_to, int col_from, int col_to, const int grow[4], int steps, int band, int width, const filter_t *f, color_t imageType) {
+	int ch = (imageType == GREY) ? 1 : 3;
+	size_t stride = (size_t)width * ch + 2 * ch;
+	/* Rows computed by the first step */
+	int first = row_from - (grow[0] ? steps - 1 : 0);
+	int last = row_to + (grow[1] ? steps - 1 : 0);
+	int n, bands = (row_to - row_from + band) / band;
+	for (n = 0 ; n < bands ; n++) {
+		int a = row_from + n * band, b = MIN(a + band - 1, row_to);
+		int base = a - steps, g, s;
+		uint8_t *cur = scratch[0], *nxt = scratch[0 + 1], *tmp;
+
+		for (g = MAX(base, first - 1) ; g <= MIN(b + steps, last + 1) ; g++) {
+			memcpy(cur + (g - base) * stride, src + g * stride, stride);
+			/* Border or halo rows are read unchanged by the later steps too */
+			if (g < first || g > last)
+				memcpy(nxt + (g - base) * stride, src + g * stride, stride);
+		}
+		for (s = 1 ; s <= steps ; s++) {
+			int wider = steps - s;
+			int r0 = MAX(a - wider, row_from - (grow[0] ? wider : 0));
+			int r1 = MIN(b + wider, row_to + (grow[1] ? wider : 0));
+			convolute(cur, nxt, r0 - base, r1 - base, col_from - (grow[2] ? wider : 0), col_to + (grow[3] ? wider : 0),
+					width, b - a + 1, f, imageType);
+			tmp = cur;
+			cur = nxt;
+			nxt = tmp;
+		}
+		for (g = a ; g <= b ; g++)
+			memcpy(dst + g * stride + col_from * ch, cur + (g - base) * stride + col_from * ch, (size_t)(col_to - col_from + 1) * ch);
+	}
+}
+
 /* Get pointer to internal array position */
 uint8_t *offset(uint8_t *array, int i, int j, int width) {
 	return &array[width * i + j];
 }
 
-void Usage(int argc, char **argv, char **image, int *width, int *height, int *loops, color_t *imageType) {
-	if (argc == 6 && !strcmp(argv[5], "grey")) {
-		*image = malloc((strlen(argv[1])+1) * sizeof(char));
-		strcpy(*image, argv[1]);
-		*width = atoi(argv[2]);
-		*height = atoi(argv[3]);
-		*loops = atoi(argv[4]);
-		*imageType = GREY;
-	} else if (argc == 6 && !strcmp(argv[5], "rgb")) {
-		*image = malloc((strlen(argv[1])+1) * sizeof(char));
-		strcpy(*image, argv[1]);
-		*width = atoi(argv[2]);
-		*height = atoi(argv[3]);
-		*loops = atoi(argv[4]);
-		*imageType = RGB;
+/*
+ * --planar: rows x cols rgb pixels of an interleaved buffer (rgb_stride bytes
+ * a row) to three grey planes plane_len bytes apart (plane_stride bytes a
+ * row), and back. Runs once at load and once per written image.
+ */
+void split_planes(const uint8_t *rgb, size_t rgb_stride, uint8_t *plane, size_t plane_stride, size_t plane_len, int rows, int cols) {
+	int i, j, c;
+	for (c = 0 ; c < 3 ; c++)
+		for (i = 0 ; i < rows ; i++)
+			for (j = 0 ; j < cols ; j++)
+				plane[c * plane_len + i * plane_stride + j] = rgb[i * rgb_stride + 3 * j + c];
+}
+
+void merge_planes(const uint8_t *plane, size_t plane_stride, size_t plane_len, uint8_t *rgb, size_t rgb_stride, int rows, int cols) {
+	int i, j, c;
+	for (c = 0 ; c < 3 ; c++)
+		for (i = 0 ; i < rows ; i++)
+			for (j = 0 ; j < cols ; j++)
+				rgb[i * rgb_stride + 3 * j + c] = plane[c * plane_len + i * plane_stride + j];
+}
+
+/* PGM/PPM files are recognised by their .pgm/.ppm extension */
+int is_pnm(const char *path) {
+	size_t len = (path != NULL) ? strlen(path) : 0;
+	const char *ext = (len > 4) ? path + len - 4 : NULL;
+	return ext != NULL && ext[0] == '.' && tolower((unsigned char)ext[1]) == 'p'
+			&& (tolower((unsigned char)ext[2]) == 'g' || tolower((unsigned char)ext[2]) == 'p')
+			&& tolower((unsigned char)ext[3]) == 'm';
+}
+
+/* File name part of a path; outputs and checkpoints are named after it in the working directory */
+const char *base_name(const char *path) {
+	const char *p, *base = path;
+	for (p = path ; *p ; p++)
+		if (*p == '/' || *p == '\\')
+			base = p + 1;
+	return base;
+}
+
+/* Whitespace and # comments, then a decimal number and the whitespace byte ending it; -1 on error */
+static int pnm_field(FILE *fh) {
+	int c, value = 0, digits = 0;
+	while ((c = fgetc(fh)) != EOF) {
+		if (c == '#') {
+			while ((c = fgetc(fh)) != EOF && c != '\n')
+				;
+		} else if (!isspace(c))
+			break;
+	}
+	for ( ; isdigit(c) && value <= (INT_MAX - 9) / 10 ; c = fgetc(fh), digits++)
+		value = value * 10 + (c - '0');
+	return (digits && c != EOF && isspace(c)) ? value : -1;
+}
+
+/*
+ * Geometry and colour of a binary PGM (P5, grey) or PPM (P6, rgb) with maxval
+ * 255. Returns the offset of the first pixel, or -1 if the file is not one.
+ */
+long read_pnm_header(const char *path, int *width, int *height, color_t *imageType) {
+	int w, h, magic, c;
+	long pixels = -1;
+	FILE *fh = fopen(path, "rb");
+	if (fh == NULL)
+		return -1;
+	if (fgetc(fh) == 'P' && ((magic = fgetc(fh)) == '5' || magic == '6')
+			&& ((c = fgetc(fh)) == '#' || isspace(c)) && ungetc(c, fh) != EOF
+			&& (w = pnm_field(fh)) > 0 && (h = pnm_field(fh)) > 0 && pnm_field(fh) == 255) {
+		*width = w;
+		*height = h;
+		*imageType = (magic == '5') ? GREY : RGB;
+		pixels = ftell(fh);
+	}
+	fclose(fh);
+	return pixels;
+}
+
+/*
+ * Read an image into the rows of a padded buffer; a PGM/PPM must match the
+ * geometry and colour and only its pixels are read. 0 on success.
+ */
+int read_image(const char *path, uint8_t *buf, int width, int height, int row_stride, color_t imageType) {
+	int i, ch = (imageType == GREY) ? 1 : 3, w, h;
+	long pixels = 0;
+	color_t type;
+	if (is_pnm(path) && ((pixels = read_pnm_header(path, &w, &h, &type)) < 0 || w != width || h != height || type != imageType))
+		return -1;
+	FILE *fh = fopen(path, "rb");
+	if (fh == NULL)
+		return -1;
+	if (fseek(fh, pixels, SEEK_SET) != 0) {
+		fclose(fh);
+		return -1;
+	}
+	for (i = 1 ; i <= height ; i++) {
+		if (fread(offset(buf, i, ch, row_stride), 1, (size_t)width * ch, fh) != (size_t)width * ch) {
+			fclose(fh);
+			return -1;
+		}
+	}
+	fclose(fh);
+	return 0;
+}
+
+/* Write the rows of a padded buffer as a headerless image, or as a PGM/PPM if pnm is set; 0 on success */
+int write_image(const char *path, int pnm, uint8_t *buf, int width, int height, int row_stride, color_t imageType) {
+	int i, ch = (imageType == GREY) ? 1 : 3;
+	FILE *fh = fopen(path, "wb");
+	if (fh == NULL)
+		return -1;
+	if (pnm && fprintf(fh, "P%c\n%d %d\n255\n", (imageType == GREY) ? '5' : '6', width, height) < 0) {
+		fclose(fh);
+		return -1;
+	}
+	for (i = 1 ; i <= height ; i++) {
+		if (fwrite(offset(buf, i, ch, row_stride), 1, (size_t)width * ch, fh) != (size_t)width * ch) {
+			fclose(fh);
+			return -1;
+		}
+	}
+	return fclose(fh) == 0 ? 0 : -1;
+}
+
+/*
+ * Write ckpt_<t>_<image> through a temporary file and a rename, so that a run
+ * killed mid-write leaves the previous checkpoints intact. A PGM/PPM image
+ * gets PGM/PPM checkpoints.
+ */
+int write_checkpoint(const char *image, int t, uint8_t *buf, int width, int height, int row_stride, color_t imageType) {
+	size_t len = strlen(image) + 32;
+	char *path = malloc(len), *part = malloc(len + 4);
+	int ret = -1;
+	if (path != NULL && part != NULL) {
+		snprintf(path, len, "ckpt_%d_%s", t, base_name(image));
+		snprintf(part, len + 4, "%s.tmp", path);
+		if (write_image(part, is_pnm(path), buf, width, height, row_stride, imageType) == 0) {
+			/* rename() does not replace an existing file on Windows */
+			if (rename(part, path) == 0 || (remove(path) == 0 && rename(part, path) == 0))
+				ret = 0;
+		}
+	}
+	free(path);
+	free(part);
+	return ret;
+}
+
+/*
+ * image_name width height loops rgb|grey [options] for headerless images,
+ * image.pgm|image.ppm loops [options] with the geometry and colour taken from
+ * the PGM/PPM header, or --batch MANIFEST [options] for one job per manifest
+ * line.
+ */
+void Usage(int argc, char **argv, job_t **jobs, int *njobs, char **names, int *names_len, options_t *opts) {
+	int i, width, height, loops;
+	int batch = argc >= 3 && !strcmp(argv[1], "--batch"), pnm = !batch && argc >= 3 && is_pnm(argv[1]);
+	color_t imageType;
+	memset(opts, 0, sizeof(*opts));
+	opts->isa = ISA_AUTO;
+	for (i = (batch || pnm) ? 3 : 6 ; i < argc ; i++) {
+		if (!strcmp(argv[i], "--fixed"))
+			opts->fixed = 1;
+		else if (!strcmp(argv[i], "--separable"))
+			opts->separable = 1;
+		else if (!strcmp(argv[i], "--compare"))
+			opts->compare = 1;
+		else if (!strcmp(argv[i], "--planar"))
+			opts->planar = 1;
+		else if (!strcmp(argv[i], "--isa") && i + 1 < argc) {
+			i++;
+			for (opts->isa = ISA_SCALAR ; opts->isa < ISA_AUTO && strcmp(argv[i], isa_name(opts->isa)) ; opts->isa++)
+				;
+			if (strcmp(argv[i], isa_name(opts->isa)))
+				argc = -1;
+		}
+		else if (!strcmp(argv[i], "--tblock") && i + 1 < argc && (opts->tblock = atoi(argv[i+1])) > 0)
+			i++;
+		else if (!strcmp(argv[i], "--tile") && i + 1 < argc) {
+			i++;
+			if (!strcmp(argv[i], "auto"))
+				opts->tile_auto = 1;
+			else if (sscanf(argv[i], "%dx%d", &opts->tile_rows, &opts->tile_cols) != 2 || opts->tile_rows < 0 || opts->tile_cols < 0)
+				argc = -1;
+		}
+		else if (!strcmp(argv[i], "--tblock-rows") && i + 1 < argc && (opts->tblock_rows = atoi(argv[i+1])) > 0)
+			i++;
+		else if (!strcmp(argv[i], "--checkpoint") && i + 1 < argc && (opts->checkpoint = atoi(argv[i+1])) > 0)
+			i++;
+		else if (!strcmp(argv[i], "--resume") && i + 2 < argc && (opts->start = atoi(argv[i+2])) >= 0) {
+			opts->resume = i + 1;
+			i += 2;
+		}
+		else if (!strcmp(argv[i], "--output") && i + 1 < argc)
+			opts->output = ++i;
+		else if (!strcmp(argv[i], "--kernel") && i + 1 < argc) {
+			i++;
+			if (!strcmp(argv[i], "gaussian"))
+				opts->kernel = GAUSSIAN;
+			else if (!strcmp(argv[i], "box"))
+				opts->kernel = BOX;
+			else if (!strcmp(argv[i], "edge"))
+				opts->kernel = EDGE;
+			else
+				argc = -1;
+		} else
+			argc = -1;
+	}
+	if (opts->fixed && opts->kernel != GAUSSIAN) {
+		fprintf(stderr, "%s: --fixed requires the gaussian kernel\n", argv[0]);
+		exit(EXIT_FAILURE);
+	}
+	if (batch && argc >= 3) {
+		if (opts->resume || opts->output) {
+			fprintf(stderr, "%s: --resume and --output name a single image, give the files in the manifest instead\n", argv[0]);
+			exit(EXIT_FAILURE);
+		}
+		opts->batch = 2;
+		read_manifest(argv[0], argv[2], jobs, njobs, names, names_len);
+		return;
+	}
+	if (pnm && argc >= 3) {
+		if (read_pnm_header(argv[1], &width, &height, &imageType) < 0) {
+			fprintf(stderr, "%s: %s is not a binary PGM/PPM with maxval 255\n", argv[0], argv[1]);
+			exit(EXIT_FAILURE);
+		}
+		loops = atoi(argv[2]);
+	} else if (!pnm && argc >= 6 && (!strcmp(argv[5], "grey") || !strcmp(argv[5], "rgb"))) {
+		width = atoi(argv[2]);
+		height = atoi(argv[3]);
+		loops = atoi(argv[4]);
+		imageType = !strcmp(argv[5], "grey") ? GREY : RGB;
 	} else {
-		fprintf(stderr, "\nError Input!\n%s image_name width height loops [rgb/grey].\n\n", argv[0]);
+		fprintf(stderr, "\nError Input!\n%s image_name width height loops [rgb/grey] [options]\n%s image.pgm|image.ppm loops [options]\n%s --batch MANIFEST [options]\n"
+				"options: [--kernel gaussian|box|edge] [--fixed] [--separable] [--compare] [--isa scalar|sse4|avx2|avx512|auto] [--planar] [--tblock T] [--tblock-rows B] [--tile RxC|auto] [--checkpoint N] [--resume FILE T] [--output PATH].\n\n", argv[0], argv[0], argv[0]);
 		exit(EXIT_FAILURE);
 	}
+	if (opts->start > loops) {
+		fprintf(stderr, "%s: --resume iteration %d is past loops\n", argv[0], opts->start);
+		exit(EXIT_FAILURE);
+	}
+	const char *input = opts->resume ? argv[opts->resume] : argv[1];
+	if (add_job(jobs, njobs, names, names_len, input, argv[1], opts->output ? argv[opts->output] : NULL, width, height, loops, imageType) != 0) {
+		fprintf(stderr, "%s: %s is not a %dx%d %s PGM/PPM\n", argv[0], input, width, height, (imageType == GREY) ? "grey" : "rgb");
+		exit(EXIT_FAILURE);
+	}
+}
+
+/* Copy name to the end of the string table and return its offset */
+static int add_name(char **names, int *names_len, const char *name) {
+	int at = *names_len, len = (int)strlen(name) + 1;
+	*names = realloc(*names, at + len);
+	memcpy(*names + at, name, len);
+	*names_len += len;
+	return at;
+}
+
+/*
+ * Append a job that reads input (image itself, or an intermediate of it) and
+ * writes output, blur_<image> if NULL. Returns -1 if input is a PGM/PPM whose
+ * header does not match the geometry.
+ */
+int add_job(job_t **jobs, int *njobs, char **names, int *names_len, const char *input, const char *image, const char *output, int width, int height, int loops, color_t imageType) {
+	int w, h;
+	color_t type;
+	job_t *jb;
+	if (is_pnm(input) && (read_pnm_header(input, &w, &h, &type) < 0 || w != width || h != height || type != imageType))
+		return -1;
+	*jobs = realloc(*jobs, (*njobs + 1) * sizeof(job_t));
+	jb = &(*jobs)[(*njobs)++];
+	jb->input = add_name(names, names_len, input);
+	jb->image = add_name(names, names_len, image);
+	if (output != NULL)
+		jb->output = add_name(names, names_len, output);
+	else {
+		char *blurImage = malloc((strlen(image) + 9) * sizeof(char));
+		strcpy(blurImage, "blur_");
+		strcat(blurImage, base_name(image));
+		jb->output = add_name(names, names_len, blurImage);
+		free(blurImage);
+	}
+	jb->width = width;
+	jb->height = height;
+	jb->loops = loops;
+	jb->imageType = imageType;
+	return 0;
+}
+
+/*
+ * --batch manifest: one job per line, either
+ *     input output width height loops rgb|grey
+ * for headerless images or
+ *     input.pgm|input.ppm output loops
+ * with the geometry taken from the header. Blank lines and # comments are
+ * skipped, paths are relative to the working directory.
+ */
+void read_manifest(const char *prog, const char *path, job_t **jobs, int *njobs, char **names, int *names_len) {
+	char line[4096], *tok[7];
+	int n, lineno = 0, width, height, loops;
+	color_t imageType;
+	FILE *fh = fopen(path, "r");
+	if (fh == NULL) {
+		fprintf(stderr, "%s: Cannot read manifest %s\n", prog, path);
+		exit(EXIT_FAILURE);
+	}
+	while (fgets(line, sizeof(line), fh) != NULL) {
+		lineno++;
+		for (n = 0 ; n < 7 && (tok[n] = strtok(n ? NULL : line, " \t\r\n")) != NULL ; n++)
+			;
+		if (n == 0 || tok[0][0] == '#')
+			continue;
+		if (n == 3 && is_pnm(tok[0]) && read_pnm_header(tok[0], &width, &height, &imageType) >= 0) {
+			loops = atoi(tok[2]);
+		} else if (n == 6 && (!strcmp(tok[5], "grey") || !strcmp(tok[5], "rgb"))) {
+			width = atoi(tok[2]);
+			height = atoi(tok[3]);
+			loops = atoi(tok[4]);
+			imageType = !strcmp(tok[5], "grey") ? GREY : RGB;
+		} else
+			width = 0;
+		if (width <= 0 || height <= 0 || loops < 0
+				|| add_job(jobs, njobs, names, names_len, tok[0], tok[0], tok[1], width, height, loops, imageType) != 0) {
+			fprintf(stderr, "%s: %s:%d: expected input output width height loops rgb|grey, or input.pgm|input.ppm output loops\n", prog, path, lineno);
+			exit(EXIT_FAILURE);
+		}
+	}
+	fclose(fh);
+	if (*njobs == 0) {
+		fprintf(stderr, "%s: %s lists no images\n", prog, path);
+		exit(EXIT_FAILURE);
+	}
+}
+
+/* Jobs of the same geometry share the padded buffers and the scratch pair */
+int same_geometry(const job_t *a, const job_t *b) {
+	return a->width == b->width && a->height == b->height && a->imageType == b->imageType;
 }
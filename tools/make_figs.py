@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+# Requires Pillow and NumPy. If missing, install: pip install pillow numpy
+"""
+Figures of one image after several iteration counts, from a single run.
+
+The convolution runs once up to the largest count and every requested count
+is captured on the way: from the NumPy reference iterator, from a chain of
+seq_conv runs that each resume from the previous count (--exe), or from the
+reference cache (--cache). Each frame is kept in memory once and shared by
+its own PNG and by every composite that shows it; the input stays on disk
+and is memory-mapped rather than read.
+
+    make_figs.py --input waterfall_grey_1920_2520.raw --width 1920 --height 2520 --mode grey --loops 0 20 40 60
+
+writes figures/grey_<n>.png for every count and figures/grey_0_20_40_60.png
+with all of them side by side; --composite 0,20 40,60 picks other groups.
+"""
+
+import argparse
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT))
+
+try:
+    import numpy as np
+    from parconv.rawio import open_raw
+except ImportError as exc:
+    raise SystemExit("The figure tools require NumPy. Install it with: pip install numpy") from exc
+
+PIL_MODES = {"grey": "L", "rgb": "RGB"}
+
+
+def eprint(*args):
+    print(*args, file=sys.stderr)
+
+
+def load_raw(path: Path, width: int, height: int, mode: str, label: str) -> np.ndarray:
+    """Map the frame; Pillow and the engines read the mapping, nothing is copied up front."""
+    if not path.is_file():
+        raise FileNotFoundError(f"{label} file not found: {path}")
+    try:
+        return open_raw(path, width, height, mode)
+    except ValueError as exc:
+        raise ValueError(f"{label} file size mismatch: {exc}") from None
+
+
+def ensure_pillow():
+    try:
+        from PIL import Image  # type: ignore
+    except Exception:
+        eprint("Pillow is required. Install it with: pip install pillow")
+        sys.exit(1)
+    return Image
+
+
+def run_seq_conv(exe: Path, input_name: str, width: int, height: int, loops: int, mode: str, cwd: Path, extra: list[str] = ()):
+    cmd = [str(exe), input_name, str(width), str(height), str(loops), mode] + list(extra)
+    try:
+        subprocess.run(cmd, cwd=str(cwd), check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    except FileNotFoundError as exc:
+        raise RuntimeError(f"Executable not found or not runnable: {exe}") from exc
+    except subprocess.CalledProcessError as exc:
+        stderr = exc.stderr.strip() if exc.stderr else ""
+        stdout = exc.stdout.strip() if exc.stdout else ""
+        details = "\n".join([s for s in [stdout, stderr] if s])
+        msg = "Executable failed"
+        if details:
+            msg = f"{msg}:\n{details}"
+        raise RuntimeError(msg) from exc
+
+
+def seq_conv_snapshots(exe: Path, input_path: Path, width: int, height: int, mode: str, counts: list[int]) -> dict:
+    """
+    One seq_conv run per requested count, each resuming from the frame of the
+    previous count, so the iterations add up to the largest count and only
+    the requested frames are ever written. The runs happen in a scratch
+    directory; nothing is left next to the input.
+    """
+    exe = exe.resolve()
+    snapshots = {}
+    with tempfile.TemporaryDirectory(prefix="make_figs_") as tmp:
+        cwd = Path(tmp)
+        previous = None
+        for t in counts:
+            frame = cwd / f"frame_{t}.raw"
+            extra = ["--output", str(frame)]
+            if previous is not None:
+                extra += ["--resume", str(cwd / f"frame_{previous}.raw"), str(previous)]
+            run_seq_conv(exe, str(input_path.resolve()), width, height, t, mode, cwd, extra)
+            # Copied out of the mapping so that the file can go (Windows cannot delete a mapped file)
+            snapshots[t] = np.array(load_raw(frame, width, height, mode, f"Frame {t}"))
+            if previous is not None:
+                (cwd / f"frame_{previous}.raw").unlink()
+            previous = t
+    return snapshots
+
+
+def reference_snapshots(image: np.ndarray, counts: list[int]) -> dict:
+    """Walk the NumPy reference iterator to the largest count, copying each requested frame once."""
+    from parconv import iterate
+
+    snapshots = {}
+    wanted = set(counts)
+    for t, frame in enumerate(iterate(image), start=1):
+        if t in wanted:
+            snapshots[t] = frame.copy()
+        if t == counts[-1]:
+            return snapshots
+    return snapshots
+
+
+def cached_snapshots(cache_dir: str, raw: np.ndarray, width: int, height: int, mode: str, counts: list[int], exe) -> dict:
+    """In increasing order, so every missing entry is derived from the one before it."""
+    from parconv.cache import ReferenceCache, seq_conv_advance
+
+    advance = seq_conv_advance(exe, width, height, mode) if exe is not None else None
+    cache = ReferenceCache(cache_dir or None)
+    return {t: cache.blur(raw, width, height, mode, t, advance=advance) for t in counts}
+
+
+def parse_group(text: str) -> list[int]:
+    try:
+        group = [int(part) for part in text.split(",") if part]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected comma separated iteration counts, got {text!r}") from None
+    if not group:
+        raise argparse.ArgumentTypeError("empty composite")
+    return group
+
+
+def build_parser(description: str, mode: str | None = None, loops: list[int] | None = None, outdir: str = "figures"):
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--input", required=True, help="Path to input raw image")
+    parser.add_argument("--width", type=int, required=True, help="Image width")
+    parser.add_argument("--height", type=int, required=True, help="Image height")
+    if mode is None:
+        parser.add_argument("--mode", choices=sorted(PIL_MODES), required=True, help="Pixel format")
+    parser.add_argument("--exe", default=None, help="Path to seq_conv executable (default: NumPy reference engine)")
+    parser.add_argument(
+        "--cache",
+        nargs="?",
+        const="",
+        default=None,
+        metavar="DIR",
+        help="Reuse blurs from the reference cache (default DIR: $PARCONV_CACHE_DIR or ~/.cache/parconv)",
+    )
+    parser.add_argument("--outdir", default=outdir, help="Output directory for PNGs")
+    parser.add_argument(
+        "--loops",
+        nargs="+",
+        type=int,
+        default=loops,
+        required=loops is None,
+        help="Iteration counts to capture, e.g. --loops 0 20 40 60" + (f" (default: {' '.join(map(str, loops))})" if loops else ""),
+    )
+    parser.add_argument(
+        "--composite",
+        nargs="+",
+        type=parse_group,
+        default=None,
+        metavar="N,N",
+        help="Side-by-side composites, one per comma separated group (default: all --loops in order)",
+    )
+    return parser
+
+
+def make_figures(args, mode: str, labels: dict[int, str] | None = None) -> int:
+    """Write the PNGs; labels renames counts in the file names (Figure 1 always says 20)."""
+    labels = labels or {}
+    if args.width <= 0 or args.height <= 0:
+        eprint("width and height must be positive")
+        return 1
+    if any(l < 0 for l in args.loops):
+        eprint("loops must be >= 0")
+        return 1
+    groups = args.composite if args.composite is not None else [args.loops]
+    missing = sorted({t for group in groups for t in group} - set(args.loops))
+    if missing:
+        eprint(f"--composite uses counts not in --loops: {' '.join(map(str, missing))}")
+        return 1
+
+    input_path = Path(args.input)
+    exe_path = Path(args.exe) if args.exe else None
+    if exe_path is not None and not exe_path.is_file():
+        eprint(f"Executable not found: {exe_path}")
+        return 1
+
+    Image = ensure_pillow()
+
+    try:
+        raw_input = load_raw(input_path, args.width, args.height, mode, "Input")
+    except Exception as exc:
+        eprint(str(exc))
+        return 1
+
+    counts = sorted({t for t in args.loops if t > 0})
+    frames = {0: raw_input}
+    if counts:
+        try:
+            if args.cache is not None:
+                frames.update(cached_snapshots(args.cache, raw_input, args.width, args.height, mode, counts, exe_path))
+            elif exe_path is not None:
+                frames.update(seq_conv_snapshots(exe_path, input_path, args.width, args.height, mode, counts))
+            else:
+                frames.update(reference_snapshots(raw_input, counts))
+        except Exception as exc:
+            eprint(str(exc))
+            return 1
+
+    outdir = Path(args.outdir)
+    outdir.mkdir(parents=True, exist_ok=True)
+    pil_mode = PIL_MODES[mode]
+    size = (args.width, args.height)
+
+    # frombuffer wraps the frame without copying it
+    images = {t: Image.frombuffer(pil_mode, size, frames[t], "raw", pil_mode, 0, 1) for t in dict.fromkeys(args.loops)}
+    for t, img in images.items():
+        out_path = outdir / f"{mode}_{labels.get(t, t)}.png"
+        img.save(out_path)
+        print(f"Wrote: {out_path}")
+
+    for group in groups:
+        composite = Image.new(pil_mode, (args.width * len(group), args.height))
+        for i, t in enumerate(group):
+            composite.paste(images[t], (args.width * i, 0))
+        out_comp = outdir / f"{mode}_{'_'.join(str(labels.get(t, t)) for t in group)}.png"
+        composite.save(out_comp)
+        print(f"Wrote: {out_comp}")
+
+    return 0
+
+
+def main(argv=None) -> int:
+    args = build_parser("Generate figures of an image after several iteration counts from one run.").parse_args(argv)
+    return make_figures(args, args.mode)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())